@@ -0,0 +1,210 @@
+from collections import OrderedDict
+import hashlib
+import json
+import mmap
+import os
+from os import path
+import queue
+import threading
+from typing import Union
+import wave
+from stats import getStats
+
+# songs are decoded once they have been played this many times
+minPlaysToCache = 2
+# play counts are only kept for this many of the most recently played songs that aren't cached yet
+maxTrackedPlayCounts = 10000
+defaultMaxCacheBytes = 1024 ** 3
+# the cache is off unless this environment variable holds its maximum size in megabytes
+audioCacheEnvironmentVariable = 'THE_GOOD_PART_AUDIO_CACHE_MB'
+# mixer sample sizes as reported by mixer.get_init() that a PCM wav file can hold, unsigned 8 bit and signed 16 bit
+# 32 bit float and 32 bit int samples are both reported as -32, so 32 bit formats are never cached
+wavSampleSizes = (8, -16)
+
+def getConfiguredMaxBytes() -> Union[int, None]:
+    megabytes = os.environ.get(audioCacheEnvironmentVariable)
+    if not megabytes:
+        return None
+    try:
+        maxBytes = int(megabytes) * 1024 ** 2
+    except ValueError:
+        raise ValueError(f'{audioCacheEnvironmentVariable} must be a number of megabytes, not "{megabytes}"')
+
+    return maxBytes if maxBytes > 0 else None
+
+# decodes an mp3 to PCM in the format the mixer was opened with, so it doesn't have to be decoded again
+def writeDecodedAudio(sourceFullPath: str, targetFullPath: str):
+    from pygame import mixer
+
+    frequency, size, channels = mixer.get_init()
+    if size not in wavSampleSizes:
+        raise ValueError(f'{size} bit mixer samples can\'t be written to a wav file')
+    raw = mixer.Sound(sourceFullPath).get_raw()
+    with wave.open(targetFullPath, 'wb') as waveFile:
+        waveFile.setnchannels(channels)
+        waveFile.setsampwidth(abs(size) // 8)
+        waveFile.setframerate(frequency)
+        waveFile.writeframes(raw)
+
+def getSourceMtime(sourceFullPath: str) -> Union[int, None]:
+    try:
+        return os.stat(sourceFullPath).st_mtime_ns
+    except OSError:
+        return None
+
+# on-disk cache of decoded audio of frequently played songs, so that starting them skips decoding the mp3
+# cached tracks are handed to the mixer as a memory map of the wav file. Songs are decoded on a background thread after
+# they were played minPlaysToCache times, and the least recently played tracks are evicted once the cache is bigger
+# than maxBytes. An entry is only used while the mtime of its source file is the one it was decoded from.
+class AudioCache:
+    def __init__(self, cacheDir: str, maxBytes: int = defaultMaxCacheBytes):
+        self.cacheDir = cacheDir
+        self.maxBytes = maxBytes
+        self.indexFullPath = path.join(cacheDir, 'index.json')
+        # source path -> { 'file', 'mtime', 'bytes' }, least recently played first
+        self.entries: Union[OrderedDict[str, dict], None] = None
+        # source path -> number of plays, least recently played first, only for songs that aren't cached or queued
+        self.playCounts: OrderedDict[str, int] = OrderedDict()
+        self.totalBytes = 0
+        self.isDirty = False
+        # the background worker and the player both use the entries
+        self.lock = threading.Lock()
+        self.pendingPaths: set[str] = set()
+        self.workQueue: queue.Queue = queue.Queue()
+        self.worker: Union[threading.Thread, None] = None
+
+    def loadEntries(self) -> OrderedDict[str, dict]:
+        if self.entries is None:
+            self.entries = OrderedDict()
+            os.makedirs(self.cacheDir, exist_ok=True)
+            if path.exists(self.indexFullPath):
+                try:
+                    with open(self.indexFullPath, 'r') as indexFile:
+                        index = json.load(indexFile)
+                    self.entries = OrderedDict(index.get('entries', []))
+                    self.playCounts = OrderedDict(index.get('playCounts', {}))
+                except (OSError, ValueError):
+                    # a corrupt index is simply rebuilt, files it pointed to are overwritten when decoded again
+                    self.entries = OrderedDict()
+            self.totalBytes = sum([entry['bytes'] for entry in self.entries.values()])
+
+        return self.entries
+
+    def getCacheFullPath(self, sourceFullPath: str) -> str:
+        return path.join(self.cacheDir, hashlib.sha1(sourceFullPath.encode()).hexdigest() + '.wav')
+
+    def removeEntry(self, sourceFullPath: str):
+        entry = self.loadEntries().pop(sourceFullPath, None)
+        if entry:
+            self.totalBytes -= entry['bytes']
+            self.isDirty = True
+            try:
+                os.remove(path.join(self.cacheDir, entry['file']))
+            except OSError:
+                pass
+
+    # memory map of the decoded audio of the file, or None if it isn't cached (or the file changed since)
+    def open(self, sourceFullPath: str) -> Union[mmap.mmap, None]:
+        with self.lock:
+            entry = self.loadEntries().get(sourceFullPath)
+            if entry and entry['mtime'] != getSourceMtime(sourceFullPath):
+                self.removeEntry(sourceFullPath)
+                entry = None
+
+            stats = getStats()
+            if stats:
+                stats.increment('audioCache.hits' if entry else 'audioCache.misses')
+            if not entry:
+                return None
+
+            self.entries.move_to_end(sourceFullPath)
+            self.isDirty = True
+            try:
+                with open(path.join(self.cacheDir, entry['file']), 'rb') as cacheFile:
+                    # the map stays valid after the file is closed
+                    return mmap.mmap(cacheFile.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                self.removeEntry(sourceFullPath)
+                return None
+
+    # counts a play of the file and queues it for decoding once it is played often enough
+    # only called once the file actually started playing, not when it is queued
+    def recordPlay(self, sourceFullPath: str):
+        with self.lock:
+            self.loadEntries()
+            if sourceFullPath in self.entries or sourceFullPath in self.pendingPaths:
+                return
+
+            playCount = self.playCounts.pop(sourceFullPath, 0) + 1
+            self.isDirty = True
+            if playCount < minPlaysToCache:
+                self.playCounts[sourceFullPath] = playCount
+                while len(self.playCounts) > maxTrackedPlayCounts:
+                    self.playCounts.popitem(last=False)
+                return
+            # the count starts over if the decoded audio is evicted again
+            self.pendingPaths.add(sourceFullPath)
+
+        if not self.worker:
+            self.worker = threading.Thread(target=self.decodeQueuedFiles, daemon=True)
+            self.worker.start()
+        self.workQueue.put(sourceFullPath)
+
+    def decodeQueuedFiles(self):
+        while True:
+            sourceFullPath = self.workQueue.get()
+            if sourceFullPath is None:
+                return
+            try:
+                self.decode(sourceFullPath)
+            finally:
+                with self.lock:
+                    self.pendingPaths.discard(sourceFullPath)
+
+    def decode(self, sourceFullPath: str):
+        mtime = getSourceMtime(sourceFullPath)
+        if mtime is None:
+            return
+
+        cacheFullPath = self.getCacheFullPath(sourceFullPath)
+        # written to a temporary file first, so that a half decoded file is never played
+        tempPath = f'{cacheFullPath}.tmp'
+        try:
+            writeDecodedAudio(sourceFullPath, tempPath)
+            os.replace(tempPath, cacheFullPath)
+        except Exception:
+            # e.g. a file the mixer can't decode, it just keeps being played from the source
+            if path.exists(tempPath):
+                os.remove(tempPath)
+            return
+
+        with self.lock:
+            self.removeEntry(sourceFullPath)
+            size = os.path.getsize(cacheFullPath)
+            self.loadEntries()[sourceFullPath] = { 'file': path.basename(cacheFullPath), 'mtime': mtime, 'bytes': size }
+            self.totalBytes += size
+            self.isDirty = True
+            while self.totalBytes > self.maxBytes and len(self.entries) > 0:
+                self.removeEntry(next(iter(self.entries)))
+
+    def save(self):
+        with self.lock:
+            if not self.isDirty:
+                return
+
+            tempPath = f'{self.indexFullPath}.tmp'
+            with open(tempPath, 'w') as indexFile:
+                json.dump({ 'entries': list(self.entries.items()), 'playCounts': self.playCounts }, indexFile)
+            os.replace(tempPath, self.indexFullPath)
+            self.isDirty = False
+
+    def close(self):
+        if self.worker:
+            # files that are still queued are decoded the next time they are played
+            with self.lock:
+                while not self.workQueue.empty():
+                    self.pendingPaths.discard(self.workQueue.get_nowait())
+            self.workQueue.put(None)
+            self.worker.join()
+            self.worker = None
+        self.save()
@@ -0,0 +1,74 @@
+import hashlib
+import mmap
+import os
+from typing import Iterator, Union
+
+# the audio is hashed this many bytes at a time, so huge files never need to be copied into memory
+fingerprintChunkSize = 1024 * 1024
+# hashing only a few files isn't worth starting worker processes for
+minFilesForProcessPool = 8
+
+id3v2HeaderSize = 10
+id3v1TagSize = 128
+
+def getId3v2Size(header: bytes) -> int:
+    if len(header) < id3v2HeaderSize or header[:3] != b'ID3':
+        return 0
+
+    # the size is stored in 4 bytes of 7 bits each and doesn't include the header or the optional footer
+    size = 0
+    for byte in header[6:10]:
+        size = (size << 7) | (byte & 0x7f)
+    hasFooter = header[5] & 0x10
+    return id3v2HeaderSize + size + (id3v2HeaderSize if hasFooter else 0)
+
+# range of the file that holds the audio frames, i.e. without the ID3v2 tag at the start and the ID3v1 tag at the end
+def getAudioRange(data) -> tuple[int, int]:
+    start = getId3v2Size(bytes(data[:id3v2HeaderSize]))
+    end = len(data)
+    if end - start >= id3v1TagSize and data[end - id3v1TagSize:end - id3v1TagSize + 3] == b'TAG':
+        end -= id3v1TagSize
+
+    return min(start, end), end
+
+# hash of the audio frames of an mp3, the same for copies of a track no matter where they are or how they are tagged
+# returns None for files that can't be read
+def computeAudioFingerprint(fullpath: str) -> Union[str, None]:
+    hasher = hashlib.sha1()
+    try:
+        with open(fullpath, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return hasher.hexdigest()
+
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                start, end = getAudioRange(data)
+                view = memoryview(data)
+                try:
+                    for chunkStart in range(start, end, fingerprintChunkSize):
+                        hasher.update(view[chunkStart:min(chunkStart + fingerprintChunkSize, end)])
+                finally:
+                    view.release()
+    except (OSError, ValueError):
+        return None
+
+    return hasher.hexdigest()
+
+# fingerprints the files on a process pool, since hashing is bound by the cpu rather than the disk
+# yields (path, fingerprint) pairs in the order of the paths
+def fingerprintFiles(paths: list[str], maxWorkers: int = None) -> Iterator[tuple[str, Union[str, None]]]:
+    # multiprocessing is only imported when a pool is actually needed, it adds to the start of every command otherwise
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+
+    if len(paths) < minFilesForProcessPool:
+        for fullpath in paths:
+            yield fullpath, computeAudioFingerprint(fullpath)
+        return
+
+    if not maxWorkers:
+        maxWorkers = os.cpu_count() or 1
+    # hand each worker several files at once to keep the inter-process overhead low
+    chunksize = max(1, len(paths) // (maxWorkers * 4))
+    # workers are started fresh rather than forked, a fork would copy the audio device and threads of the player
+    with ProcessPoolExecutor(max_workers=maxWorkers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        yield from zip(paths, executor.map(computeAudioFingerprint, paths, chunksize=chunksize))
@@ -0,0 +1,59 @@
+# Measures the time from asking the player to start a song until it plays, from the mp3 and from the audio cache.
+# usage: python benchmarks/audioCacheStart.py <path to mp3> [--runs=<starts per source>]
+# The song is started several times (20 by default) while it isn't cached, then decoded into an empty cache in a temp
+# directory and started as many times again. The latency is the one the player records for every start, from the
+# request until the mixer plays, and the median of the runs is reported.
+import os
+import statistics
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import audioCache
+from audioCache import AudioCache
+from musicPlayer import MusicPlayer
+from playable.song import Song
+
+def measureStarts(player: MusicPlayer, song: Song, runs: int) -> float:
+    latencies = []
+    for _ in range(runs):
+        player.play(song)
+        latencies.append(player.lastStartLatencySeconds)
+        player.stop()
+
+    return statistics.median(latencies)
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if len(args) < 1:
+        print('usage: python benchmarks/audioCacheStart.py <path to mp3> [--runs=<starts per source>]')
+        sys.exit(2)
+    runs = 20
+    for arg in sys.argv[1:]:
+        if arg.startswith('--runs='):
+            runs = int(arg[len('--runs='):])
+
+    sourceFullPath = os.path.abspath(args[0])
+    song = Song(None, sourceFullPath, None)
+    with tempfile.TemporaryDirectory() as cacheDir:
+        cache = AudioCache(cacheDir)
+        player = MusicPlayer(cache)
+
+        # the song would be decoded in the background after a few starts, which has to wait until they are measured
+        audioCache.minPlaysToCache = runs + 1
+        uncachedSeconds = measureStarts(player, song, runs)
+
+        cache.decode(sourceFullPath)
+        if not cache.open(sourceFullPath):
+            print(f'{sourceFullPath} couldn\'t be decoded into the cache')
+            sys.exit(1)
+        cachedSeconds = measureStarts(player, song, runs)
+        player.shutdown()
+
+    print(f'mp3: {uncachedSeconds * 1000:.2f}ms median start latency of {runs} starts')
+    print(f'cached: {cachedSeconds * 1000:.2f}ms median start latency of {runs} starts')
+    print(f'cached songs start in {cachedSeconds / uncachedSeconds * 100:.0f}% of the time')
+
+if __name__ == '__main__':
+    main()
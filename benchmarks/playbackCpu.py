@@ -0,0 +1,70 @@
+# Measures the CPU time the playback loop uses per minute of playback.
+# usage: python benchmarks/playbackCpu.py <path to mp3> [seconds to measure] [--busy-wait]
+# --busy-wait measures the old loop that polled the mixer without sleeping, for comparison.
+import asyncio
+import os
+import queue
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pygame import mixer
+from menu import Menu
+from menuOption import MenuOption
+from musicPlayer import MusicPlayer
+from playable.song import Song
+from playbackController import PlaybackController
+
+def busyWait(player: MusicPlayer, song: Song, seconds: float):
+    commandQueue = queue.Queue()
+    # stop the song once the measuring window is over, like a user would with the stop command
+    stopTimer = threading.Timer(seconds, player.stop)
+    stopTimer.start()
+    while mixer.music.get_busy():
+        if commandQueue.qsize() > 0:
+            commandQueue.get()
+    stopTimer.cancel()
+
+def eventDriven(player: MusicPlayer, song: Song, seconds: float):
+    menu = Menu('Playback commands:')
+    menu.addMenuOption(MenuOption('stop', 'Stop playing song', player.stop))
+
+    async def run():
+        commandQueue = asyncio.Queue()
+        # the stop command is entered once the measuring window is over
+        asyncio.get_running_loop().call_later(seconds, commandQueue.put_nowait, 'STOP')
+        await PlaybackController(player, song, menu, commandQueue).run()
+
+    asyncio.run(run())
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if len(args) == 0:
+        print('usage: python benchmarks/playbackCpu.py <path to mp3> [seconds to measure] [--busy-wait]')
+        sys.exit(1)
+
+    songPath = args[0]
+    seconds = float(args[1]) if len(args) > 1 else 30.0
+    useBusyWait = '--busy-wait' in sys.argv
+
+    player = MusicPlayer()
+    song = Song(None, songPath, None)
+    song.play(player)
+
+    wallStart = time.perf_counter()
+    cpuStart = time.process_time()
+    if useBusyWait:
+        busyWait(player, song, seconds)
+    else:
+        eventDriven(player, song, seconds)
+    cpuSeconds = time.process_time() - cpuStart
+    wallSeconds = time.perf_counter() - wallStart
+
+    loopName = 'busy-wait' if useBusyWait else 'event-driven'
+    print(f'{loopName}: {cpuSeconds:.3f}s CPU over {wallSeconds:.1f}s of playback')
+    print(f'{loopName}: {cpuSeconds / wallSeconds * 60:.3f}s CPU per minute of playback')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+# Measures building the song search index and searching it.
+# usage: python benchmarks/search.py [song count] [query ...]
+# Songs (100000 by default) get generated titles, artists and albums, so no mp3 files are needed.
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playable.song import Song
+from songSearchIndex import SongSearchIndex
+
+words = ['love', 'night', 'dream', 'heart', 'fire', 'rain', 'summer', 'blue', 'road', 'home', 'light', 'shadow', 'river', 'gold']
+defaultQueries = ['love fire', 'artist 12', 'lov', 'drem hart', 'album 42 summer']
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    songCount = int(args[0]) if len(args) > 0 else 100000
+    queries = args[1:] or defaultQueries
+
+    random.seed(0)
+    songs: list[Song] = []
+    for i in range(songCount):
+        song = Song(None, f'/music/track {i}.mp3', None)
+        song.setTags({ 'title': ' '.join(random.sample(words, 3)), 'artist': f'Artist {i % 700}', 'album': f'Album {i % 5000}' })
+        songs.append(song)
+
+    startTime = time.perf_counter()
+    index = SongSearchIndex()
+    index.addSongs(songs)
+    print(f'indexed {songCount} songs in {time.perf_counter() - startTime:.2f}s')
+
+    for query in queries:
+        startTime = time.perf_counter()
+        results = index.search(query, 20)
+        elapsed = time.perf_counter() - startTime
+        print(f'"{query}": {len(results)} results in {elapsed * 1000:.1f}ms')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# Measures time and peak memory of loading a large json settings file.
+# usage: python benchmarks/settingsLoad.py [song count] [--json-load]
+# A settings file with the given number of songs (200000 by default), one playlist per 1000 songs and one playlist
+# holding every song is generated in a temp directory. Memory is the peak traced by tracemalloc while loading.
+# --json-load measures parsing the file with json.load the way settings used to be loaded, without building any songs.
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from userSettings import UserSettings
+
+songsPerPlaylist = 1000
+
+def writeSettings(settingsFullPath: str, songCount: int):
+    songIds = [f'song-{i:08d}' for i in range(songCount)]
+    playlists = [{ 'id': 'all', 'name': 'all', 'songs': songIds }]
+    for start in range(0, songCount, songsPerPlaylist):
+        playlists.append({ 'id': f'pl-{start}', 'name': f'playlist {start}', 'songs': songIds[start:start + songsPerPlaylist] })
+
+    with open(settingsFullPath, 'w') as settingsFile:
+        json.dump({
+            'songs': [{ 'id': id, 'path': f'/music/artist {i % 500}/album {i % 5000}/track {i}.mp3' } for i, id in enumerate(songIds)],
+            'playlists': playlists,
+            'playlistDependencies': [{ 'id': playlist['id'], 'upstream': [], 'downstream': [] } for playlist in playlists],
+            'clonedSongs': []
+        }, settingsFile, indent=4)
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    songCount = int(args[0]) if len(args) > 0 else 200000
+
+    with tempfile.TemporaryDirectory() as tempDir:
+        settingsFullPath = os.path.join(tempDir, 'settings.json')
+        writeSettings(settingsFullPath, songCount)
+        print(f'settings file: {os.path.getsize(settingsFullPath) / 1024 / 1024:.1f} MiB, {songCount} songs')
+
+        tracemalloc.start()
+        startTime = time.perf_counter()
+        if '--json-load' in sys.argv:
+            with open(settingsFullPath, 'r') as settingsFile:
+                settings = json.load(settingsFile)
+            loadedSongs = len(settings['songs'])
+        else:
+            settings = UserSettings(settingsFullPath)
+            settings.__enter__()
+            loadedSongs = len(settings.songs)
+        elapsed = time.perf_counter() - startTime
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(f'loaded {loadedSongs} songs in {elapsed:.2f}s, peak memory {peak / 1024 / 1024:.1f} MiB')
+        if isinstance(settings, UserSettings):
+            settings.storage.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+# Measures the memory used per song in a library.
+# usage: python benchmarks/songMemory.py [song count ...]
+# Songs are built the way a loaded library holds them, with file stats and tags from a pool of artists, and the
+# memory is what tracemalloc traces while building them. Defaults to 10000 and 100000 songs.
+import os
+import sys
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playable.song import Song
+
+artistCount = 500
+
+def buildSongs(songCount: int) -> list[Song]:
+    songs: list[Song] = []
+    for i in range(songCount):
+        artist = f'artist {i % artistCount}'
+        song = Song(str(uuid.uuid4()), f'/music/{artist}/album {i % 5000}/track {i}.mp3', None)
+        song.setFileStats(1600000000000000000 + i, 4000000 + i, 1000000 + i, f'{i:040x}')
+        # tags are parsed per file, so equal strings start out as separate objects
+        song.setTags({ 'artist': ''.join(artist), 'title': f'track {i % 20}', 'album': f'album {i % 5000}' })
+        songs.append(song)
+
+    return songs
+
+def main():
+    songCounts = [int(arg) for arg in sys.argv[1:]] or [10000, 100000]
+    for songCount in songCounts:
+        tracemalloc.start()
+        songs = buildSongs(songCount)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f'{songCount} songs: {size / len(songs):.0f} bytes per song')
+
+if __name__ == '__main__':
+    main()
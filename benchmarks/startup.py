@@ -0,0 +1,86 @@
+# Measures the cold start of the list command against the interactive console, which loads everything like main.py
+# always used to.
+# usage: python benchmarks/startup.py [song count] [--runs=<runs per command>]
+# A library with the given number of songs (1000 by default) is generated in a temp directory, and every command is
+# started in a new process several times (5 by default), reporting the median time until it exits. One more run with
+# `python -X importtime` adds up the time spent importing modules and shows whether pygame, mutagen or numpy were loaded.
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+mainFullPath = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+heavyModules = ['pygame', 'mutagen', 'numpy']
+
+# the console exits right away, the list command prints a few songs
+commands = {
+    'list': (['list', '--limit', '10'], ''),
+    'console': ([], 'EXIT\n'),
+}
+
+# written as an old json settings file, which main.py migrates into its database on the first run
+def writeSettings(settingsFullPath: str, songCount: int):
+    songIds = [f'song-{i:08d}' for i in range(songCount)]
+    with open(settingsFullPath, 'w') as settingsFile:
+        json.dump({
+            'songs': [{ 'id': id, 'path': f'/music/artist {i % 500}/album {i % 5000}/track {i}.mp3' } for i, id in enumerate(songIds)],
+            'playlists': [{ 'id': 'all', 'name': 'all', 'songs': songIds }],
+            'playlistDependencies': [{ 'id': 'all', 'upstream': [], 'downstream': [] }],
+            'clonedSongs': []
+        }, settingsFile)
+
+def runCommand(args: list[str], stdin: str, workingDir: str, extraOptions: list[str] = []) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *extraOptions, mainFullPath, *args], input=stdin, cwd=workingDir,
+        capture_output=True, text=True, check=True)
+
+def timeCommand(args: list[str], stdin: str, workingDir: str, runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        startTime = time.perf_counter()
+        runCommand(args, stdin, workingDir)
+        times.append(time.perf_counter() - startTime)
+
+    return statistics.median(times)
+
+# total import time in seconds and the heavy modules that were imported
+def measureImports(args: list[str], stdin: str, workingDir: str) -> tuple[float, list[str]]:
+    result = runCommand(args, stdin, workingDir, ['-X', 'importtime'])
+    totalMicroseconds = 0
+    imported = set()
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        selfTime, _, name = line[len('import time:'):].split('|')
+        totalMicroseconds += int(selfTime)
+        imported.add(name.strip().split('.')[0])
+
+    return totalMicroseconds / 1000000, [module for module in heavyModules if module in imported]
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    songCount = int(args[0]) if len(args) > 0 else 1000
+    runs = 5
+    for arg in sys.argv[1:]:
+        if arg.startswith('--runs='):
+            runs = int(arg[len('--runs='):])
+
+    with tempfile.TemporaryDirectory() as tempDir:
+        writeSettings(os.path.join(tempDir, 'the_good_part.settings.json'), songCount)
+        # the first run migrates the settings into the database, which isn't part of starting up
+        runCommand(*commands['list'], tempDir)
+
+        medians = {}
+        for name, (commandArgs, stdin) in commands.items():
+            medians[name] = timeCommand(commandArgs, stdin, tempDir, runs)
+            importSeconds, heavyImports = measureImports(commandArgs, stdin, tempDir)
+            print(f'{name}: {medians[name] * 1000:.0f}ms median of {runs} runs, {importSeconds * 1000:.0f}ms importing, ' \
+                f'loads {", ".join(heavyImports) if heavyImports else "none of " + ", ".join(heavyModules)}')
+
+        print(f'list starts in {medians["list"] / medians["console"] * 100:.0f}% of the time of the console')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+# Times loading, saving and importing libraries and the most common playlist operations on generated libraries.
+# usage: python benchmarks/suite.py [scale ...] [--output=<results file>] [--compare=<earlier results file>]
+# Scales are song counts like 1000 or 10k (1k and 10k by default). For every scale a directory of tiny mp3 files with
+# ID3 tags is generated, along with a json settings file that has nested playlists, linked songs, downstream playlists
+# and cloned songs. The results are written as json (benchmark-results.json by default), and --compare prints how
+# much slower or faster every measurement got since an earlier results file, e.g. one from another commit.
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from userSettings import UserSettings
+
+songsPerPlaylist = 1000
+# every this many songs two songs are linked, and two songs are clones of each other
+linkEvery = 50
+cloneEvery = 100
+removedSongCount = 100
+# measurements that got this much slower are flagged by --compare, unless they are too short to tell from noise
+regressionFactor = 1.2
+minComparedSeconds = 0.001
+
+# MPEG-1 layer III frame header for 128 kbit/s at 44.1 kHz, each frame is 417 bytes long
+mp3FrameHeader = b'\xff\xfb\x90\x64'
+mp3FrameSize = 417
+
+def createId3Frame(frameId: str, text: str) -> bytes:
+    # ID3v2.3 text frame, latin-1 encoded
+    data = b'\x00' + text.encode('latin-1')
+    return frameId.encode() + len(data).to_bytes(4, 'big') + b'\x00\x00' + data
+
+def createMp3(title: str, artist: str, album: str, seed: int) -> bytes:
+    frames = createId3Frame('TIT2', title) + createId3Frame('TPE1', artist) + createId3Frame('TALB', album)
+    size = len(frames)
+    # the tag size is stored in 4 bytes of 7 bits each
+    synchsafeSize = bytes([(size >> 21) & 0x7f, (size >> 14) & 0x7f, (size >> 7) & 0x7f, size & 0x7f])
+    # the payload differs per song, so that songs don't look like copies of each other
+    payload = seed.to_bytes(8, 'big') * ((mp3FrameSize - len(mp3FrameHeader)) // 8 + 1)
+    return b'ID3\x03\x00\x00' + synchsafeSize + frames + mp3FrameHeader + payload[:mp3FrameSize - len(mp3FrameHeader)]
+
+def writeLibrary(libraryDir: str, songCount: int) -> list[str]:
+    paths: list[str] = []
+    for i in range(songCount):
+        artist = f'Artist {i % 200}'
+        album = f'Album {i % 2000}'
+        albumDir = os.path.join(libraryDir, artist, album)
+        os.makedirs(albumDir, exist_ok=True)
+        songPath = os.path.join(albumDir, f'track {i}.mp3')
+        with open(songPath, 'wb') as songFile:
+            songFile.write(createMp3(f'Track {i}', artist, album, i))
+        paths.append(songPath)
+
+    return paths
+
+# one playlist with every song, and one playlist per songsPerPlaylist songs that are nested as a binary tree of
+# downstream playlists under a root playlist
+def writeSettings(settingsFullPath: str, libraryDir: str, paths: list[str]):
+    songIds = [f'song-{i:08d}' for i in range(len(paths))]
+    songs = [{ 'id': id, 'path': songPath } for id, songPath in zip(songIds, paths)]
+
+    clonedSongs = []
+    for i in range(0, len(songs) - 1, cloneEvery):
+        groupId = f'clone-{i}'
+        songs[i]['cloneId'] = groupId
+        songs[i + 1]['cloneId'] = groupId
+        clonedSongs.append({ 'id': groupId, 'songDistributions': [
+            { 'songId': songIds[i], 'probability': 1 },
+            { 'songId': songIds[i + 1], 'probability': 1 }
+        ] })
+
+    allSongs: list = []
+    for i in range(len(songIds)):
+        if i % linkEvery == 1:
+            # linked with the song before it
+            allSongs[-1] = [allSongs[-1], songIds[i]]
+        else:
+            allSongs.append(songIds[i])
+
+    chunkIds = [f'chunk-{start}' for start in range(0, len(songIds), songsPerPlaylist)]
+    playlists = [{ 'id': 'all', 'name': 'all', 'songs': allSongs }, { 'id': 'root', 'name': 'root', 'songs': [songIds[0]] }]
+    dependencies = [{ 'id': 'all', 'upstream': [], 'downstream': [] }, { 'id': 'root', 'upstream': [], 'downstream': chunkIds[:1] }]
+    for k, chunkId in enumerate(chunkIds):
+        start = k * songsPerPlaylist
+        playlists.append({ 'id': chunkId, 'name': chunkId, 'songs': songIds[start:start + songsPerPlaylist] })
+        upstream = ['root'] if k == 0 else [chunkIds[(k - 1) // 2]]
+        downstream = [chunkIds[child] for child in (2 * k + 1, 2 * k + 2) if child < len(chunkIds)]
+        dependencies.append({ 'id': chunkId, 'upstream': upstream, 'downstream': downstream })
+
+    with open(settingsFullPath, 'w') as settingsFile:
+        json.dump({
+            'libraryRoots': [libraryDir],
+            'songs': songs,
+            'playlists': playlists,
+            'playlistDependencies': dependencies,
+            'clonedSongs': clonedSongs
+        }, settingsFile)
+
+def timeCall(function: Callable[[], Any]) -> tuple[float, Any]:
+    startTime = time.perf_counter()
+    result = function()
+    return time.perf_counter() - startTime, result
+
+def benchmarkSettings(settingsFullPath: str, results: dict[str, float]):
+    settings = UserSettings(settingsFullPath)
+    results['load'], _ = timeCall(settings.__enter__)
+
+    root = settings.playlists['root']
+    results['downstreamFlattenCold'], _ = timeCall(root.getFlattenedSongsIncludingDownstream)
+    results['downstreamFlattenWarm'], _ = timeCall(root.getFlattenedSongsIncludingDownstream)
+
+    def getFirstTrack():
+        return root.createPlayQueue(True, seed=0).next()
+
+    def getAllTracks():
+        return list(root.createPlayQueue(True, seed=0))
+
+    results['shuffleFirstTrack'], _ = timeCall(getFirstTrack)
+    results['shuffleFullQueue'], _ = timeCall(getAllTracks)
+
+    allPlaylist = settings.playlists['all']
+    random.seed(0)
+    songIndices = [random.randrange(allPlaylist.getSongCount() - removedSongCount) for _ in range(removedSongCount)]
+
+    def removeSongs():
+        for songIdx in songIndices:
+            settings.removeSongFromPlaylist(allPlaylist, songIdx)
+
+    elapsed, _ = timeCall(removeSongs)
+    results['removeSong'] = elapsed / removedSongCount
+
+    def save():
+        settings.__exit__(None, None, None)
+
+    results['save'], _ = timeCall(save)
+
+def benchmarkImport(settingsFullPath: str, libraryDir: str, results: dict[str, float]):
+    with UserSettings(settingsFullPath) as settings:
+        def addSongs():
+            return settings.addSongsFromPath(libraryDir)
+
+        results['import'], _ = timeCall(addSongs)
+
+def runScale(songCount: int) -> dict[str, float]:
+    results: dict[str, float] = {}
+    tempDir = tempfile.mkdtemp()
+    try:
+        libraryDir = os.path.join(tempDir, 'library')
+        paths = writeLibrary(libraryDir, songCount)
+
+        for storage in ['json', 'db']:
+            settingsFullPath = os.path.join(tempDir, 'settings.json')
+            writeSettings(settingsFullPath, libraryDir, paths)
+            if storage == 'db':
+                # the database is created from the json file on first open, which isn't part of the measurement
+                with UserSettings(os.path.join(tempDir, 'settings.db')):
+                    pass
+                settingsFullPath = os.path.join(tempDir, 'settings.db')
+
+            storageResults: dict[str, float] = {}
+            benchmarkSettings(settingsFullPath, storageResults)
+            for name, seconds in storageResults.items():
+                results[f'{name}[{storage}]'] = seconds
+
+        benchmarkImport(os.path.join(tempDir, 'import.json'), libraryDir, results)
+    finally:
+        shutil.rmtree(tempDir, ignore_errors=True)
+
+    return results
+
+def parseScale(text: str) -> int:
+    if text.lower().endswith('k'):
+        return int(float(text[:-1]) * 1000)
+
+    return int(text)
+
+def getCommit() -> str:
+    try:
+        repositoryDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=repositoryDir, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def getOption(name: str) -> str:
+    for arg in sys.argv[1:]:
+        if arg.startswith(f'--{name}='):
+            return arg.split('=', 1)[1]
+
+    return None
+
+def printComparison(earlier: dict, current: dict):
+    print(f'compared to {earlier.get("commit", "unknown")}:')
+    for scale, results in current['results'].items():
+        earlierResults = earlier['results'].get(scale, {})
+        for name, seconds in results.items():
+            if name not in earlierResults or earlierResults[name] <= 0:
+                continue
+            factor = seconds / earlierResults[name]
+            flag = ' REGRESSION' if factor >= regressionFactor and seconds >= minComparedSeconds else ''
+            print(f'{scale:>8} {name:<32} {earlierResults[name] * 1000:10.2f}ms -> {seconds * 1000:10.2f}ms ({factor:.2f}x){flag}')
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    scales = [parseScale(arg) for arg in args] or [1000, 10000]
+    outputPath = getOption('output') or 'benchmark-results.json'
+    comparePath = getOption('compare')
+
+    report = {
+        'commit': getCommit(),
+        'python': platform.python_version(),
+        'createdAt': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': {}
+    }
+    for songCount in scales:
+        print(f'{songCount} songs:')
+        results = runScale(songCount)
+        for name, seconds in results.items():
+            print(f'  {name:<32} {seconds * 1000:10.2f}ms')
+        report['results'][str(songCount)] = results
+
+    with open(outputPath, 'w') as outputFile:
+        json.dump(report, outputFile, indent=4)
+    print(f'results written to {outputPath}')
+
+    if comparePath:
+        with open(comparePath, 'r') as compareFile:
+            printComparison(json.load(compareFile), report)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# Measures the silence between two tracks played back to back.
+# usage: python benchmarks/trackGap.py <first mp3> <second mp3> [--no-gapless]
+# The first track is started a few seconds before its end. The mixer is then sampled in a tight loop, which is fine
+# for a benchmark, and the gap is the time between the mixer going idle and the second track starting.
+# --no-gapless loads the second track after the first one ends, which is how playlists used to play.
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mutagen.mp3 import MP3
+from pygame import mixer
+from musicPlayer import MusicPlayer
+from playable.song import Song
+
+secondsBeforeEnd = 3.0
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if len(args) < 2:
+        print('usage: python benchmarks/trackGap.py <first mp3> <second mp3> [--no-gapless]')
+        sys.exit(1)
+
+    firstSong, secondSong = Song(None, args[0], None), Song(None, args[1], None)
+    isGapless = '--no-gapless' not in sys.argv
+
+    player = MusicPlayer()
+    startSeconds = max(0.0, MP3(firstSong.getPath()).info.length - secondsBeforeEnd)
+    player.play(firstSong, startSeconds=startSeconds)
+    if isGapless:
+        player.queue(secondSong)
+
+    idleStart = None
+    gapSeconds = 0.0
+    lastPosition = mixer.music.get_pos()
+    while True:
+        now = time.perf_counter()
+        if not mixer.music.get_busy():
+            if idleStart is None:
+                idleStart = now
+                if not isGapless:
+                    player.play(secondSong)
+            continue
+
+        if idleStart is not None:
+            # the second track is playing again after a stretch of silence
+            gapSeconds = now - idleStart
+            break
+
+        position = mixer.music.get_pos()
+        if position < lastPosition:
+            # the mixer restarted the position for the queued track without ever going idle
+            break
+        lastPosition = position
+        time.sleep(0.0005)
+
+    player.stop()
+    mode = 'gapless' if isGapless else 'load after end'
+    print(f'{mode}: {gapSeconds * 1000:.2f}ms between tracks')
+
+if __name__ == '__main__':
+    main()
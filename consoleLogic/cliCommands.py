@@ -0,0 +1,210 @@
+import argparse
+from os import error, path
+import sys
+from typing import Union
+from consoleLogic.selection import parseSelection, selectionHelp
+from daemonClient import DaemonClient, isDaemonRunning, socketFileName
+from playable.playlist import Playlist
+from playable.song import Song
+from userSettings import UserSettings
+
+# subcommands that run without any prompts, so that they can be scripted
+# only playing imports the player (and with it pygame), everything else works on the library alone
+
+# songs can be referred to by id or by path
+def findSong(settings: UserSettings, songRef: str) -> Song:
+    if songRef in settings.songsDict:
+        return settings.songsDict[songRef]
+
+    fullpath = path.abspath(songRef)
+    for song in settings.getSongs():
+        if path.abspath(song.getPath()) == fullpath:
+            return song
+
+    raise error(f'Song "{songRef}" isn\'t in the library!')
+
+# playlists can be referred to by id or by name
+def findPlaylist(settings: UserSettings, playlistRef: str) -> Playlist:
+    if playlistRef in settings.playlists:
+        return settings.playlists[playlistRef]
+    for playlist in settings.playlists.values():
+        if playlist.name == playlistRef:
+            return playlist
+
+    raise error(f'Playlist "{playlistRef}" doesn\'t exist!')
+
+# one tab separated line per copy (fingerprint, id, path)
+# the copies are merged or dismissed if asked to, and aren't reported again after that until another copy is added
+def reportDuplicates(settings: UserSettings, songs: list[Song], action: Union[str, None]):
+    duplicates = settings.findDuplicateSongs(songs)
+    for group in duplicates:
+        for song in group:
+            print(f'Duplicate: {song.fingerprint}\t{song.id}\t{song.getPath()}')
+        if action == 'merge':
+            settings.mergeDuplicateSongs(group)
+        elif action == 'dismiss':
+            settings.dismissDuplicateSongs(group)
+
+    if len(duplicates) > 0:
+        outcome = { 'merge': 'merged', 'dismiss': 'dismissed' }.get(action, 'found')
+        print(f'{len(duplicates)} songs with more than one copy {outcome}.')
+
+def runScan(settings: UserSettings, args: argparse.Namespace):
+    if args.path:
+        if not path.exists(args.path):
+            raise error(f'Path "{args.path}" doesn\'t exist!')
+        songs = settings.addSongsFromPath(args.path)
+        for song in songs:
+            print(f'Added: {song.getPath()}')
+        print(f'{len(songs)} new songs added.')
+        reportDuplicates(settings, songs, args.duplicates)
+        return
+
+    result = settings.rescanLibrary()
+    for song in result.moved:
+        print(f'Moved: {song.getPath()}')
+    for song in result.added:
+        print(f'Added: {song.getPath()}')
+    for song in result.removed:
+        print(f'Removed: {song.getPath()}')
+    print(f'{result.unchanged} unchanged, {len(result.updated)} updated, {len(result.moved)} moved, {len(result.added)} added, {len(result.removed)} removed.')
+    reportDuplicates(settings, settings.getSongs(), args.duplicates)
+
+# one tab separated line per song (id, title, path) or playlist (id, name, number of songs)
+# the songs of a playlist are numbered, which is what remove refers to
+def runList(settings: UserSettings, args: argparse.Namespace):
+    if args.playlists:
+        for playlist in settings.getPlaylistsList():
+            print(f'{playlist.id}\t{playlist.name}\t{playlist.getSongCount()}')
+        return
+    if args.playlist:
+        for i, song in enumerate(findPlaylist(settings, args.playlist).getFlattenedSongs()):
+            print(f'{i + 1}\t{song.id}\t{song.getTitle()}\t{song.getPath()}')
+        return
+
+    for song in settings.searchSongs(' '.join(args.query), args.limit):
+        print(f'{song.id}\t{song.getTitle()}\t{song.getPath()}')
+
+def runPlaylistCreate(settings: UserSettings, args: argparse.Namespace):
+    settings.addPlaylist(args.name, [findSong(settings, songRef) for songRef in args.songs])
+    print(f'Created playlist {args.name}!')
+
+def runPlaylistAdd(settings: UserSettings, args: argparse.Namespace):
+    playlist = findPlaylist(settings, args.playlist)
+    songs = [findSong(settings, songRef) for songRef in args.songs]
+    settings.addSongsToPlaylist(playlist, songs)
+    print(f'Added {len(songs)} songs to {playlist.name}!')
+
+# the numbers are those of the songs in the playlist, see list
+def runPlaylistRemove(settings: UserSettings, args: argparse.Namespace):
+    playlist = findPlaylist(settings, args.playlist)
+    indices = parseSelection(args.selection, playlist.getSongCount())
+    if not indices:
+        raise error(f'Invalid selection, the playlist has {playlist.getSongCount()} songs!')
+    settings.removeSongsFromPlaylist(playlist, indices)
+    print(f'Removed {len(indices)} songs from {playlist.name}!')
+
+# the numbers are those of the songs that aren't linked yet, in playlist order
+def runPlaylistLink(settings: UserSettings, args: argparse.Namespace):
+    playlist = findPlaylist(settings, args.playlist)
+    songsWithIdx = playlist.getLinkableSongs()
+    indices = parseSelection(args.selection, len(songsWithIdx))
+    if not indices or len(indices) < 2:
+        raise error(f'Select at least 2 of the {len(songsWithIdx)} songs that aren\'t linked yet!')
+    settings.linkSongs(playlist, [songsWithIdx[i][1] for i in indices])
+    print(f'Linked {len(indices)} songs in {playlist.name}!')
+
+# writes a playlist (with its downstream playlists), or the whole library, as an m3u playlist
+def runExport(settings: UserSettings, args: argparse.Namespace):
+    if args.playlist:
+        songs = findPlaylist(settings, args.playlist).getFlattenedSongsIncludingDownstream()
+    else:
+        songs = settings.getSongs()
+
+    lines = ['#EXTM3U']
+    for song in songs:
+        lines.append(f'#EXTINF:-1,{song.getTitle()}')
+        lines.append(song.getPath())
+    text = '\n'.join(lines) + '\n'
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as m3uFile:
+            m3uFile.write(text)
+        print(f'Exported {len(songs)} songs to {args.output}.')
+    else:
+        sys.stdout.write(text)
+
+# plays a song or playlist, or the whole library, on the running daemon if there is one and right here otherwise
+def runPlay(settings: UserSettings, args: argparse.Namespace):
+    socketFullPath = f'./{socketFileName}'
+    song = None
+    playlist = None
+    if args.target:
+        try:
+            song = findSong(settings, args.target)
+        except OSError:
+            playlist = findPlaylist(settings, args.target)
+
+    if isDaemonRunning(socketFullPath):
+        request = { 'shuffle': args.shuffle }
+        if song:
+            request = { 'songId': song.id }
+        elif playlist:
+            request['playlist'] = playlist.id
+        with DaemonClient(socketFullPath) as client:
+            client.request('play', **request)
+        return
+
+    from consoleLogic.consoleLogic import playPlayable
+
+    if not song and not playlist:
+        playlist = Playlist(None, 'All Songs', settings.getSongs())
+        playlist.cloneResolver = settings.resolveClonedSongs
+    playPlayable(settings.getPlayer(), song if song else (playlist, args.shuffle))
+
+def addSubcommands(parser: argparse.ArgumentParser):
+    subparsers = parser.add_subparsers(dest='command')
+
+    scanParser = subparsers.add_parser('scan', help='add the songs under a path, or rescan the library if no path is given')
+    scanParser.add_argument('path', nargs='?')
+    scanParser.add_argument('--duplicates', choices=['merge', 'dismiss'],
+        help='merge copies of the same audio into cloned songs so that only one of them plays, or keep them apart without reporting them again')
+    scanParser.set_defaults(run=runScan)
+
+    listParser = subparsers.add_parser('list', help='list the songs matching a search, or every song')
+    listParser.add_argument('query', nargs='*')
+    listParser.add_argument('--limit', type=int)
+    listParser.add_argument('--playlists', action='store_true', help='list the playlists instead')
+    listParser.add_argument('--playlist', help='list the songs of a playlist instead')
+    listParser.set_defaults(run=runList)
+
+    playlistParser = subparsers.add_parser('playlist', help='create and edit playlists')
+    playlistSubparsers = playlistParser.add_subparsers(dest='playlistCommand', required=True)
+    createParser = playlistSubparsers.add_parser('create', help='create a playlist of songs (ids or paths)')
+    createParser.add_argument('name')
+    createParser.add_argument('songs', nargs='+')
+    createParser.set_defaults(run=runPlaylistCreate)
+    addParser = playlistSubparsers.add_parser('add', help='add songs (ids or paths) to a playlist')
+    addParser.add_argument('playlist')
+    addParser.add_argument('songs', nargs='+')
+    addParser.set_defaults(run=runPlaylistAdd)
+    removeParser = playlistSubparsers.add_parser('remove', help=f'remove songs from a playlist by number ({selectionHelp})')
+    removeParser.add_argument('playlist')
+    removeParser.add_argument('selection')
+    removeParser.set_defaults(run=runPlaylistRemove)
+    linkParser = playlistSubparsers.add_parser('link', help='link songs that aren\'t linked yet by number, so they always play back to back')
+    linkParser.add_argument('playlist')
+    linkParser.add_argument('selection')
+    linkParser.set_defaults(run=runPlaylistLink)
+
+    exportParser = subparsers.add_parser('export', help='write a playlist, or the whole library, as an m3u playlist')
+    exportParser.add_argument('playlist', nargs='?')
+    exportParser.add_argument('--output', help='file to write to instead of printing the playlist')
+    exportParser.set_defaults(run=runExport)
+
+    playParser = subparsers.add_parser('play', help='play a song (id or path) or playlist, or the whole library')
+    playParser.add_argument('target', nargs='?')
+    playParser.add_argument('--shuffle', action='store_true')
+    playParser.set_defaults(run=runPlay)
+
+    subparsers.add_parser('daemon', help='keep the library and the player loaded and take commands over a socket')
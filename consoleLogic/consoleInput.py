@@ -0,0 +1,86 @@
+import asyncio
+import os
+import sys
+import threading
+from typing import Union
+
+# lines typed on stdin during playback, read by an asyncio event loop instead of a thread blocked in input()
+# the loop is woken up when stdin becomes readable (loop.add_reader), so playback never has to wait for a line to be
+# finished, e.g. to start the next song. Where stdin can't be watched that way (e.g. on Windows), a single reader
+# thread for the whole process reads lines while an input is started. It may still be waiting for a line once the
+# input is stopped, and that line is dropped.
+class ConsoleInput:
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        # created inside the loop by getLines(), before python 3.10 a queue belongs to the loop that was current when
+        # it was created, which isn't this one
+        self.lines: Union[asyncio.Queue, None] = None
+        # bytes of a line that isn't finished yet
+        self.pendingBytes = b''
+        self.fd: Union[int, None] = None
+
+    def start(self):
+        try:
+            fd = sys.stdin.fileno()
+            self.loop.add_reader(fd, self.onReadable)
+            self.fd = fd
+        except (NotImplementedError, OSError, ValueError):
+            startReaderThread(self)
+
+    def onReadable(self):
+        data = os.read(self.fd, 4096)
+        if not data:
+            # end of input, e.g. when stdin is a pipe
+            self.stop()
+            return
+
+        *lines, self.pendingBytes = (self.pendingBytes + data).split(b'\n')
+        for line in lines:
+            self.putLine(line.decode(errors='replace'))
+
+    # only called on the loop, the reader thread hands lines over with call_soon_threadsafe
+    def getLines(self) -> asyncio.Queue:
+        if self.lines is None:
+            self.lines = asyncio.Queue()
+
+        return self.lines
+
+    def putLine(self, line: str):
+        self.getLines().put_nowait(line.strip().upper())
+
+    def stop(self):
+        if self.fd is not None:
+            self.loop.remove_reader(self.fd)
+            self.fd = None
+        self.pendingBytes = b''
+        stopReaderThread(self)
+
+# input the reader thread currently hands lines to, the thread only reads while there is one
+threadInput: Union[ConsoleInput, None] = None
+threadInputStarted = threading.Event()
+readerThread: Union[threading.Thread, None] = None
+
+def readLinesOnThread():
+    while True:
+        threadInputStarted.wait()
+        try:
+            line = input()
+        except EOFError:
+            return
+        consoleInput = threadInput
+        if consoleInput:
+            consoleInput.loop.call_soon_threadsafe(consoleInput.putLine, line)
+
+def startReaderThread(consoleInput: ConsoleInput):
+    global threadInput, readerThread
+    threadInput = consoleInput
+    threadInputStarted.set()
+    if readerThread is None:
+        readerThread = threading.Thread(target=readLinesOnThread, daemon=True)
+        readerThread.start()
+
+def stopReaderThread(consoleInput: ConsoleInput):
+    global threadInput
+    if threadInput is consoleInput:
+        threadInput = None
+        threadInputStarted.clear()
@@ -1,13 +1,18 @@
+import asyncio
 from genericpath import isfile
 from os.path import exists
-import queue
-import threading
 import time
 from typing import Union
+from consoleLogic.consoleInput import ConsoleInput
+from consoleLogic.pagedListing import PagedListing
+from libraryScanner import ScanProgress
 from menu import Menu
 from menuOption import MenuOption
+from musicPlayer import MusicPlayer
+from playbackController import PlaybackController
 from playable.playlist import Playlist
 from playable.song import Song
+from stats import enableStats, getStats, statsEnvironmentVariable
 from userSettings import UserSettings
 
 
@@ -18,96 +23,115 @@ def createMenu(options: list[MenuOption]):
 
     return menu
 
-def consolePlaySong(song: Song, options: list[MenuOption], inputQueue: queue.Queue):
-    # show the currently playing song until it finishes
-    print(f'Now playing: {song.getTitle()}')
-    menu = createMenu(options)
-    menu.print()
-    
-    def handleInput(inputQueue):
-        while song.isPlaying():
-            playbackCommand = input('Enter command: ')
-            if playbackCommand:
-                playbackCommandUpper = playbackCommand.upper()
-                if playbackCommandUpper and playbackCommandUpper in menu.menuOptionsDict:
-                    inputQueue.put(playbackCommandUpper)
-            time.sleep(0.01)
-
-    inputThread = threading.Thread(target=handleInput, args=(inputQueue,), daemon=True)
-    inputThread.start()
-
-    while song.isPlaying():
-        if inputQueue.qsize() > 0:
-            commandStr = inputQueue.get()
-            command = menu.menuOptionsDict[commandStr].command
-            if command:
-                command()
-    inputThread.join()
-
-def playSong(song: Song):
-    inputQueue = queue.Queue()
+def getPlaybackOptions(player: MusicPlayer) -> list[MenuOption]:
+    def pause():
+        player.pause()
+
+    def resume():
+        player.resume()
+
+    def seekForward():
+        player.seek(10)
+
+    def seekBack():
+        player.seek(-10)
+
+    return [ \
+        MenuOption('pause', 'Pause the current song', pause), \
+        MenuOption('resume', 'Resume the current song', resume), \
+        MenuOption('fwd', 'Jump 10 seconds forward', seekForward), \
+        MenuOption('rew', 'Jump 10 seconds back', seekBack) \
+    ]
+
+# event loop and console input shared by all songs of one playback, so that nothing is set up again between songs
+# lines typed while a song plays are read by the loop, and the next song starts as soon as the current one ends
+class PlaybackSession:
+    def __init__(self, player: MusicPlayer):
+        self.player = player
+        self.loop = asyncio.new_event_loop()
+        self.consoleInput = ConsoleInput(self.loop)
+
+    def __enter__(self):
+        self.consoleInput.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.consoleInput.stop()
+        self.loop.close()
+
+    def playSong(self, song: Song, options: list[MenuOption]):
+        # show the currently playing song until it finishes
+        print(f'Now playing: {song.getTitle()}')
+        menu = createMenu(options + getPlaybackOptions(self.player))
+        menu.print()
+        print('Enter command: ', end='', flush=True)
+
+        self.loop.run_until_complete(self.runController(song, menu))
+        print()
+
+    async def runController(self, song: Song, menu: Menu):
+        await PlaybackController(self.player, song, menu, self.consoleInput.getLines()).run()
 
+def playSong(player: MusicPlayer, song: Song):
     def stopSong():
-        song.stopPlaying()
+        player.stop()
 
     options = [MenuOption('stop', 'Stop playing song', stopSong)]
-    def additionalLogic():
-        consolePlaySong(song, options, inputQueue)
-    song.addExtraPlaySongLogic(additionalLogic)
-    song.play()
-        
-
-def playPlaylist(playlist: Playlist, shouldShuffle: bool):
-    inputQueue = queue.Queue()
-        
+    with PlaybackSession(player) as session:
+        song.play(player)
+        session.playSong(song, options)
+
+def playPlaylist(player: MusicPlayer, playlist: Playlist, shouldShuffle: bool):
     print(f'Now playing playlist: {playlist.name}')
 
-    def extraPlaySongLogicGenerator(song: Song):
-        def skipSong():
-            song.stopPlaying()
+    with PlaybackSession(player) as session:
+        def extraPlaySongLogicGenerator(song: Song):
+            def skipSong():
+                if player.isCurrentSong(song):
+                    player.stop()
 
-        def stopPlaylist():
-            # it is important that playlist.isPlaying is set first
-            # this is because the song stopping will start the next song
-            playlist.isPlaying = False
-            song.stopPlaying()
+            def previousSong():
+                if player.isCurrentSong(song):
+                    playlist.goBack()
+                    player.stop()
 
-        options = [ \
-            MenuOption('skip', 'Skip the current song', skipSong), \
-            MenuOption('stop', 'Stop playing the playlist', stopPlaylist) \
-        ]
+            def stopPlaylist():
+                # it is important that playlist.isPlaying is set first
+                # this is because the song stopping will start the next song
+                playlist.isPlaying = False
+                player.stop()
 
-        def additionalLogic():
-            consolePlaySong(song, options, inputQueue)
+            options = [ \
+                MenuOption('skip', 'Skip the current song', skipSong), \
+                MenuOption('back', 'Go back to the previous song', previousSong), \
+                MenuOption('stop', 'Stop playing the playlist', stopPlaylist) \
+            ]
 
-        return additionalLogic
+            def additionalLogic():
+                session.playSong(song, options)
 
-    playlist.addExtraPlaySongLogicGenerator(extraPlaySongLogicGenerator)
-    if shouldShuffle:
-        playlist.shuffle()
-    else:
-        playlist.play()
+            return additionalLogic
+
+        playlist.addExtraPlaySongLogicGenerator(extraPlaySongLogicGenerator)
+        if shouldShuffle:
+            playlist.shuffle(player)
+        else:
+            playlist.play(player)
 
-def playPlayable(playable: Union[Song, tuple[Playlist, bool]]):
+def playPlayable(player: MusicPlayer, playable: Union[Song, tuple[Playlist, bool]]):
     if isinstance(playable, Song):
-        playSong(playable)
+        playSong(player, playable)
     else: # playlist
-        playPlaylist(playable[0], playable[1])
+        playPlaylist(player, playable[0], playable[1])
 
-def printSongs(files: list[Song], startIdx: int=0):
-    if len(files) > 0:
-        displayIdx = startIdx
-        i = 0
-        while i < len(files):
-            f = files[i]
-            print(f'{displayIdx+1}: {f.getSongName()}')
-            i += 1
-            displayIdx += 1
+def getSongDisplayString(song: Song) -> str:
+    return song.getSongName()
 
-        return displayIdx
-    else:
-        print('There are no songs :(')
-        return startIdx
+def getSongKey(song: Song) -> str:
+    return song.id
+
+def createSongListing(songs: list[Song]) -> PagedListing:
+    return PagedListing(songs, getSongDisplayString, getSongKey, 'There are no songs :(')
 
 def printPlaylists(playlists: list[Playlist], startIdx: int=0):
     if len(playlists) > 0:
@@ -124,26 +148,47 @@ def printPlaylists(playlists: list[Playlist], startIdx: int=0):
         print('There are no playlists. Try creating one in the main menu!')
         return startIdx
 
+# searches the library, an empty query lists every song
+def searchSongs(settings: UserSettings, query: str) -> list[Song]:
+    songs = settings.searchSongs(query)
+    if query.strip():
+        print(f'{len(songs)} songs match "{query}".')
+
+    return songs
+
+searchPrompt = 'Search by title, artist, album or filename, or leave empty to list all songs: '
+
 def getPlayableChoice(settings: UserSettings) -> Union[None, Song, tuple[Playlist, bool]]:
-    mp3Files = settings.getSongs()
+    allSongs = settings.getSongs()
 
-    if len(mp3Files) <= 0:
+    if len(allSongs) <= 0:
         return None
 
     # create a playlist of all playable songs
-    allSongsPlaylist = Playlist(None, 'All Songs', mp3Files)
+    allSongsPlaylist = Playlist(None, 'All Songs', allSongs)
+    allSongsPlaylist.cloneResolver = settings.resolveClonedSongs
     playlists = [allSongsPlaylist] + settings.getPlaylistsList()
 
-    print('All playable mp3 files:')
-    i = printSongs(mp3Files)
-    print()
-    i = printPlaylists(playlists, i)
-    print()
+    # only the matching songs are listed, one page at a time and numbered before the playlists
+    songListing = createSongListing(searchSongs(settings, input(searchPrompt)))
+
+    def getOptionLoop() -> str:
+        print('Playable mp3 files:')
+        songListing.print()
+        print()
+        printPlaylists(playlists, len(songListing.items))
+        print()
 
+        print('Please enter the number of the song or playlist you would like to play.')
+        print('For playlists, prefix your selection with \'S\' to shuffle.')
+        return input('Selection: ')
+
+    option = getOptionLoop()
+    while songListing.handleCommand(option):
+        option = getOptionLoop()
+
+    mp3Files = songListing.items
     playables: list[Union[Song, Playlist]] = [*mp3Files, *playlists]
-    print('Please enter the number of the song or playlist you would like to play.')
-    print('For playlists, prefix your selection with \'S\' to shuffle.')
-    option = input('Selection: ')
 
     shouldShuffle = False
     if len(option) > 0 and option[0].lower() == 's':
@@ -153,7 +198,7 @@ def getPlayableChoice(settings: UserSettings) -> Union[None, Song, tuple[Playlis
     if option.isnumeric():
         songIdx = int(option)
         # can't shuffle individual songs
-        invalid = shouldShuffle and songIdx < len(mp3Files)
+        invalid = shouldShuffle and songIdx <= len(mp3Files)
         if not invalid and songIdx > 0 and songIdx <= len(playables):
             playable = playables[songIdx-1]
             if isinstance(playable, Playlist):
@@ -165,7 +210,33 @@ def getPlayableChoice(settings: UserSettings) -> Union[None, Song, tuple[Playlis
 def createPlayMenu(settings: UserSettings):
     playable = getPlayableChoice(settings)
     if playable:
-        playPlayable(playable)
+        playPlayable(settings.getPlayer(), playable)
+
+# flags songs that have the same audio as other songs in the library and offers to merge them into cloned song groups
+def offerToMergeDuplicates(settings: UserSettings, songs: list[Song]):
+    if len(songs) == 0:
+        return
+
+    duplicates = settings.findDuplicateSongs(songs)
+    if len(duplicates) == 0:
+        return
+
+    print(f'Found {len(duplicates)} songs with more than one copy in the library:')
+    for group in duplicates:
+        paths = ', '.join([song.getPath() for song in group])
+        print(f'{group[0].getSongName()}: {paths}')
+
+    confirm = input('Would you like to merge the copies so that only one of them plays? (yes/no): ')
+    while confirm.lower() != 'yes' and confirm.lower() != 'no':
+        confirm = input('Would you like to merge the copies so that only one of them plays? (yes/no): ')
+    if confirm.lower() == 'yes':
+        for group in duplicates:
+            settings.mergeDuplicateSongs(group)
+        print(f'Merged {len(duplicates)} duplicate songs!')
+    else:
+        # not asked about again until another copy is added
+        for group in duplicates:
+            settings.dismissDuplicateSongs(group)
 
 def createAddSongMenu(settings: UserSettings):
     songpath = input('Provide a path to an mp3 or directory you would like to add to the song database: ')
@@ -174,12 +245,61 @@ def createAddSongMenu(settings: UserSettings):
     elif isfile(songpath) and not songpath.endswith('.mp3'):
         print('Error adding song file: file must be an mp3!')
     else:
-        addedSongs = settings.addSongsFromPath(songpath)
-        for song in addedSongs:
+        lastProgressTime = time.perf_counter()
+
+        def printProgress(progress: ScanProgress):
+            nonlocal lastProgressTime
+            # only report progress every so often so printing doesn't slow down the scan
+            now = time.perf_counter()
+            if now - lastProgressTime >= 1:
+                lastProgressTime = now
+                print(f'Scanned {progress.filesScanned}/{progress.filesFound} files ({progress.getFilesPerSecond():.0f} files/sec)...')
+
+        addedSongs: list[Song] = []
+        scanStart = time.perf_counter()
+        for song in settings.scanSongsFromPath(songpath, printProgress):
             print(f'Found and adding {song.getTitle()}...')
+            addedSongs.append(song)
+        elapsed = time.perf_counter() - scanStart
         numSongs = len(addedSongs)
+
         songsText = 'song'
         if numSongs == 0 or numSongs > 1:
             songsText += 's'
         print(f'{numSongs} new {songsText} added.')
-        print()
\ No newline at end of file
+        if elapsed > 0:
+            print(f'Scan took {elapsed:.2f}s ({numSongs / elapsed:.0f} files/sec).')
+        offerToMergeDuplicates(settings, addedSongs)
+        print()
+
+def createStatsMenu():
+    stats = getStats()
+    if not stats:
+        print(f'Stats are turned off. Set the {statsEnvironmentVariable} environment variable to collect them from the start.')
+        confirm = input('Would you like to turn them on for the rest of this session? (yes/no): ')
+        if confirm.lower() == 'yes':
+            enableStats()
+            print('Stats are turned on!')
+        print()
+        return
+
+    stats.print()
+    print()
+
+def createRescanMenu(settings: UserSettings):
+    if len(settings.libraryRoots) == 0 and len(settings.getSongs()) == 0:
+        print('There are no songs to rescan. Please add songs via the main menu first.')
+        return
+
+    print('Rescanning library for changes...')
+    result = settings.rescanLibrary()
+    print(f'{result.unchanged} unchanged, {len(result.updated)} updated, {len(result.moved)} moved, {len(result.added)} added, {len(result.removed)} removed.')
+    for song in result.moved:
+        print(f'Moved: {song.getTitle()} -> {song.getPath()}')
+    for song in result.added:
+        print(f'Added: {song.getTitle()}')
+    for song in result.removed:
+        print(f'Removed: {song.getPath()}')
+    # songs of libraries from before fingerprinting were just fingerprinted as well, so every copy is looked at
+    offerToMergeDuplicates(settings, settings.getSongs())
+    print()
@@ -1,5 +1,7 @@
 from typing import Callable
-from consoleLogic.consoleLogic import printSongs
+from consoleLogic.consoleLogic import createSongListing, searchPrompt, searchSongs
+from consoleLogic.pagedListing import PagedListing
+from consoleLogic.selection import getSearchQuery, isSearch, isSelection, parseSelection, searchHelp, selectionHelp
 from menu import Menu
 from menuOption import MenuOption
 from playable.playlist import Playlist
@@ -15,37 +17,70 @@ def promptForSongs(settings: UserSettings, prompt: str, validateSong: Callable[[
 
     print()
     print(prompt)
+    songListing = createSongListing(searchSongs(settings, getSearchQuery(input(searchPrompt))))
 
     def getOptionLoop() -> str:
         print()
-        print('All playable songs:')
-        printSongs(mp3Files)
+        print('Playable songs:')
+        songListing.print()
         print()
 
-        return input('Please enter the number of the song or playlist you would like to add or STOP to stop adding songs: ')
+        return input(f'Please enter the songs you would like to add ({selectionHelp}), {searchHelp} or STOP to stop adding songs: ')
+
+    def addSongs(songs: list[Song]):
+        rejectedSongs: list[Song] = []
+        for song in songs:
+            if validateSong(song):
+                whatToDoWithEachSong(song)
+            else:
+                rejectedSongs.append(song)
+
+        if len(rejectedSongs) > 0:
+            # asked once for all of them, not once per song
+            question = 'Would you still like to add the song? (yes/no):' if len(rejectedSongs) == 1 \
+                else f'Would you still like to add these {len(rejectedSongs)} songs? (yes/no):'
+            confirm = input(question)
+            while confirm.lower() != 'yes' and confirm.lower() != 'no':
+                confirm = input(question)
+            if confirm.lower() == 'yes':
+                for song in rejectedSongs:
+                    whatToDoWithEachSong(song)
 
     option = getOptionLoop()
 
     while option.upper() != 'STOP':
-        if option.isnumeric():
-            songIdx = int(option)
-            if songIdx > 0 and songIdx <= len(mp3Files):
-                song = mp3Files[songIdx-1]
-                if not validateSong(song):
-                    confirm = input('Would you still like to add the song? (yes/no):')
-                    while confirm.lower() != 'yes' and confirm.lower() != 'no':
-                        confirm = input('Would you still like to add the song? (yes/no):')
-                    if confirm.lower() == 'yes':
-                        whatToDoWithEachSong(song)
-                else:
-                    whatToDoWithEachSong(song)
+        if not isSearch(option) and isSelection(option):
+            selection = parseSelection(option, len(songListing.items))
+            if selection is not None:
+                addSongs([songListing.items[i] for i in selection])
             else:
                 print('Invalid option!')
-        else:
-            print('Invalid option!')
+        elif isSearch(option) or not songListing.handleCommand(option):
+            songListing.setItems(searchSongs(settings, getSearchQuery(option)))
 
         option = getOptionLoop()
 
+# songs of songsWithIdx that match the search, best matches first
+def filterSongsWithIdx(settings: UserSettings, songsWithIdx: list[tuple[Song, int]], query: str) -> list[tuple[Song, int]]:
+    if not query.strip():
+        return songsWithIdx
+
+    ranks = { song.id: rank for rank, song in enumerate(settings.searchSongs(query)) }
+    def getRank(songWithIdx: tuple[Song, int]) -> int:
+        return ranks[songWithIdx[0].id]
+
+    matches = sorted([x for x in songsWithIdx if x[0].id in ranks], key=getRank)
+    print(f'{len(matches)} songs match "{query}".')
+
+    return matches
+
+def getSongWithIdxDisplayString(songWithIdx: tuple[Song, int]) -> str:
+    return songWithIdx[0].getSongName()
+
+# the text only depends on the song, so the same song at another index shares it
+def getSongWithIdxKey(songWithIdx: tuple[Song, int]) -> str:
+    return songWithIdx[0].id
+
 def createNewPlaylistMenu(settings: UserSettings):
     def validatePlaylistName(playlistName: str) -> bool:
         if len(playlistName) == 0:
@@ -68,8 +103,10 @@ def createNewPlaylistMenu(settings: UserSettings):
 
     # check to see if the song has already been added
     def validateSong(song: Song) -> bool:
-        print('This song has already been added to the new playlist!')
-        return not song.id in songIds
+        if song.id in songIds:
+            print(f'{song.getSongName()} has already been added to the new playlist!')
+            return False
+        return True
 
     promptForSongs(settings, 'Create a playlist from the playable songs:', validateSong, addSong)
 
@@ -103,8 +140,7 @@ def addSongsToPlaylist(settings: UserSettings, playlist: Playlist):
     
     promptForSongs(settings, f'Add songs to playlist "{playlist.name}":', validateSong, addSong)
 
-    for song in songsToAdd:
-        playlist.addSong(song)
+    settings.addSongsToPlaylist(playlist, songsToAdd)
 
 def promptForAndActOnSelectedPlaylist(settings: UserSettings, playlist: Playlist, prompt: str, whatToDoWithPlaylist: Callable[[Playlist], None]):
     print(prompt)
@@ -139,8 +175,9 @@ def addSongsFromPlaylistToPlaylist(settings: UserSettings, playlist: Playlist):
     prompt = f'Select another playlist. All of the songs from that playlist will be added to {playlist.name}'
 
     def addSongs(selectedPlaylist: Playlist):
-        for s in selectedPlaylist.getFlattenedSongsIncludingDownstream():
-            playlist.addSong(s)
+        songs = selectedPlaylist.getFlattenedSongsIncludingDownstream()
+        settings.addSongsToPlaylist(playlist, songs)
+        for s in songs:
             print(f'Added {s.getTitle()} to {playlist.name}!')
 
     promptForAndActOnSelectedPlaylist(settings, playlist, prompt, addSongs)
@@ -158,26 +195,42 @@ def addDownstreamPlaylist(settings: UserSettings, playlist: Playlist):
     promptForAndActOnSelectedPlaylist(settings, playlist, prompt, addDownstream)
 
 def removeSongsFromPlaylist(settings: UserSettings, playlist: Playlist):
+    # every song with its index in the flattened playlist, and the ones matching the current search
+    songsWithIdx: list[tuple[Song, int]] = []
+    shownSongsWithIdx: list[tuple[Song, int]] = []
+    songListing = PagedListing(shownSongsWithIdx, getSongWithIdxDisplayString, getSongWithIdxKey, 'There are no songs :(')
+
+    def listAllSongs():
+        nonlocal songsWithIdx, shownSongsWithIdx
+        songsWithIdx = [(song, i) for i, song in enumerate(playlist.getFlattenedSongs())]
+        shownSongsWithIdx = songsWithIdx
+        songListing.setItems(shownSongsWithIdx)
+
+    listAllSongs()
     option = ''
-    while len(playlist.songs) > 0 and option.upper() != 'STOP':
-        flattenedSongs = playlist.getFlattenedSongs()
-        printSongs(flattenedSongs)
-        option = input('Please enter the number of the song you would like to remove from the playlist or STOP to stop removing songs: ')
-
-        if option.isnumeric():
-            idx = int(option)
-            if idx <= len(flattenedSongs) and idx > 0:
-                songToRemove = flattenedSongs[idx-1]
-                settings.removeSongFromPlaylist(playlist, idx-1)
-                print(f'{songToRemove.getSongName()} has been removed from {playlist.name}!')
-                if len(playlist.songs) == 0:
+    while not playlist.isEmpty() and option.upper() != 'STOP':
+        songListing.print()
+        option = input(f'Please enter the songs you would like to remove from the playlist ({selectionHelp}), {searchHelp} to filter the songs or STOP to stop removing songs: ')
+
+        if not isSearch(option) and isSelection(option):
+            selection = parseSelection(option, len(shownSongsWithIdx))
+            if selection is not None:
+                songsToRemove = [shownSongsWithIdx[i] for i in selection]
+                # removed all at once, so the indices of the other songs don't shift in between
+                settings.removeSongsFromPlaylist(playlist, [x[1] for x in songsToRemove])
+                for song, _ in songsToRemove:
+                    print(f'{song.getSongName()} has been removed from {playlist.name}!')
+                if playlist.isEmpty():
                     print(f'All songs have been removed from "{playlist.name}"! "{playlist.name}" has been deleted!')
+                else:
+                    listAllSongs()
             else:
                 print('Invalid selection!')
-        elif option.upper() != 'STOP':
-            print('Invalid selection!')
+        elif isSearch(option) or (option.upper() != 'STOP' and not songListing.handleCommand(option)):
+            shownSongsWithIdx = filterSongsWithIdx(settings, songsWithIdx, getSearchQuery(option))
+            songListing.setItems(shownSongsWithIdx)
 
-def linkSongsMenu(playlist: Playlist):
+def linkSongsMenu(settings: UserSettings, playlist: Playlist):
     # currently don't allow even selecting songs that are already linked
     songsWithIdx = playlist.getLinkableSongs()
     if len(songsWithIdx) <= 1:
@@ -188,37 +241,50 @@ def linkSongsMenu(playlist: Playlist):
     print('Choose songs to link:')
 
     selectedIndices: list[int] = []
+    # the linkable songs that are listed, all of them until a search narrows them down
+    shownSongsWithIdx = songsWithIdx
+    songListing = PagedListing(shownSongsWithIdx, getSongWithIdxDisplayString, getSongWithIdxKey, 'There are no songs :(')
 
     def getOptionLoop() -> str:
         print()
         print('Songs in playlist:')
-        songs = [x[0] for x in songsWithIdx]
-        printSongs(songs)
+        songListing.print()
         print()
         if len(selectedIndices) > 0:
-            linkedSongs: list[str] = [playlist.songs[x].getSongName() for x in selectedIndices]
+            linkedSongs: list[str] = [playlist.getEntry(x).getSongName() for x in selectedIndices]
             linkedSongsText = ', '.join(linkedSongs)
             print(f'Songs already in link: [{linkedSongsText}]')
 
-        return input('Please enter the number of the song you would like to link or STOP to stop linking songs: ')
+        return input(f'Please enter the songs you would like to link ({selectionHelp}), {searchHelp} to filter the songs or STOP to stop linking songs: ')
 
     option = getOptionLoop()
 
     while option.upper() != 'STOP':
-        if option.isnumeric():
-            songIdx = int(option)
-            if songIdx > 0 and songIdx <= len(songsWithIdx):
-                selection = songsWithIdx.pop(songIdx-1)
-                selectedIndices.append(selection[1])
+        if not isSearch(option) and isSelection(option):
+            selection = parseSelection(option, len(shownSongsWithIdx))
+            if selection is not None:
+                selectedEntries = set()
+                for i in selection:
+                    selectedIndices.append(shownSongsWithIdx[i][1])
+                    selectedEntries.add(shownSongsWithIdx[i][1])
+
+                # selected songs can't be selected again
+                def isUnselected(songWithIdx: tuple[Song, int]) -> bool:
+                    return songWithIdx[1] not in selectedEntries
+
+                songsWithIdx = list(filter(isUnselected, songsWithIdx))
+                shownSongsWithIdx = list(filter(isUnselected, shownSongsWithIdx))
+                songListing.items = shownSongsWithIdx
             else:
                 print('Invalid option!')
-        else:
-            print('Invalid option!')
+        elif isSearch(option) or not songListing.handleCommand(option):
+            shownSongsWithIdx = filterSongsWithIdx(settings, songsWithIdx, getSearchQuery(option))
+            songListing.setItems(shownSongsWithIdx)
 
         option = getOptionLoop()
 
     if len(selectedIndices) > 1:
-        playlist.linkSongs(selectedIndices)
+        settings.linkSongs(playlist, selectedIndices)
 
 def chooseEditPlaylistActionMenu(settings: UserSettings, playlist: Playlist):
     def getInitialPrompt():
@@ -244,10 +310,10 @@ def chooseEditPlaylistActionMenu(settings: UserSettings, playlist: Playlist):
         removeSongsFromPlaylist(settings, playlist)
 
     def linkSongsMenuWrapper():
-        linkSongsMenu(playlist)
+        linkSongsMenu(settings, playlist)
 
     def shouldStopEditing():
-        return len(playlist.songs) == 0
+        return playlist.isEmpty()
     
     menu.addMenuOption(MenuOption('RENAME', 'Rename playlist.', renamePlaylistWrapper))
     menu.addMenuOption(MenuOption('ADD', 'Add songs', addSongsToPlaylistWrapper))
@@ -0,0 +1,170 @@
+from typing import Union
+from consoleLogic.selection import selectionHelp
+from daemonClient import DaemonClient
+from menu import Menu
+from menuOption import MenuOption
+
+# prints the daemon's error instead of raising it
+def sendRequest(client: DaemonClient, command: str, **args) -> Union[dict, None]:
+    try:
+        return client.request(command, **args)
+    except OSError as e:
+        print(f'Error: {e}')
+        return None
+
+def printStatus(client: DaemonClient):
+    status = sendRequest(client, 'status')
+    if not status:
+        return
+
+    if status['song']:
+        print(f'{status["state"].capitalize()}: {status["song"]["title"]} ({status["positionSeconds"]:.0f}s)')
+    else:
+        print('Nothing is playing.')
+    for i, song in enumerate(status['upNext']):
+        print(f'Up next {i + 1}: {song["title"]}')
+
+def chooseSong(client: DaemonClient) -> Union[dict, None]:
+    query = input('Search by title, artist, album or filename: ')
+    response = sendRequest(client, 'songs', query=query, limit=50)
+    if not response:
+        return None
+    songs = response['songs']
+    if len(songs) == 0:
+        print('No songs match the search.')
+        return None
+
+    for i, song in enumerate(songs):
+        print(f'{i + 1}. {song["title"]}')
+    option = input('Please enter the number of the song: ')
+    if option.isnumeric() and 0 < int(option) <= len(songs):
+        return songs[int(option) - 1]
+
+    print('Invalid option!')
+    return None
+
+def choosePlaylist(client: DaemonClient) -> Union[dict, None]:
+    response = sendRequest(client, 'playlists')
+    if not response:
+        return None
+    playlists = response['playlists']
+    if len(playlists) == 0:
+        print('There are no playlists. Try creating one first!')
+        return None
+
+    for i, playlist in enumerate(playlists):
+        print(f'{i + 1}. {playlist["name"]} ({playlist["songCount"]} songs)')
+    option = input('Please enter the number of the playlist: ')
+    if option.isnumeric() and 0 < int(option) <= len(playlists):
+        return playlists[int(option) - 1]
+
+    print('Invalid option!')
+    return None
+
+def createDaemonPlayMenu(client: DaemonClient):
+    option = input('Play a SONG, a PLAYLIST or ALL songs? Prefix PLAYLIST or ALL with \'S\' to shuffle: ').upper()
+    shouldShuffle = option.startswith('S') and option != 'SONG'
+    if shouldShuffle:
+        option = option[1:]
+
+    if option == 'SONG':
+        song = chooseSong(client)
+        if song:
+            sendRequest(client, 'play', songId=song['id'])
+    elif option == 'PLAYLIST':
+        playlist = choosePlaylist(client)
+        if playlist:
+            sendRequest(client, 'play', playlist=playlist['id'], shuffle=shouldShuffle)
+    elif option == 'ALL':
+        sendRequest(client, 'play', shuffle=shouldShuffle)
+    else:
+        print('Invalid option!')
+
+def createDaemonQueueMenu(client: DaemonClient):
+    song = chooseSong(client)
+    if song:
+        sendRequest(client, 'queue', songId=song['id'])
+
+def createDaemonAddSongMenu(client: DaemonClient):
+    songpath = input('Provide a path to an mp3 or directory you would like to add to the song database: ')
+    response = sendRequest(client, 'addSongs', path=songpath)
+    if response:
+        for song in response['added']:
+            print(f'Added {song["title"]}')
+        print(f'{len(response["added"])} new songs added.')
+
+def createDaemonPlaylistMenu(client: DaemonClient):
+    option = input('CREATE a playlist, ADD a song to one or REMOVE songs from one? ').upper()
+    if option == 'CREATE':
+        name = input('Name of the new playlist: ')
+        song = chooseSong(client)
+        if song and sendRequest(client, 'createPlaylist', name=name, songIds=[song['id']]):
+            print(f'Created playlist {name}!')
+    elif option == 'ADD':
+        playlist = choosePlaylist(client)
+        song = chooseSong(client) if playlist else None
+        if song and sendRequest(client, 'addToPlaylist', playlist=playlist['id'], songIds=[song['id']]):
+            print(f'Added {song["title"]} to {playlist["name"]}!')
+    elif option == 'REMOVE':
+        playlist = choosePlaylist(client)
+        if playlist:
+            selection = input(f'Songs to remove ({selectionHelp}): ')
+            if sendRequest(client, 'removeFromPlaylist', playlist=playlist['id'], songs=selection):
+                print(f'Removed songs from {playlist["name"]}!')
+    else:
+        print('Invalid option!')
+
+# the console when a player daemon is running, every option is a request to the daemon
+# nothing is loaded here, so the console starts right away and music keeps playing after it exits
+def createDaemonMenu(client: DaemonClient):
+    def playMenu():
+        createDaemonPlayMenu(client)
+
+    def queueMenu():
+        createDaemonQueueMenu(client)
+
+    def skip():
+        sendRequest(client, 'skip')
+
+    def pause():
+        sendRequest(client, 'pause')
+
+    def resume():
+        sendRequest(client, 'resume')
+
+    def stop():
+        sendRequest(client, 'stop')
+
+    def status():
+        printStatus(client)
+
+    def addSongMenu():
+        createDaemonAddSongMenu(client)
+
+    def playlistMenu():
+        createDaemonPlaylistMenu(client)
+
+    # the menu exits after shutdown, since the daemon is gone
+    isShutDown = False
+
+    def shutdown():
+        nonlocal isShutDown
+        isShutDown = sendRequest(client, 'shutdown') is not None
+
+    def hasShutDown() -> bool:
+        return isShutDown
+
+    menu = Menu('Connected to the running player. What would you like to do?')
+    menu.addMenuOption(MenuOption('PLAY', 'Play a song, a playlist or the whole library.', playMenu))
+    menu.addMenuOption(MenuOption('QUEUE', 'Play a song after the current one.', queueMenu))
+    menu.addMenuOption(MenuOption('SKIP', 'Skip the current song.', skip))
+    menu.addMenuOption(MenuOption('PAUSE', 'Pause the current song.', pause))
+    menu.addMenuOption(MenuOption('RESUME', 'Resume the current song.', resume))
+    menu.addMenuOption(MenuOption('STOP', 'Stop playing.', stop))
+    menu.addMenuOption(MenuOption('STATUS', 'Show what is playing.', status))
+    menu.addMenuOption(MenuOption('ADD', 'Provide the path of a directory or file to add to the music library.', addSongMenu))
+    menu.addMenuOption(MenuOption('LIST', 'Create/edit playlist.', playlistMenu))
+    menu.addMenuOption(MenuOption('SHUTDOWN', 'Stop the player and close the application.', shutdown))
+    menu.addMenuOption(MenuOption('EXIT', 'Close the console, music keeps playing.', None))
+
+    menu.getAndExecuteMenuCommand(stopCondition=hasShutDown)
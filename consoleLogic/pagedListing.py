@@ -0,0 +1,65 @@
+from math import ceil
+from typing import Any, Callable, Hashable
+
+defaultPageSize = 20
+
+# numbered listing that only prints one page at a time
+# the text of each item is built the first time it is shown and reused after that, e.g. so a song's tags are only
+# looked up once no matter how often the page is printed. Items keep the number of their position in the whole list.
+# texts are cached by a key that stays the same for the same item (e.g. the song id), even when the list of items is
+# rebuilt with new objects for them
+class PagedListing:
+    def __init__(self, items: list, getDisplayString: Callable[[Any], str], getKey: Callable[[Any], Hashable], emptyMessage: str, pageSize: int = defaultPageSize):
+        self.getDisplayStringUncached = getDisplayString
+        self.getKey = getKey
+        self.emptyMessage = emptyMessage
+        self.pageSize = pageSize
+        # key of the item -> text
+        self.displayStrings: dict[Hashable, str] = {}
+        self.items: list = []
+        self.page = 0
+        self.setItems(items)
+
+    def setItems(self, items: list):
+        self.items = items
+        self.page = 0
+
+    def getPageCount(self) -> int:
+        return max(1, ceil(len(self.items) / self.pageSize))
+
+    def getDisplayString(self, item: Any) -> str:
+        key = self.getKey(item)
+        displayString = self.displayStrings.get(key)
+        if displayString is None:
+            displayString = self.getDisplayStringUncached(item)
+            self.displayStrings[key] = displayString
+
+        return displayString
+
+    def print(self, numberOffset: int = 0):
+        if len(self.items) == 0:
+            print(self.emptyMessage)
+            return
+
+        # the current page may be past the end after items were removed
+        self.page = min(self.page, self.getPageCount() - 1)
+        start = self.page * self.pageSize
+        for i in range(start, min(start + self.pageSize, len(self.items))):
+            print(f'{numberOffset+i+1}: {self.getDisplayString(self.items[i])}')
+
+        if self.getPageCount() > 1:
+            print(f'Page {self.page+1}/{self.getPageCount()} of {len(self.items)} - NEXT/PREV to turn the page, PAGE <number> to jump to a page.')
+
+    # handles NEXT, PREV and PAGE <number>, returns False for anything else
+    def handleCommand(self, command: str) -> bool:
+        words = command.upper().split()
+        if words == ['NEXT']:
+            self.page = min(self.page + 1, self.getPageCount() - 1)
+        elif words == ['PREV']:
+            self.page = max(self.page - 1, 0)
+        elif len(words) == 2 and words[0] == 'PAGE' and words[1].isnumeric():
+            self.page = min(max(int(words[1]) - 1, 0), self.getPageCount() - 1)
+        else:
+            return False
+
+        return True
@@ -0,0 +1,41 @@
+import re
+from typing import Union
+
+# numbers and ranges separated by commas, e.g. "1-50,73,90-120", or ALL for everything that is listed
+selectionPattern = re.compile(r'^\s*(ALL|\d+(\s*-\s*\d+)?(\s*,\s*\d+(\s*-\s*\d+)?)*)\s*$', re.IGNORECASE)
+
+def isSelection(text: str) -> bool:
+    return selectionPattern.match(text) is not None
+
+# maps a selection of 1-based numbers to 0-based indices into a list of itemCount items, in the order they were
+# entered and without duplicates, or None if a number is out of range
+def parseSelection(text: str, itemCount: int) -> Union[list[int], None]:
+    if not isSelection(text):
+        return None
+    if text.strip().upper() == 'ALL':
+        return list(range(itemCount))
+
+    indices: dict[int, None] = {}
+    for part in text.split(','):
+        bounds = [int(x) for x in part.split('-')]
+        first, last = bounds[0], bounds[-1]
+        if first < 1 or last < first or last > itemCount:
+            return None
+        for number in range(first, last + 1):
+            indices[number - 1] = None
+
+    return list(indices)
+
+selectionHelp = 'numbers and ranges like 1-50,73,90-120, ALL for every listed song'
+
+# text starting with this is always searched for, so that numbers, ALL and the paging commands can be searched too
+searchPrefix = '/'
+
+def isSearch(text: str) -> bool:
+    return text.lstrip().startswith(searchPrefix)
+
+# what to search for, without the search prefix if the text has one
+def getSearchQuery(text: str) -> str:
+    return text.lstrip()[len(searchPrefix):] if isSearch(text) else text
+
+searchHelp = f'a search (start it with {searchPrefix} to search for numbers)'
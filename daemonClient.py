@@ -0,0 +1,89 @@
+import json
+from os import error, path
+import socket
+import sys
+from typing import Union
+
+# the daemon listens on this file in the directory it was started from
+socketFileName = 'the_good_part.sock'
+
+# a daemon that is still running accepts connections, a socket file left behind by one that crashed doesn't
+def isDaemonRunning(socketFullPath: str) -> bool:
+    if not hasattr(socket, 'AF_UNIX') or not path.exists(socketFullPath):
+        return False
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socketFullPath)
+            return True
+        except OSError:
+            return False
+
+# connection to a running PlayerDaemon, see playerDaemon.py for the protocol
+# disposable class, the connection is closed when the with block exits
+class DaemonClient:
+    def __init__(self, socketFullPath: str):
+        self.socketFullPath = socketFullPath
+        self.connection: Union[socket.socket, None] = None
+        self.responses = None
+
+    def __enter__(self):
+        self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.connection.connect(self.socketFullPath)
+        self.responses = self.connection.makefile('rb')
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.responses.close()
+        self.connection.close()
+        self.connection = None
+
+    # sends a command and returns the daemon's answer, raises an error with the daemon's message if it failed
+    def request(self, command: str, **args) -> dict:
+        try:
+            self.connection.sendall((json.dumps({ 'command': command, **args }) + '\n').encode())
+        except BrokenPipeError:
+            # not passed on as is, a broken pipe means that the output was closed, see main.runSubcommand()
+            raise error('The player closed the connection!')
+        line = self.responses.readline()
+        if not line:
+            raise error('The player closed the connection!')
+
+        response = json.loads(line)
+        if not response.get('ok'):
+            raise error(response.get('error'))
+
+        return response
+
+# command line arguments of the form key=value, values are read as json where possible, e.g. shuffle=true
+def parseArgs(args: list[str]) -> dict:
+    parsed = {}
+    for arg in args:
+        key, _, value = arg.partition('=')
+        try:
+            parsed[key] = json.loads(value)
+        except ValueError:
+            parsed[key] = value
+
+    return parsed
+
+# sends a single command, e.g. for scripts and hotkeys
+# usage: python daemonClient.py <command> [key=value ...], e.g. python daemonClient.py play playlist=Favourites shuffle=true
+def main():
+    if len(sys.argv) < 2:
+        print('usage: python daemonClient.py <command> [key=value ...]')
+        sys.exit(2)
+
+    if not isDaemonRunning(f'./{socketFileName}'):
+        print('No player is running here, start one with: python main.py daemon')
+        sys.exit(1)
+
+    try:
+        with DaemonClient(f'./{socketFileName}') as client:
+            print(json.dumps(client.request(sys.argv[1], **parseArgs(sys.argv[2:])), indent=4))
+    except OSError as e:
+        print(f'Error: {e}')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+from typing import Iterable
+
+# list of non-negative counts that supports prefix sums, updates and appends in O(log n)
+# findIndex maps a position in the concatenation of all counts back to the index holding it, e.g. the index of a
+# song in a playlist to the entry (song or linked songs) that contains it
+class FenwickTree:
+    def __init__(self, values: Iterable[int] = ()):
+        # 1-based, tree[i] holds the sum of the values in (i - lowbit(i), i]
+        self.tree: list[int] = [0]
+        self.values: list[int] = []
+        for value in values:
+            self.values.append(value)
+            self.tree.append(value)
+        for i in range(1, len(self.tree)):
+            parent = i + (i & -i)
+            if parent < len(self.tree):
+                self.tree[parent] += self.tree[i]
+        self.total = sum(self.values)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def get(self, index: int) -> int:
+        return self.values[index]
+
+    def append(self, value: int):
+        self.values.append(value)
+        i = len(self.values)
+        # the new node covers the values in (i - lowbit(i), i]
+        self.tree.append(value + self.prefixSum(i - 1) - self.prefixSum(i - (i & -i)))
+        self.total += value
+
+    def add(self, index: int, delta: int):
+        self.values[index] += delta
+        self.total += delta
+        i = index + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    # sum of the first count values
+    def prefixSum(self, count: int) -> int:
+        total = 0
+        i = count
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+
+        return total
+
+    # index of the value that contains position, i.e. the smallest index with prefixSum(index + 1) > position
+    def findIndex(self, position: int) -> int:
+        if position < 0 or position >= self.total:
+            raise IndexError(f'Position {position} is out of range!')
+
+        index = 0
+        step = 1 << (len(self.tree) - 1).bit_length()
+        while step > 0:
+            nextIndex = index + step
+            if nextIndex < len(self.tree) and self.tree[nextIndex] <= position:
+                index = nextIndex
+                position -= self.tree[nextIndex]
+            step >>= 1
+
+        return index
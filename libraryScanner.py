@@ -0,0 +1,137 @@
+from collections import deque
+import hashlib
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from os import path
+from typing import Callable, Iterable, Iterator, Union
+from stats import getStats
+from tagCache import TagCache, readTags
+
+class ScanProgress:
+    def __init__(self):
+        self.filesFound = 0
+        self.filesScanned = 0
+        self.startTime = time.perf_counter()
+
+    def getElapsedSeconds(self) -> float:
+        return time.perf_counter() - self.startTime
+
+    def getFilesPerSecond(self) -> float:
+        elapsed = self.getElapsedSeconds()
+        if elapsed <= 0:
+            return 0.0
+
+        return self.filesScanned / elapsed
+
+class ScannedFile:
+    def __init__(self, fullpath: str, mtime: int, size: int, inode: int, contentHash: str, tags: dict[str, str]):
+        self.path = fullpath
+        self.mtime = mtime
+        self.size = size
+        self.inode = inode
+        self.contentHash = contentHash
+        self.tags = tags
+
+# bytes read from each end of the file when hashing
+contentHashChunkSize = 64 * 1024
+
+def computeContentHash(fullpath: str, size: int) -> str:
+    # hashing the size and both ends of the file is enough to recognize a moved file without reading all of it
+    hasher = hashlib.sha1(str(size).encode())
+    with open(fullpath, 'rb') as file:
+        hasher.update(file.read(contentHashChunkSize))
+        if size > contentHashChunkSize * 2:
+            file.seek(-contentHashChunkSize, os.SEEK_END)
+            hasher.update(file.read(contentHashChunkSize))
+
+    return hasher.hexdigest()
+
+def isMp3(filename: str) -> bool:
+    return filename.endswith('.mp3')
+
+def walkMp3Files(rootPath: str) -> Iterator[str]:
+    if path.isfile(rootPath):
+        if isMp3(rootPath):
+            yield rootPath
+        return
+
+    # iterative walk so that deeply nested libraries can't hit the recursion limit
+    dirsToScan = [rootPath]
+    while len(dirsToScan) > 0:
+        dirPath = dirsToScan.pop()
+        try:
+            with os.scandir(dirPath) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        dirsToScan.append(entry.path)
+                    elif isMp3(entry.name) and entry.is_file():
+                        yield entry.path
+        except OSError:
+            # unreadable directories are skipped rather than aborting the whole scan
+            continue
+
+# walks directory trees and reads the tags of every mp3 on a thread pool
+# results are yielded while the scan is still running, in the order the files were found, so callers can show them early
+class LibraryScanner:
+    def __init__(self, tagCache: TagCache, maxWorkers: int = None):
+        self.tagCache = tagCache
+        if not maxWorkers:
+            # tag parsing mostly waits on disk/network reads, so use more threads than cores
+            maxWorkers = min(32, (os.cpu_count() or 1) * 4)
+        self.maxWorkers = maxWorkers
+
+    def scanFile(self, fullpath: str) -> Union[ScannedFile, None]:
+        try:
+            stat = os.stat(fullpath)
+            contentHash = computeContentHash(fullpath, stat.st_size)
+        except OSError:
+            return None
+
+        tags = self.tagCache.getCachedTags(fullpath, stat.st_mtime_ns, stat.st_size)
+        if tags is None:
+            tags = readTags(fullpath)
+
+        return ScannedFile(fullpath, stat.st_mtime_ns, stat.st_size, stat.st_ino, contentHash, tags)
+
+    def scan(self, rootPath: str, shouldSkip: Callable[[str], bool] = None, onProgress: Callable[[ScanProgress], None] = None) -> Iterator[ScannedFile]:
+        def getPathsToScan() -> Iterator[str]:
+            for fullpath in walkMp3Files(rootPath):
+                if not shouldSkip or not shouldSkip(fullpath):
+                    yield fullpath
+
+        return self.scanPaths(getPathsToScan(), onProgress)
+
+    def scanPaths(self, paths: Iterable[str], onProgress: Callable[[ScanProgress], None] = None) -> Iterator[ScannedFile]:
+        progress = ScanProgress()
+        # bound the amount of queued work so that huge trees don't pile up futures in memory
+        maxPending = self.maxWorkers * 4
+        # oldest first, results are yielded in the order of the paths so that the library order doesn't depend on
+        # which thread finishes first
+        pending: deque[Future] = deque()
+
+        def collectOldest() -> Iterator[ScannedFile]:
+            progress.filesScanned += 1
+            scanned: Union[ScannedFile, None] = pending.popleft().result()
+            if scanned:
+                # written as results are collected, the cache locks its entries against songs loading their tags meanwhile
+                self.tagCache.putTags(scanned.path, scanned.mtime, scanned.size, scanned.tags)
+                yield scanned
+            if onProgress:
+                onProgress(progress)
+
+        with ThreadPoolExecutor(max_workers=self.maxWorkers) as executor:
+            for fullpath in paths:
+                progress.filesFound += 1
+                pending.append(executor.submit(self.scanFile, fullpath))
+                if len(pending) >= maxPending:
+                    yield from collectOldest()
+
+            while len(pending) > 0:
+                yield from collectOldest()
+
+        stats = getStats()
+        if stats:
+            # throughput is the number of files over the total time of the scans
+            stats.increment('scan.filesScanned', progress.filesScanned)
+            stats.recordTime('scan.duration', progress.getElapsedSeconds())
@@ -0,0 +1,166 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+from typing import Union
+import numpy as np
+import pygame
+from pygame import mixer
+
+# loudness is measured the way ITU-R BS.1770 does it, on blocks of 400ms that overlap by 300ms
+hopSeconds = 0.1
+hopsPerBlock = 4
+# blocks quieter than this don't count at all, e.g. silence between tracks of a live album
+absoluteGateDb = -70.0
+# blocks this much quieter than the loudness of the blocks above the absolute gate don't count either
+relativeGateDb = -10.0
+# workers run at a lower priority than the player, so that analysing never makes playback stutter
+analysisNiceness = 10
+
+def powerToLoudness(power):
+    return -0.691 + 10 * np.log10(power)
+
+# integrated loudness of 16 bit samples (one row per frame, one column per channel) in LUFS, or None for silence
+# the mean square of every 100ms of every channel is computed in one pass, and the overlapping blocks are sums of 4 of
+# those, so the song is only read once. The K-weighting filter of BS.1770 is left out, which makes songs with a lot of
+# bass measure a little louder than they sound.
+def computeLoudness(samples: np.ndarray, frequency: int) -> Union[float, None]:
+    hopFrames = int(frequency * hopSeconds)
+    hopCount = len(samples) // hopFrames
+    if hopFrames == 0 or hopCount < hopsPerBlock:
+        return None
+
+    values = samples[:hopCount * hopFrames].astype(np.float32)
+    values /= 32768
+    np.square(values, out=values)
+    # channels are summed after averaging, as BS.1770 weighs the front channels equally
+    hopPower = values.reshape(hopCount, hopFrames, -1).mean(axis=1, dtype=np.float64).sum(axis=1)
+    cumulativePower = np.concatenate(([0.0], np.cumsum(hopPower)))
+    blockPower = (cumulativePower[hopsPerBlock:] - cumulativePower[:-hopsPerBlock]) / hopsPerBlock
+
+    with np.errstate(divide='ignore'):
+        blockLoudness = powerToLoudness(blockPower)
+    audible = blockLoudness > absoluteGateDb
+    if not audible.any():
+        return None
+
+    gate = max(absoluteGateDb, float(powerToLoudness(blockPower[audible].mean())) + relativeGateDb)
+    gated = blockPower[blockLoudness > gate]
+    if len(gated) == 0:
+        return None
+
+    return float(powerToLoudness(gated.mean()))
+
+def initAnalysisWorker():
+    if hasattr(os, 'nice'):
+        os.nice(analysisNiceness)
+    # the mixer is only used to decode, so no audio device is opened
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    if mixer.get_init():
+        mixer.quit()
+    mixer.init()
+
+# loudness of an mp3 in LUFS, or None if it can't be decoded or is silent
+def analyzeLoudness(fullpath: str) -> Union[float, None]:
+    try:
+        frequency, _, channels = mixer.get_init()
+        raw = mixer.Sound(fullpath).get_raw()
+    except (pygame.error, OSError, ValueError):
+        return None
+
+    samples = np.frombuffer(raw, dtype=np.int16)
+    return computeLoudness(samples[:len(samples) - len(samples) % channels].reshape(-1, channels), frequency)
+
+# decodes and measures songs on a process pool in the background
+# files wait in a queue until a worker is about to be free, a feeder thread hands them to the pool two per worker at a
+# time, so a whole library doesn't become thousands of pending tasks at once. Urgent files (e.g. songs about to play)
+# go before the others. The results are collected with takeResults(), so nothing waits for the analysis. By default
+# only half of the cpus are used, on top of the lower priority.
+class LoudnessAnalyzer:
+    def __init__(self, maxWorkers: int = None):
+        if not maxWorkers:
+            maxWorkers = max(1, (os.cpu_count() or 1) // 2)
+        self.maxWorkers = maxWorkers
+        self.executor: Union[ProcessPoolExecutor, None] = None
+        # (priority, order, key, path) of the files waiting for the pool, urgent files have the lower priority
+        self.waiting: queue.PriorityQueue = queue.PriorityQueue()
+        self.order = itertools.count()
+        # key -> order of its latest entry, a file queued again as urgent leaves an older entry behind that is skipped
+        self.latestOrders: dict[str, int] = {}
+        # a slot is taken for every file in the pool and given back once it is done
+        self.slots = threading.Semaphore(maxWorkers * 2)
+        self.feeder: Union[threading.Thread, None] = None
+        self.isClosed = False
+        # (key, loudness) of finished files, filled by the executor's thread
+        self.results: queue.SimpleQueue = queue.SimpleQueue()
+
+    def getExecutor(self) -> ProcessPoolExecutor:
+        if not self.executor:
+            # workers import pygame again, which would print its greeting in the middle of the console otherwise
+            os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+            # workers are started fresh rather than forked, a fork would copy the audio device and threads of the player
+            self.executor = ProcessPoolExecutor(max_workers=self.maxWorkers, initializer=initAnalysisWorker,
+                mp_context=multiprocessing.get_context('spawn'))
+
+        return self.executor
+
+    # key is handed back with the loudness of the file, e.g. the id of the song
+    def analyze(self, key: str, fullpath: str, isUrgent: bool = False):
+        if not self.feeder:
+            self.feeder = threading.Thread(target=self.feedExecutor, daemon=True)
+            self.feeder.start()
+        order = next(self.order)
+        self.latestOrders[key] = order
+        self.waiting.put((0 if isUrgent else 1, order, key, fullpath))
+
+    def feedExecutor(self):
+        while True:
+            _, order, key, fullpath = self.waiting.get()
+            if key is None or self.isClosed:
+                return
+            if self.latestOrders.get(key) != order:
+                continue
+            self.latestOrders.pop(key)
+            self.slots.acquire()
+            if self.isClosed:
+                return
+            self.submit(key, fullpath)
+
+    def submit(self, key: str, fullpath: str):
+        def onDone(future: Future):
+            self.slots.release()
+            if future.cancelled():
+                return
+            # e.g. a worker that crashed, the file counts as one that couldn't be measured
+            loudness = future.result() if future.exception() is None else None
+            self.results.put((key, loudness))
+
+        try:
+            self.getExecutor().submit(analyzeLoudness, fullpath).add_done_callback(onDone)
+        except RuntimeError:
+            # the pool broke, e.g. a worker was killed, so nothing more can be measured this session
+            self.slots.release()
+            self.results.put((key, None))
+
+    # results that came in since the last call
+    def takeResults(self) -> list[tuple[str, Union[float, None]]]:
+        results = []
+        while not self.results.empty():
+            results.append(self.results.get_nowait())
+
+        return results
+
+    # files that are still waiting are dropped, they are analysed again the next time
+    def close(self):
+        if self.feeder:
+            self.isClosed = True
+            # wakes the feeder up, whether it waits for a file or for a slot
+            self.waiting.put((-1, next(self.order), None, None))
+            self.slots.release()
+            self.feeder.join()
+            self.feeder = None
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
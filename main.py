@@ -1,26 +1,119 @@
-from consoleLogic.consoleLogic import createAddSongMenu, createPlayMenu
-from consoleLogic.createEditPlaylist import createPlaylistMenu
+import argparse
+import os
+import sys
+from audioCache import getConfiguredMaxBytes
+from consoleLogic.cliCommands import addSubcommands
+from daemonClient import DaemonClient, isDaemonRunning, socketFileName
 from userSettings import UserSettings
 from menu import Menu
 from menuOption import MenuOption
+from stats import enableStats, getStats, statsEnvironmentVariable
 
-settingsFileName = 'the_good_part.settings.json'
+# an existing the_good_part.settings.json is migrated into the database the first time it is created
+settingsFileName = 'the_good_part.settings.db'
+tagCacheFileName = 'the_good_part.tags.json'
+# decoded audio of the songs played most, only kept when turned on, see audioCache.getConfiguredMaxBytes
+audioCacheDirName = 'the_good_part.audio_cache'
+# written on exit when stats are turned on
+statsFileName = 'the_good_part.stats.json'
 
-with UserSettings(f'./{settingsFileName}') as settings:
-    def playMenu():
-        createPlayMenu(settings)
+def openSettings() -> UserSettings:
+    try:
+        audioCacheMaxBytes = getConfiguredMaxBytes()
+    except ValueError as e:
+        print(f'{e}, the audio cache stays off.', file=sys.stderr)
+        audioCacheMaxBytes = None
+    if audioCacheMaxBytes is None:
+        return UserSettings(f'./{settingsFileName}', f'./{tagCacheFileName}')
 
-    def addSongMenu():
-        createAddSongMenu(settings)
+    return UserSettings(f'./{settingsFileName}', f'./{tagCacheFileName}', f'./{audioCacheDirName}', audioCacheMaxBytes)
 
-    def playlistMenu():
-        createPlaylistMenu(settings)
+# the interactive console, the modules it uses load the player (and with it pygame), so they are only imported here
+def runConsole():
+    from consoleLogic.consoleLogic import createAddSongMenu, createPlayMenu, createRescanMenu, createStatsMenu
+    from consoleLogic.createEditPlaylist import createPlaylistMenu
 
-    # set up menu with actions now that settings are available
-    menu = Menu('What would you like to do?')
-    menu.addMenuOption(MenuOption('PLAY', 'View a list of all songs and select one to play.', playMenu))
-    menu.addMenuOption(MenuOption('ADD', 'Provide the path of a directory or file to add to the music library.', addSongMenu))
-    menu.addMenuOption(MenuOption('LIST', 'Create/edit playlist.', playlistMenu))
-    menu.addMenuOption(MenuOption('EXIT', 'Close the application.', None))
+    with openSettings() as settings:
+        def playMenu():
+            createPlayMenu(settings)
 
-    menu.getAndExecuteMenuCommand()
\ No newline at end of file
+        def addSongMenu():
+            createAddSongMenu(settings)
+
+        def rescanMenu():
+            createRescanMenu(settings)
+
+        def playlistMenu():
+            createPlaylistMenu(settings)
+
+        def statsMenu():
+            createStatsMenu()
+
+        # set up menu with actions now that settings are available
+        menu = Menu('What would you like to do?')
+        menu.addMenuOption(MenuOption('PLAY', 'View a list of all songs and select one to play.', playMenu))
+        menu.addMenuOption(MenuOption('ADD', 'Provide the path of a directory or file to add to the music library.', addSongMenu))
+        menu.addMenuOption(MenuOption('RESCAN', 'Sync the music library with changed, moved and deleted files on disk.', rescanMenu))
+        menu.addMenuOption(MenuOption('LIST', 'Create/edit playlist.', playlistMenu))
+        menu.addMenuOption(MenuOption('STATS', 'Show playback, tag loading, settings and scan timings.', statsMenu))
+        menu.addMenuOption(MenuOption('EXIT', 'Close the application.', None))
+
+        menu.getAndExecuteMenuCommand()
+
+# keeps the library and the player loaded until it is shut down, see playerDaemon
+def runDaemon():
+    from playerDaemon import PlayerDaemon
+
+    with openSettings() as settings:
+        print(f'Listening on ./{socketFileName}, press ctrl+c to stop.')
+        PlayerDaemon(settings, f'./{socketFileName}').run()
+
+def runDaemonConsole():
+    from consoleLogic.daemonConsole import createDaemonMenu
+
+    with DaemonClient(f'./{socketFileName}') as client:
+        createDaemonMenu(client)
+
+# runs a subcommand, see consoleLogic.cliCommands, and exits with 1 if it failed
+def runSubcommand(args: argparse.Namespace):
+    try:
+        with openSettings() as settings:
+            args.run(settings, args)
+        # output that is still buffered fails here rather than when the interpreter exits
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # the output was closed after reading enough of it, e.g. piped into head, which isn't an error
+        # stdout is pointed at devnull so that flushing it on exit doesn't fail again
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(0)
+    except OSError as e:
+        print(f'Error: {e}', file=sys.stderr)
+        sys.exit(1)
+
+def main():
+    parser = argparse.ArgumentParser(description='Music player. Without a command, the interactive console is started.')
+    addSubcommands(parser)
+    args = parser.parse_args()
+
+    # stats are opt-in, turned on before loading so that the load is measured too
+    if os.environ.get(statsEnvironmentVariable):
+        enableStats()
+
+    if args.command == 'daemon':
+        runDaemon()
+    elif args.command:
+        runSubcommand(args)
+    elif isDaemonRunning(f'./{socketFileName}'):
+        # the console only sends commands to the running player, nothing has to be loaded
+        runDaemonConsole()
+    else:
+        runConsole()
+
+    # settings are saved when the block above exits, so the stats are written after that
+    stats = getStats()
+    if stats:
+        stats.save(f'./{statsFileName}')
+
+# worker processes (e.g. for fingerprinting) import this module again, which mustn't start the application
+if __name__ == '__main__':
+    main()
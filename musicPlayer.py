@@ -1,16 +1,300 @@
+from enum import Enum
+import mmap
+import threading
+import time
+from os import error
+from typing import Callable, Union
+import pygame
 from pygame import mixer
+from audioCache import AudioCache
+from playable.song import Song
+from stats import getStats
 
+# pygame event posted by the mixer when the current track finishes
+endOfTrackEvent = pygame.USEREVENT + 1
+# how long a single wait for the end event lasts before checking whether to stop waiting (or the mixer stopped)
+endOfTrackWaitMs = 100
+
+class PlayerState(Enum):
+    IDLE = 'idle'
+    LOADING = 'loading'
+    PLAYING = 'playing'
+    PAUSED = 'paused'
+    STOPPED = 'stopped'
+
+allowedTransitions: dict[PlayerState, set[PlayerState]] = {
+    PlayerState.IDLE: { PlayerState.LOADING },
+    PlayerState.LOADING: { PlayerState.PLAYING, PlayerState.STOPPED },
+    # playing -> playing happens when the mixer moves on to a queued track
+    PlayerState.PLAYING: { PlayerState.PLAYING, PlayerState.PAUSED, PlayerState.LOADING, PlayerState.STOPPED },
+    PlayerState.PAUSED: { PlayerState.PLAYING, PlayerState.LOADING, PlayerState.STOPPED },
+    PlayerState.STOPPED: { PlayerState.LOADING, PlayerState.STOPPED },
+}
+
+# songs are played at the volume that brings them to this loudness (in LUFS), the mixer can't make them any louder
+# than they are though, so quieter songs play at full volume
+targetLoudness = -18.0
+# loudness assumed for songs that haven't been measured yet, typical of commercially mastered music
+defaultLoudness = -14.0
+
+def getVolumeForLoudness(loudness: Union[float, None]) -> float:
+    if loudness is None:
+        loudness = defaultLoudness
+
+    return min(1.0, 10 ** ((targetLoudness - loudness) / 20))
+
+# the one playback engine of the process
+# the audio device is only initialized once and songs/playlists ask the engine to play them
 class MusicPlayer:
-    def __init__(self):
+    # audioCache, if given, holds decoded audio of frequently played songs so that they start without decoding
+    # prepareSong, if given, is called with every song before it is handed to the mixer, e.g. to update its loudness
+    def __init__(self, audioCache: AudioCache = None, prepareSong: Callable[[Song], None] = None):
         mixer.init()
+        self.audioCache = audioCache
+        self.prepareSong = prepareSong
+        # memory maps of the cached audio the mixer is reading from, they have to stay open while it plays
+        self.currentBuffer: Union[mmap.mmap, None] = None
+        self.queuedBuffer: Union[mmap.mmap, None] = None
+        self.endOfTrackEventsEnabled = self.enableEndOfTrackEvents()
+        self.state = PlayerState.IDLE
+        self.currentSong: Union[Song, None] = None
+        # song handed to the mixer ahead of time, which it starts by itself as soon as the current song ends
+        self.queuedSong: Union[Song, None] = None
+        self.hasAdvancedToQueued = False
+        self.lastPosition = 0
+        # where in the track playback was (re)started, since the mixer's position starts at 0 on every play/seek
+        self.startOffsetSeconds = 0.0
+        self.trackEndTime: Union[float, None] = None
+        # latency metrics, in seconds
+        self.lastStartLatencySeconds: Union[float, None] = None
+        self.lastGapSeconds: Union[float, None] = None
+
+    def enableEndOfTrackEvents(self) -> bool:
+        try:
+            # the event queue needs the display module, but no window is ever opened
+            if not pygame.display.get_init():
+                pygame.display.init()
+            mixer.music.set_endevent(endOfTrackEvent)
+            return True
+        except pygame.error:
+            # e.g. headless machines without a video driver, fall back to checking if the mixer is busy
+            return False
+
+    # hands the song to the mixer, from the audio cache if it is cached, and returns the buffer it is read from
+    def loadSource(self, song: Song, shouldQueue: bool) -> Union[mmap.mmap, None]:
+        if self.prepareSong:
+            self.prepareSong(song)
+
+        buffer = None
+        if self.audioCache:
+            buffer = self.audioCache.open(song.getPath())
+
+        source = buffer if buffer else song.getPath()
+        namehint = 'wav' if buffer else ''
+        if shouldQueue:
+            mixer.music.queue(source, namehint)
+        else:
+            mixer.music.load(source, namehint)
+
+        return buffer
+
+    # counted when the song starts rather than when it is handed to the mixer, so that a queued song that is skipped
+    # before it starts doesn't count as played
+    def recordPlay(self, song: Song):
+        if self.audioCache:
+            self.audioCache.recordPlay(song.getPath())
+
+    def setCurrentBuffer(self, buffer: Union[mmap.mmap, None]):
+        if self.currentBuffer and self.currentBuffer is not buffer:
+            self.currentBuffer.close()
+        self.currentBuffer = buffer
+
+    def setQueuedBuffer(self, buffer: Union[mmap.mmap, None]):
+        if self.queuedBuffer and self.queuedBuffer is not buffer:
+            self.queuedBuffer.close()
+        self.queuedBuffer = buffer
+
+    # the gain is part of the volume, so it costs nothing while the song plays
+    def applyGain(self, song: Song):
+        mixer.music.set_volume(getVolumeForLoudness(song.loudness))
+
+    def setState(self, state: PlayerState):
+        if state not in allowedTransitions[self.state]:
+            raise error(f'Player can\'t go from {self.state.value} to {state.value}!')
+        self.state = state
+
+    def play(self, song: Song, songToQueue: Song = None, startSeconds: float = 0.0):
+        if self.hasAdvancedToQueued and song is self.currentSong:
+            # the mixer already started this song the moment the previous one ended
+            self.hasAdvancedToQueued = False
+        else:
+            requestTime = time.perf_counter()
+            self.setState(PlayerState.LOADING)
+            self.queuedSong = None
+            self.hasAdvancedToQueued = False
+            self.setQueuedBuffer(None)
+            if startSeconds > 0:
+                # decoded audio can't always be seeked in, so starting part way through plays the source file
+                if self.prepareSong:
+                    self.prepareSong(song)
+                mixer.music.load(song.getPath())
+                self.setCurrentBuffer(None)
+            else:
+                self.setCurrentBuffer(self.loadSource(song, False))
+            if self.endOfTrackEventsEnabled:
+                # drop end events left over from the previous track
+                pygame.event.clear(endOfTrackEvent, pump=False)
+            self.applyGain(song)
+            mixer.music.play(start=startSeconds)
+            self.recordPlay(song)
+            self.currentSong = song
+            self.startOffsetSeconds = startSeconds
+            self.lastPosition = 0
+            self.setState(PlayerState.PLAYING)
+
+            startTime = time.perf_counter()
+            self.lastStartLatencySeconds = startTime - requestTime
+            stats = getStats()
+            if stats:
+                stats.increment('playback.songsStarted')
+                stats.recordTime('playback.startLatency', self.lastStartLatencySeconds)
+            if self.trackEndTime is not None:
+                self.lastGapSeconds = startTime - self.trackEndTime
+                self.trackEndTime = None
+                if stats:
+                    stats.recordTime('playback.trackGap', self.lastGapSeconds)
+
+        if songToQueue:
+            self.queue(songToQueue)
 
-    def play(self, path: str):
-        # 0 indicates playing has started
-        mixer.music.load(path)
-        mixer.music.play()
+    def queue(self, song: Song):
+        # hand the next song to the mixer now so it starts without a gap
+        self.setQueuedBuffer(self.loadSource(song, True))
+        self.queuedSong = song
+
+    def pause(self) -> bool:
+        if self.state != PlayerState.PLAYING:
+            return False
+
+        mixer.music.pause()
+        self.setState(PlayerState.PAUSED)
+        return True
+
+    def resume(self) -> bool:
+        if self.state != PlayerState.PAUSED:
+            return False
+
+        mixer.music.unpause()
+        self.setState(PlayerState.PLAYING)
+        return True
+
+    def getPositionSeconds(self) -> float:
+        if self.state not in (PlayerState.PLAYING, PlayerState.PAUSED):
+            return 0.0
+
+        return self.startOffsetSeconds + max(0, mixer.music.get_pos()) / 1000
+
+    def seek(self, deltaSeconds: float) -> bool:
+        if self.state != PlayerState.PLAYING:
+            return False
+
+        position = max(0.0, self.getPositionSeconds() + deltaSeconds)
+        if self.currentBuffer:
+            # decoded audio can't always be seeked in, so the source file takes over
+            mixer.music.load(self.currentSong.getPath())
+            self.setCurrentBuffer(None)
+        mixer.music.play(start=position)
+        if self.queuedSong:
+            mixer.music.queue(self.queuedSong.getPath())
+            self.setQueuedBuffer(None)
+        self.startOffsetSeconds = position
+        self.lastPosition = 0
+        return True
 
     def stop(self):
+        if self.state in (PlayerState.IDLE, PlayerState.STOPPED):
+            return
+
         mixer.music.stop()
+        if mixer.music.get_busy():
+            # stopping can start the queued track, which also has to be stopped
+            mixer.music.stop()
+        self.setState(PlayerState.STOPPED)
+        self.currentSong = None
+        self.queuedSong = None
+        self.hasAdvancedToQueued = False
+        self.trackEndTime = None
+        self.setCurrentBuffer(None)
+        self.setQueuedBuffer(None)
+
+    def isCurrentSong(self, song: Song) -> bool:
+        return self.currentSong is song and self.state in (PlayerState.PLAYING, PlayerState.PAUSED)
+
+    def hasTrackEnded(self) -> bool:
+        if self.hasAdvancedToQueued or self.state in (PlayerState.IDLE, PlayerState.STOPPED):
+            return True
+        if self.state != PlayerState.PLAYING:
+            # the mixer isn't busy while paused, but the track hasn't ended
+            return False
+
+        # the mixer pushes its end event straight into the queue, which only the thread waiting for it pumps, see
+        # waitForEndOfTrackEvent()
+        ended = self.endOfTrackEventsEnabled and len(pygame.event.get(endOfTrackEvent, pump=False)) > 0
+        position = mixer.music.get_pos()
+        if not ended and self.queuedSong and position < self.lastPosition:
+            # without end events, the switch to the queued track shows up as the position starting over
+            ended = True
+        self.lastPosition = position
+        if not ended and not mixer.music.get_busy():
+            ended = True
+
+        if ended:
+            if self.queuedSong and mixer.music.get_busy():
+                # the mixer switches to a queued track inside its own audio callback, so there is no silence in between
+                self.hasAdvancedToQueued = True
+                self.currentSong = self.queuedSong
+                self.queuedSong = None
+                self.setCurrentBuffer(self.queuedBuffer)
+                self.queuedBuffer = None
+                # the volume applies to whatever the mixer plays, so the gain of the next song can only be set once it
+                # started, i.e. up to one end check late
+                self.applyGain(self.currentSong)
+                self.recordPlay(self.currentSong)
+                self.startOffsetSeconds = 0.0
+                self.lastGapSeconds = 0.0
+                self.setState(PlayerState.PLAYING)
+                stats = getStats()
+                if stats:
+                    stats.increment('playback.gaplessTransitions')
+                    stats.recordTime('playback.trackGap', 0.0)
+            else:
+                self.trackEndTime = time.perf_counter()
+                self.currentSong = None
+                self.setState(PlayerState.STOPPED)
+
+        return ended
+
+    # blocks until the mixer posts its end event, or until stopWaiting is set or the mixer stopped without posting it,
+    # and returns whether it was posted
+    # pygame waits for events by polling SDL's queue every millisecond, so this is only worth it shortly before a track
+    # is expected to end. The event is posted again, for hasTrackEnded() to pick up on the thread that plays.
+    def waitForEndOfTrackEvent(self, stopWaiting: threading.Event) -> bool:
+        if not self.endOfTrackEventsEnabled:
+            return False
+
+        while not stopWaiting.is_set() and mixer.music.get_busy():
+            event = pygame.event.wait(endOfTrackWaitMs)
+            if event.type == endOfTrackEvent:
+                pygame.event.post(event)
+                return True
+
+        return False
+
+    def hasSongEnded(self, song: Song) -> bool:
+        return self.currentSong is not song or self.hasTrackEnded()
 
-    def isPlaying(self):
-        return mixer.music.get_busy()
\ No newline at end of file
+    def shutdown(self):
+        self.stop()
+        mixer.quit()
+        if self.audioCache:
+            self.audioCache.close()
@@ -1,13 +1,68 @@
+from bisect import bisect_right
+from itertools import accumulate
 import random
+from typing import Union
 from clonedSong import ClonedSong
+from playable.song import Song
 
+# a set of songs that stand in for each other, every time one of them is played the group picks which one plays
+# according to the probabilities of its songs
 class ClonedSongGroup:
     def __init__(self, id: str, songs: list[ClonedSong]):
         self.id = id
         self.songs = songs
 
-    def getSongToPlay(self):
-        return random.choices([x.song for x in self.songs], weights=[x.probability for x in self.songs], k=1)
+    # the sampler is only rebuilt when the songs (and with them the probabilities) are replaced
+    @property
+    def songs(self) -> list[ClonedSong]:
+        return self.clonedSongs
+
+    @songs.setter
+    def songs(self, songs: list[ClonedSong]):
+        self.clonedSongs = songs
+        self.updateSampler()
+
+    def updateSampler(self):
+        self.candidates: list[Song] = [x.song for x in self.clonedSongs]
+        weights = [max(0, x.probability) for x in self.clonedSongs]
+        if sum(weights) == 0:
+            # nothing to go by, every song is equally likely
+            weights = [1] * len(weights)
+        # picking a song is a binary search of a uniform draw in the running totals of the weights
+        self.cumulativeWeights: list[float] = list(accumulate(weights))
+
+    # rng is e.g. the generator of a play queue, so that the picks are the same every time the queue is created
+    # with the same seed, and the shared generator of the random module otherwise
+    def getSongToPlay(self, rng: random.Random = None) -> Union[Song, None]:
+        if len(self.candidates) == 0:
+            return None
+
+        totalWeight = self.cumulativeWeights[-1]
+        return self.candidates[bisect_right(self.cumulativeWeights, (rng or random).random() * totalWeight)]
+
+    def getSongsToPlay(self, count: int, rng: random.Random = None) -> list[Song]:
+        return (rng or random).choices(self.candidates, cum_weights=self.cumulativeWeights, k=count)
 
     def toJsonObject(self):
-        return { 'id': self.id, 'songDistributions': [x.toJsonObject() for x in self.songs]}
\ No newline at end of file
+        return { 'id': self.id, 'songDistributions': [x.toJsonObject() for x in self.songs]}
+
+# replaces every cloned song in songs with the song its group picks to play
+# all picks of a group are drawn in one call, so a long shuffled queue costs one pass over the songs and one draw per group
+def resolveClonedSongs(songs: list[Song], groups: dict[str, 'ClonedSongGroup'], rng: random.Random = None) -> list[Song]:
+    positionsByGroup: dict[str, list[int]] = {}
+    for i, song in enumerate(songs):
+        if song.clonedSongGroupId and song.clonedSongGroupId in groups:
+            positionsByGroup.setdefault(song.clonedSongGroupId, []).append(i)
+
+    if len(positionsByGroup) == 0:
+        return songs
+
+    resolved = list(songs)
+    for groupId, positions in positionsByGroup.items():
+        group = groups[groupId]
+        if len(group.candidates) == 0:
+            continue
+        for position, song in zip(positions, group.getSongsToPlay(len(positions), rng)):
+            resolved[position] = song
+
+    return resolved
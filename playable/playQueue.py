@@ -0,0 +1,115 @@
+from bisect import bisect_right
+import random
+from typing import Callable, Iterator, Union
+from playable.song import Song
+
+# the order a playlist (and its downstream playlists) is played in, worked out one track at a time
+# entries, i.e. songs or linked songs, are only looked up when they are reached, and shuffling draws the next entry
+# with a Fisher-Yates shuffle that only remembers the positions it displaced, so starting to play costs the same
+# for any number of songs. Linked songs always play back to back.
+# A shuffled queue is fully determined by its seed, so a queue created with the same seed and a start position
+# resumes where an earlier one stopped.
+class PlayQueue:
+    def __init__(self, playlists: list, shouldShuffle: bool = False, seed: int = None,
+            resolveClones: Callable[[list[Song], random.Random], list[Song]] = None, startPosition: int = 0):
+        self.playlists = playlists
+        self.shouldShuffle = shouldShuffle
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.resolveClones = resolveClones
+        # index of the first entry of each playlist, entries of all playlists are numbered one after the other
+        self.playlistStarts: list[int] = []
+        self.entryCount = 0
+        for playlist in playlists:
+            self.playlistStarts.append(self.entryCount)
+            self.entryCount += playlist.getEntryCount()
+        # positions displaced by the shuffle so far, every other position still holds its own index
+        self.swaps: dict[int, int] = {}
+        self.entriesDrawn = 0
+        # songs of the entries drawn so far, in play order, with clones already resolved
+        self.tracks: list[Song] = []
+        # index in tracks of the current song, -1 before the first one
+        self.position = -1
+        self.skipTo(startPosition - 1)
+
+    def getEntry(self, entryIdx: int):
+        i = bisect_right(self.playlistStarts, entryIdx) - 1
+        playlist = self.playlists[i]
+        localIdx = entryIdx - self.playlistStarts[i]
+        # the playlist may have been edited since the queue was created
+        if localIdx >= playlist.getEntryCount():
+            return None
+
+        return playlist.getEntry(localIdx)
+
+    def drawEntryIdx(self) -> int:
+        k = self.entriesDrawn
+        self.entriesDrawn += 1
+        if not self.shouldShuffle:
+            return k
+
+        j = self.random.randrange(k, self.entryCount)
+        entryIdx = self.swaps.get(j, j)
+        self.swaps[j] = self.swaps.pop(k, k)
+        if j == k:
+            self.swaps.pop(k)
+
+        return entryIdx
+
+    # adds the songs of the next entry to tracks, returns False when every entry was played
+    def drawTracks(self) -> bool:
+        while self.entriesDrawn < self.entryCount:
+            entry = self.getEntry(self.drawEntryIdx())
+            if entry is None:
+                continue
+
+            songs = entry if isinstance(entry, list) else [entry]
+            if len(songs) == 0:
+                continue
+            if self.resolveClones:
+                # drawn from the queue's own generator, so a resumed queue plays the same clones as well
+                songs = self.resolveClones(songs, self.random)
+            self.tracks += songs
+            return True
+
+        return False
+
+    def getTrack(self, position: int) -> Union[Song, None]:
+        if position < 0:
+            return None
+        while position >= len(self.tracks):
+            if not self.drawTracks():
+                return None
+
+        return self.tracks[position]
+
+    def getCurrent(self) -> Union[Song, None]:
+        return self.getTrack(self.position)
+
+    def peekNext(self) -> Union[Song, None]:
+        return self.getTrack(self.position + 1)
+
+    def next(self) -> Union[Song, None]:
+        song = self.peekNext()
+        if song:
+            self.position += 1
+
+        return song
+
+    # goes back to the previous song, or starts the first song over
+    def back(self) -> Union[Song, None]:
+        self.position = max(0, self.position - 1)
+        return self.getCurrent()
+
+    def skipTo(self, position: int):
+        self.position = -1
+        while self.position < position and self.next():
+            pass
+
+    def __iter__(self) -> Iterator[Song]:
+        song = self.next()
+        while song:
+            yield song
+            song = self.next()
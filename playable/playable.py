@@ -1,6 +1,10 @@
 from abc import abstractmethod
 
 class Playable:
+    # empty so that subclasses declaring __slots__ don't get a __dict__ anyway
+    __slots__ = ()
+
     @abstractmethod
-    def play(self):
+    # playables are plain data, the player passed in does the actual playing
+    def play(self, player):
         pass
\ No newline at end of file
@@ -1,54 +1,127 @@
 from os import error
-from random import shuffle
-from typing import Callable, Tuple, Union
+import random
+from typing import TYPE_CHECKING, Callable, Iterable, Tuple, Union
 import uuid
+from fenwickTree import FenwickTree
 from playable.playable import Playable
+from playable.playQueue import PlayQueue
 from playable.song import Song
 
+# only needed for type hints, importing the player would load pygame for everything that uses playlists
+if TYPE_CHECKING:
+    from musicPlayer import MusicPlayer
+
+PlaylistEntry = Union[Song, list[Song]]
+
+# removed entries are only dropped from the list once they make up this share of it
+compactRemovedEntriesRatio = 0.5
+
 class Playlist(Playable):
-    def __init__(self, id: str, name: str, songs: list[Union[Song, list[Song]]]):
+    def __init__(self, id: str, name: str, songs: list[PlaylistEntry]):
         if not id:
             id = str(uuid.uuid4())
         self.id = id
         self.name = name
-        self.songs = songs
-        def addToSongsDict(song: Song):
-            if self.songCountDict.get(song.id):
-                self.songCountDict[song.id] += 1
-            else:
-                self.songCountDict[song.id] = 1
-
+        # each entry is a song or a list of linked songs, removed entries are left as None until the list is compacted
+        # so that removing doesn't shift the entries after it
+        self.entries: list[Union[PlaylistEntry, None]] = []
+        # number of songs in each entry, and 1 for each entry that wasn't removed, so that song and entry indices
+        # can be mapped to entries in O(log n)
+        self.entrySongCounts = FenwickTree()
+        self.liveEntries = FenwickTree()
+        self.removedEntryCount = 0
         # track the number of occurrences of each song to make it easier to detect if a song already exists in the playlist
         self.songCountDict: dict[str, int] = {}
-        for song in songs:
-            if not isinstance(song, list):
-                addToSongsDict(song)
-            else:
-                for s in song:
-                    addToSongsDict(s)
+        self.setEntries(songs)
         self.isPlaying = False
+        self.isGapless = True
+        # queue of the current (or last) playback, and whether to go back to its previous song next
+        self.playQueue: Union[PlayQueue, None] = None
+        self.shouldGoBack = False
+        self.additionalPlayLogicGenerator = None
+        # called after every edit of the playlist, e.g. so the settings know it needs saving
+        self.onChange: Union[Callable[['Playlist'], None], None] = None
+        # swaps cloned songs for the song their group picks, set by the settings that know the clone groups
+        # the picks are drawn from the random generator it is passed, if any
+        self.cloneResolver: Union[Callable[[list[Song], Union[random.Random, None]], list[Song]], None] = None
 
+        # direct neighbours in the playlist dependency graph, see PlaylistGraph
         self.upstreamPlaylists: dict[str, Playlist] = {}
         self.downstreamPlaylists: dict[str, Playlist] = {}
-    
+        # PlaylistGraph of the settings the playlist belongs to, which memoizes the downstream playlists and songs
+        self.graph = None
+
+    def setEntries(self, entries: list[PlaylistEntry]):
+        self.entries = list(entries)
+        self.indexEntries()
+        self.songCountDict = {}
+        for song in self.getFlattenedSongs():
+            self.addToSongsDict(song)
+
+    # rebuilds the indices over the entries, which mustn't contain removed entries
+    def indexEntries(self):
+        self.entrySongCounts = FenwickTree([len(entry) if isinstance(entry, list) else 1 for entry in self.entries])
+        self.liveEntries = FenwickTree([1] * len(self.entries))
+        self.removedEntryCount = 0
+
+    # the songs and linked songs of the playlist in order
+    @property
+    def songs(self) -> list[PlaylistEntry]:
+        return [entry for entry in self.entries if entry is not None]
+
+    def getSongCount(self) -> int:
+        return self.entrySongCounts.total
+
+    def getEntryCount(self) -> int:
+        return self.liveEntries.total
+
+    def isEmpty(self) -> bool:
+        return self.getEntryCount() == 0
+
+    def getEntry(self, entryIdx: int) -> PlaylistEntry:
+        return self.entries[self.liveEntries.findIndex(entryIdx)]
+
+    # maps the index of a song in the flattened playlist to its entry and the offset within linked songs
+    def locateSong(self, songIdx: int) -> Tuple[int, int]:
+        slot = self.entrySongCounts.findIndex(songIdx)
+        return slot, songIdx - self.entrySongCounts.prefixSum(slot)
+
+    def getSong(self, songIdx: int) -> Song:
+        slot, offset = self.locateSong(songIdx)
+        entry = self.entries[slot]
+        if isinstance(entry, list):
+            return entry[offset]
+
+        return entry
+
     def getFlattenedSongs(self) -> list[Song]:
         songs: list[Song] = []
-        for song in self.songs:
+        for song in self.entries:
             if isinstance(song, list):
                 for s in song:
                     songs.append(s)
-            else:
+            elif song is not None:
                 songs.append(song)
 
         return songs
 
+    # every playlist downstream of this one, directly or through other downstream playlists
+    def getDownstreamPlaylists(self) -> list['Playlist']:
+        if self.graph:
+            return self.graph.getDownstreamPlaylists(self)
+
+        return list(self.downstreamPlaylists.values())
+
     # TODO: Add ability to organize downstream songs within the upstream playlist.
     def getFlattenedSongsIncludingDownstream(self) -> list[Song]:
-        songs = self.getFlattenedSongs()
+        if self.graph:
+            # copied since the graph keeps the list memoized
+            return list(self.graph.getFlattenedSongs(self))
 
+        songs = self.getFlattenedSongs()
         # get songs from all downstream playlists as well
-        for id in self.downstreamPlaylists:
-            songs += self.downstreamPlaylists[id].songs
+        for downstream in self.getDownstreamPlaylists():
+            songs += downstream.getFlattenedSongs()
 
         return songs
 
@@ -59,6 +132,16 @@ class Playlist(Playable):
                 songs.append((song, i))
         return songs
 
+    def notifyChanged(self):
+        if self.onChange:
+            self.onChange(self)
+
+    def addToSongsDict(self, song: Song):
+        if self.songCountDict.get(song.id):
+            self.songCountDict[song.id] += 1
+        else:
+            self.songCountDict[song.id] = 1
+
     def removeSongFromDict(self, id: str):
         if self.songCountDict.get(id):
             self.songCountDict[id] -= 1
@@ -67,53 +150,136 @@ class Playlist(Playable):
         else:
             raise error(f'Can\'t remove song with id "{id}" because it isn\'t in the playlist.')
 
+    def appendEntry(self, entry: PlaylistEntry):
+        self.entries.append(entry)
+        self.entrySongCounts.append(len(entry) if isinstance(entry, list) else 1)
+        self.liveEntries.append(1)
+
+    def removeEntry(self, slot: int):
+        self.entries[slot] = None
+        self.entrySongCounts.add(slot, -self.entrySongCounts.get(slot))
+        self.liveEntries.add(slot, -1)
+        self.removedEntryCount += 1
+
+    def compactEntries(self):
+        if self.removedEntryCount > len(self.entries) * compactRemovedEntriesRatio:
+            # the songs didn't change, so the song counts stay as they are
+            self.entries = self.songs
+            self.indexEntries()
+
     def removeSong(self, songToRemoveIdxInPlaylist: int):
-        songToRemove = None
+        if songToRemoveIdxInPlaylist < 0 or songToRemoveIdxInPlaylist >= self.getSongCount():
+            raise error(f'Can\'t remove song number {songToRemoveIdxInPlaylist + 1}, the playlist only has {self.getSongCount()} songs.')
+
+        slot, offset = self.locateSong(songToRemoveIdxInPlaylist)
+        entry = self.entries[slot]
+        if isinstance(entry, list):
+            songToRemove = entry.pop(offset)
+            self.entrySongCounts.add(slot, -1)
+            # replace the linked songs sublist with the only remaining song
+            if len(entry) == 1:
+                self.entries[slot] = entry[0]
+        else:
+            songToRemove = entry
+            self.removeEntry(slot)
+
+        self.removeSongFromDict(songToRemove.id)
+        self.compactEntries()
+        self.notifyChanged()
+
+    # removes the songs at the given indices of the flattened playlist with a single pass over the entries
+    def removeSongs(self, songIndices: Iterable[int]):
+        indicesToRemove = set(songIndices)
+        if len(indicesToRemove) == 0:
+            return
+        if min(indicesToRemove) < 0 or max(indicesToRemove) >= self.getSongCount():
+            raise error(f'Can\'t remove the selected songs, the playlist only has {self.getSongCount()} songs.')
+
+        entries: list[PlaylistEntry] = []
+        removedCounts: dict[str, int] = {}
         songIdx = 0
-        i = 0
-        while i < len(self.songs) and not songToRemove:
-            song = self.songs[i]
-            if isinstance(song, list):
-                for j, subSong in enumerate(song):
-                    if songIdx == songToRemoveIdxInPlaylist:
-                        songToRemove = subSong.pop(j)
-                        break
-                    songIdx += 1
-                # replace the linked songs sublist with the only remaining song
-                if len(song) == 1:
-                    self.songs[i] = song[0]
-            else:
-                if songIdx == songToRemoveIdxInPlaylist:
-                    songToRemove = self.songs.pop(i)
+        for entry in self.entries:
+            if entry is None:
+                continue
+
+            remaining: list[Song] = []
+            for song in (entry if isinstance(entry, list) else [entry]):
+                if songIdx in indicesToRemove:
+                    removedCounts[song.id] = removedCounts.get(song.id, 0) + 1
+                else:
+                    remaining.append(song)
                 songIdx += 1
-            i += 1
-        
-        self.removeSongFromDict(songToRemove.id)
+
+            # a link of one song is just a song
+            if len(remaining) > 1:
+                entries.append(remaining)
+            elif len(remaining) == 1:
+                entries.append(remaining[0])
+
+        self.entries = entries
+        self.indexEntries()
+        for id, count in removedCounts.items():
+            self.songCountDict[id] -= count
+            if self.songCountDict[id] == 0:
+                self.songCountDict.pop(id)
+        self.notifyChanged()
+
+    def removeSongIds(self, songIds: set[str]):
+        if not any(id in self.songCountDict for id in songIds):
+            return
+
+        songs: list[PlaylistEntry] = []
+        for song in self.songs:
+            if isinstance(song, list):
+                remaining = [s for s in song if s.id not in songIds]
+                # a link of one song is just a song
+                if len(remaining) > 1:
+                    songs.append(remaining)
+                elif len(remaining) == 1:
+                    songs.append(remaining[0])
+            elif song.id not in songIds:
+                songs.append(song)
+
+        self.setEntries(songs)
+        self.notifyChanged()
 
     def addSong(self, songToAdd: Song):
-        self.songs.append(songToAdd)
+        self.appendEntry(songToAdd)
+        self.addToSongsDict(songToAdd)
+        self.notifyChanged()
+
+    def addSongs(self, songsToAdd: Iterable[Song]):
+        for song in songsToAdd:
+            self.appendEntry(song)
+            self.addToSongsDict(song)
+        self.notifyChanged()
 
+    # indicesToLink are indices of entries, see getLinkableSongs()
     def linkSongs(self, indicesToLink: list[int]):
-        indices = indicesToLink.copy()
+        # look up all slots first, since removing entries shifts the indices of the ones after them
+        slots = [self.liveEntries.findIndex(i) for i in indicesToLink]
         # Since linked songs can be in any order, don't try popping potentially out of order.
         linkedSongs: list[Song] = []
-        for i in indices:
+        for slot in slots:
             # don't need to use self.removeSong() since we can assume linked song indices aren't included
-            linkedSongs.append(self.songs[i])
-
-        self.songs.append(linkedSongs)
+            linkedSongs.append(self.entries[slot])
 
         # cleanup
-        indices.sort(reverse=True)
-        for i in indices:
-            self.songs.pop(i)
+        for slot in slots:
+            self.removeEntry(slot)
+        self.appendEntry(linkedSongs)
+        self.compactEntries()
+        self.notifyChanged()
 
-    def playSong(self, song: Song):
+    def playSong(self, player: 'MusicPlayer', song: Song, nextSong: Song = None):
+        song.play(player, nextSong)
         if self.additionalPlayLogicGenerator:
             extraPlayLogic = self.additionalPlayLogicGenerator(song)
-            song.addExtraPlaySongLogic(extraPlayLogic)
-
-        song.play()
+            extraPlayLogic()
+        else:
+            # imported here since the controller loads the player, and with it pygame
+            from playbackController import waitForSongToEnd
+            waitForSongToEnd(player, song)
 
     def containsSong(self, song: Song) -> bool:
         return song.id in self.songCountDict
@@ -121,43 +287,47 @@ class Playlist(Playable):
     def addExtraPlaySongLogicGenerator(self, additionalLogicGenerator: Callable[[Song], Callable[..., None]]):
         self.additionalPlayLogicGenerator = additionalLogicGenerator
 
-    def play(self):
-        songs = self.getFlattenedSongsIncludingDownstream()
+    def playFromQueue(self, player: 'MusicPlayer', playQueue: PlayQueue):
+        self.playQueue = playQueue
         self.isPlaying = True
-        i = 0
-        while i < len(songs) and self.isPlaying:
-            song = songs[i]
-            self.playSong(song)
+        self.shouldGoBack = False
+        song = playQueue.next()
+        while song and self.isPlaying:
+            # in gapless mode the following song is queued while this one plays
+            nextSong = None
+            if self.isGapless:
+                nextSong = playQueue.peekNext()
+            self.playSong(player, song, nextSong)
 
-            i += 1
+            if self.shouldGoBack:
+                self.shouldGoBack = False
+                song = playQueue.back()
+            else:
+                song = playQueue.next()
 
         self.isPlaying = False
 
-    def shuffle(self):
-        songs = self.songs.copy()
-        # Add songs from all downstream playlists
-        for id in self.downstreamPlaylists:
-            songs += self.downstreamPlaylists[id].songs.copy()
+    # makes the playlist play the previous song once the current one is stopped
+    def goBack(self):
+        self.shouldGoBack = True
 
-        shuffle(songs)
-        self.isPlaying = True
-        i = 0
-        while i < len(songs) and self.isPlaying:
-            song = songs[i]
-            
-            if isinstance(song, list):
-                # if linked songs, iterate through all linked songs before going to next shuffled song
-                j = 0
-                while j < len(song) and self.isPlaying:
-                    s = song[j]
-                    self.playSong(s)
-                    j += 1
-            else:
-                self.playSong(song)
+    def resolveClones(self, songs: list[Song], rng: random.Random = None) -> list[Song]:
+        if self.cloneResolver:
+            return self.cloneResolver(songs, rng)
 
-            i += 1
+        return songs
 
-        self.isPlaying = False
+    def createPlayQueue(self, shouldShuffle: bool, seed: int = None, startPosition: int = 0) -> PlayQueue:
+        playlists = [self, *self.getDownstreamPlaylists()]
+        return PlayQueue(playlists, shouldShuffle, seed, self.resolveClones, startPosition)
+
+    # startPosition (and the seed of a shuffled queue) can be taken from self.playQueue to resume where playback stopped
+    def play(self, player: 'MusicPlayer', startPosition: int = 0):
+        self.playFromQueue(player, self.createPlayQueue(False, startPosition=startPosition))
+
+    # if linked songs, play through all linked songs before going to next shuffled song
+    def shuffle(self, player: 'MusicPlayer', seed: int = None, startPosition: int = 0):
+        self.playFromQueue(player, self.createPlayQueue(True, seed, startPosition))
 
     def toPlaylistJsonObject(self):
         songsToReturn: list[Union[str, list[str]]] = []
@@ -1,60 +1,118 @@
-from typing import Callable
+import sys
+from typing import Union
 import uuid
-from mutagen.easyid3 import EasyID3
 import os
-from musicPlayer import MusicPlayer
+import time
 from playable.playable import Playable
+from stats import getStats
+from tagCache import TagCache, readTags
+
+def internTag(value: Union[str, None]) -> Union[str, None]:
+    # artists (and often titles) repeat across a library, interning keeps one copy of each string
+    if not value:
+        return None
+
+    return sys.intern(value)
 
 class Song(Playable):
-    def __init__(self, id: str, fullpath: str, clonedSongGroupId: str):
+    # songs are the most numerous objects of a library, slots keep each of them to a fixed set of attributes
+    __slots__ = ('id', 'path', 'clonedSongGroupId', 'tagCache', 'hasTags', 'artist', 'title', 'album', 'mtime', 'size', 'inode', 'contentHash', 'fingerprint', 'duplicatesReviewed', 'loudness')
+
+    def __init__(self, id: str, fullpath: str, clonedSongGroupId: str, tagCache: TagCache = None):
         if not id:
             id = str(uuid.uuid4())
         self.id = id
-        self.song = EasyID3(fullpath)
         self.path = fullpath
-        self.filename = os.path.basename(fullpath)
-        self.additionalPlayLogic = None
-        self.player = None
-        self.clonedSongGroupId = clonedSongGroupId
+        self.clonedSongGroupId = internTag(clonedSongGroupId)
+        self.tagCache = tagCache
+        # tags are loaded lazily the first time they are needed, see loadTags(), and only artist, title and album are kept
+        self.hasTags = False
+        self.artist: Union[str, None] = None
+        self.title: Union[str, None] = None
+        self.album: Union[str, None] = None
+        # file stats from the last scan, used by rescans to detect changed and moved files
+        self.mtime: Union[int, None] = None
+        self.size: Union[int, None] = None
+        self.inode: Union[int, None] = None
+        self.contentHash: Union[str, None] = None
+        # hash of the audio frames without the tags, see audioFingerprint, computed once and kept until the file changes
+        self.fingerprint: Union[str, None] = None
+        # whether the copies of this song were already merged or dismissed, so they aren't reported again
+        self.duplicatesReviewed = False
+        # integrated loudness in LUFS, see loudnessAnalysis, measured in the background and kept until the file changes
+        self.loudness: Union[float, None] = None
 
     def getPath(self):
         return self.path
 
-    def getArtist(self) -> str:
-        if self.song:
-            artist = self.song['artist']
-            # may need to adjust length logic for when songs are linked
-            if artist and len(artist) == 1:
-                return artist[0]
+    def getFilename(self) -> str:
+        return os.path.basename(self.path)
 
-        return 'Unknown'
+    def setPath(self, fullpath: str):
+        self.path = fullpath
+        self.clearTags()
 
-    def getSongName(self) -> str:
-        if self.song:
-            title = self.song['title']
-            if title and len(title) == 1:
-                return title[0]
+    def setFileStats(self, mtime: int, size: int, inode: int, contentHash: str):
+        if self.mtime != mtime or self.size != size or self.contentHash != contentHash:
+            self.fingerprint = None
+            self.duplicatesReviewed = False
+            self.loudness = None
+        self.mtime = mtime
+        self.size = size
+        self.inode = inode
+        self.contentHash = contentHash
+
+    def hasFileStats(self, mtime: int, size: int, inode: int) -> bool:
+        return self.mtime == mtime and self.size == size and self.inode == inode and self.contentHash is not None
 
-        if self.filename:
-            return self.filename
+    def setTags(self, tags: dict[str, str]):
+        self.artist = internTag(tags.get('artist'))
+        self.title = internTag(tags.get('title'))
+        self.album = internTag(tags.get('album'))
+        self.hasTags = True
+
+    def clearTags(self):
+        self.hasTags = False
+        self.artist = None
+        self.title = None
+        self.album = None
+
+    def loadTags(self):
+        if not self.hasTags:
+            startTime = time.perf_counter()
+            if self.tagCache:
+                self.setTags(self.tagCache.getTags(self.path))
+            else:
+                self.setTags(readTags(self.path))
+
+            stats = getStats()
+            if stats:
+                stats.recordTime('tags.load', time.perf_counter() - startTime)
+
+    def getArtist(self) -> str:
+        self.loadTags()
+        if self.artist:
+            return self.artist
 
         return 'Unknown'
 
-    def addExtraPlaySongLogic(self, additionalLogic: Callable[..., None]):
-        self.additionalPlayLogic = additionalLogic
+    def getAlbum(self) -> Union[str, None]:
+        self.loadTags()
+        return self.album
+
+    def getSongName(self) -> str:
+        self.loadTags()
+        if self.title:
+            return self.title
 
-    def play(self):
-        self.player = MusicPlayer()
-        self.player.play(self.path)
-        if self.additionalPlayLogic:
-            self.additionalPlayLogic()
+        filename = self.getFilename()
+        if filename:
+            return filename
 
-    def isPlaying(self):
-        return self.player and self.player.isPlaying()
+        return 'Unknown'
 
-    def stopPlaying(self):
-        if self.player:
-            self.player.stop()
+    def play(self, player, songToQueue: 'Song' = None):
+        player.play(self, songToQueue)
 
     def getTitle(self):
         def buildTitle(songName, artist):
@@ -66,5 +124,16 @@ class Song(Playable):
         obj = { 'id': self.id, 'path': self.path }
         if self.clonedSongGroupId:
             obj['cloneId'] = self.clonedSongGroupId
+        if self.mtime is not None:
+            obj['mtime'] = self.mtime
+            obj['size'] = self.size
+            obj['inode'] = self.inode
+            obj['hash'] = self.contentHash
+        if self.fingerprint:
+            obj['fingerprint'] = self.fingerprint
+        if self.duplicatesReviewed:
+            obj['duplicatesReviewed'] = True
+        if self.loudness is not None:
+            obj['loudness'] = self.loudness
 
         return obj
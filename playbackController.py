@@ -0,0 +1,135 @@
+import asyncio
+import threading
+from typing import Union
+from menu import Menu
+from musicPlayer import MusicPlayer, PlayerState
+from playable.song import Song
+from tagCache import readTrackLengthSeconds
+
+# runs playback commands for a song until it ends, on an asyncio event loop
+# the end of the track is an event that run() awaits together with the next command, and it is set when the mixer posts
+# its end event. pygame can only wait for that event by polling SDL's event queue, so the wait runs on a worker thread
+# and only starts endEventLeadSeconds before the track is expected to end (from its length and the playback position),
+# the loop itself wakes once it was posted. The end is also checked right after every command. Timed checks are only
+# the fallback: every maxCheckSeconds in case the length or position is off or the end is never signalled, and on
+# machines without an event queue, where the end shows up as the mixer no longer being busy, once when the track is
+# expected to end and every checkSeconds after that. Nothing runs while the song is paused, since only a command can
+# resume it.
+class PlaybackController:
+    def __init__(self, player: MusicPlayer, song: Song, menu: Menu, commandQueue: asyncio.Queue, checkSeconds: float = 0.05, maxCheckSeconds: float = 2.0, endEventLeadSeconds: float = 1.0):
+        self.player = player
+        self.song = song
+        self.menu = menu
+        self.commandQueue = commandQueue
+        self.checkSeconds = checkSeconds
+        self.maxCheckSeconds = maxCheckSeconds
+        self.endEventLeadSeconds = endEventLeadSeconds
+        self.lengthSeconds: Union[float, None] = None
+        self.ended: Union[asyncio.Event, None] = None
+        self.endCheck: Union[asyncio.TimerHandle, None] = None
+        # the wait for the mixer's end event on a worker thread, and what stops it
+        self.endWait: Union[asyncio.Future, None] = None
+        self.stopEndWait: Union[threading.Event, None] = None
+
+    def getSecondsUntilEnd(self) -> float:
+        if self.lengthSeconds is None:
+            return self.maxCheckSeconds
+
+        return self.lengthSeconds - self.player.getPositionSeconds()
+
+    def waitForEndEvent(self):
+        if self.endWait:
+            return
+
+        # every wait gets its own flag, so a wait that is still stopping can't be mistaken for a new one
+        self.stopEndWait = threading.Event()
+        self.endWait = asyncio.get_running_loop().run_in_executor(None, self.player.waitForEndOfTrackEvent, self.stopEndWait)
+        self.endWait.add_done_callback(self.onEndWaitDone)
+
+    def stopWaitingForEndEvent(self):
+        if self.endWait:
+            self.stopEndWait.set()
+            self.endWait = None
+
+    def onEndWaitDone(self, endWait: asyncio.Future):
+        if endWait is not self.endWait:
+            # stopped in the meantime
+            return
+
+        self.endWait = None
+        if not self.ended.is_set():
+            self.checkForEnd()
+
+    def checkForEnd(self):
+        if self.endCheck:
+            self.endCheck.cancel()
+            self.endCheck = None
+
+        if self.player.hasSongEnded(self.song):
+            self.stopWaitingForEndEvent()
+            self.ended.set()
+            return
+        if self.player.state == PlayerState.PAUSED:
+            self.stopWaitingForEndEvent()
+            return
+
+        secondsUntilEnd = self.getSecondsUntilEnd()
+        if self.player.endOfTrackEventsEnabled and self.lengthSeconds is not None:
+            if secondsUntilEnd <= self.endEventLeadSeconds:
+                self.waitForEndEvent()
+                # the wait also ends if the mixer stops without posting the event, this is in case it doesn't stop
+                delay = self.maxCheckSeconds
+            else:
+                # e.g. a seek moved the end further away again
+                self.stopWaitingForEndEvent()
+                delay = min(secondsUntilEnd - self.endEventLeadSeconds, self.maxCheckSeconds)
+        else:
+            delay = min(max(secondsUntilEnd, self.checkSeconds), self.maxCheckSeconds)
+        self.endCheck = asyncio.get_running_loop().call_later(delay, self.checkForEnd)
+
+    def runCommand(self, commandStr: str):
+        if commandStr in self.menu.menuOptionsDict:
+            command = self.menu.menuOptionsDict[commandStr].command
+            if command:
+                command()
+
+    def onLengthRead(self, lengthFuture: asyncio.Future):
+        if lengthFuture.cancelled() or lengthFuture.exception() or self.ended.is_set():
+            return
+
+        self.lengthSeconds = lengthFuture.result()
+        # the first check can now be timed to the end of the track
+        self.checkForEnd()
+
+    async def run(self):
+        self.ended = asyncio.Event()
+        self.checkForEnd()
+        # the length is read from the file on another thread, so commands are taken while the disk is busy
+        lengthFuture = asyncio.get_running_loop().run_in_executor(None, readTrackLengthSeconds, self.song.getPath())
+        lengthFuture.add_done_callback(self.onLengthRead)
+        try:
+            while not self.ended.is_set():
+                getCommand = asyncio.ensure_future(self.commandQueue.get())
+                waitForEnd = asyncio.ensure_future(self.ended.wait())
+                await asyncio.wait({ getCommand, waitForEnd }, return_when=asyncio.FIRST_COMPLETED)
+                waitForEnd.cancel()
+                if getCommand.done():
+                    self.runCommand(getCommand.result())
+                    # commands like stop, seek or pause change when the track ends
+                    self.checkForEnd()
+                else:
+                    # the command stays in the queue for whatever plays next
+                    getCommand.cancel()
+        finally:
+            lengthFuture.cancel()
+            self.stopWaitingForEndEvent()
+            if self.endCheck:
+                self.endCheck.cancel()
+                self.endCheck = None
+
+# waits for the song to end without taking any commands, e.g. when a playlist plays without the console
+def waitForSongToEnd(player: MusicPlayer, song: Song):
+    async def waitForEnd():
+        await PlaybackController(player, song, Menu('Playback commands:'), asyncio.Queue()).run()
+
+    asyncio.run(waitForEnd())
@@ -0,0 +1,312 @@
+import asyncio
+import inspect
+import json
+import os
+from os import error, path
+import socket
+from typing import Any, Awaitable, Callable, Union
+from consoleLogic.selection import parseSelection
+from daemonClient import isDaemonRunning
+from menu import Menu
+from musicPlayer import PlayerState
+from playable.playlist import Playlist
+from playable.playQueue import PlayQueue
+from playable.song import Song
+from playbackController import PlaybackController
+from userSettings import UserSettings
+
+def songToJsonObject(song: Song) -> dict:
+    return { 'id': song.id, 'title': song.getTitle(), 'path': song.getPath() }
+
+def playlistToJsonObject(playlist: Playlist) -> dict:
+    return { 'id': playlist.id, 'name': playlist.name, 'songCount': playlist.getSongCount() }
+
+argTypeNames = { str: 'a string', int: 'a number', bool: 'true or false', list: 'a list' }
+
+# an argument of a request, which comes from another process and so has to be checked to be of the right type
+def getArg(args: dict, name: str, argType: type, default: Any = None) -> Any:
+    value = args.get(name, default)
+    # json booleans are ints to python
+    isWrongType = not isinstance(value, argType) or (argType is int and isinstance(value, bool))
+    if value is not None and isWrongType:
+        raise error(f'"{name}" has to be {argTypeNames[argType]}!')
+
+    return value
+
+# long-running player that keeps the library and the audio engine loaded, controlled through a unix domain socket
+# every request is one line of json with the name of the command and its arguments, e.g. {"command": "play",
+# "songId": "..."}, and is answered with one line, {"ok": true, ...} or {"ok": false, "error": "..."}. Commands and
+# playback run on the same event loop, so a command never runs while another one (or the end of a song) is handled.
+# Only reading files happens on other threads, and the library is changed once they are read.
+class PlayerDaemon:
+    def __init__(self, settings: UserSettings, socketFullPath: str):
+        self.settings = settings
+        self.socketFullPath = socketFullPath
+        # set up right away, so that the first play command doesn't wait for the audio device
+        self.player = settings.getPlayer()
+        self.playQueue: Union[PlayQueue, None] = None
+        # songs queued with the queue command, they play before the rest of the play queue
+        self.upNext: list[Song] = []
+        self.isPlaying = False
+        self.controller: Union[PlaybackController, None] = None
+        self.playbackTask: Union[asyncio.Task, None] = None
+        self.stopped: Union[asyncio.Event, None] = None
+        # commands that wait for something else (e.g. reading files) are coroutines, so that other clients are served
+        # in the meantime
+        self.commands: dict[str, Callable[[dict], Union[dict, Awaitable[dict]]]] = {
+            'status': self.getStatus,
+            'songs': self.listSongs,
+            'playlists': self.listPlaylists,
+            'play': self.play,
+            'queue': self.queue,
+            'skip': self.skip,
+            'stop': self.stop,
+            'pause': self.pause,
+            'resume': self.resume,
+            'addSongs': self.addSongs,
+            'createPlaylist': self.createPlaylist,
+            'addToPlaylist': self.addToPlaylist,
+            'removeFromPlaylist': self.removeFromPlaylist,
+            'shutdown': self.shutdown,
+        }
+
+    def getSong(self, args: dict) -> Song:
+        songId = getArg(args, 'songId', str)
+        if songId not in self.settings.songsDict:
+            raise error(f'Song with the id "{songId}" doesn\'t exist!')
+
+        return self.settings.songsDict[songId]
+
+    def getSongs(self, args: dict) -> list[Song]:
+        return [self.getSong({ 'songId': songId }) for songId in getArg(args, 'songIds', list, [])]
+
+    # playlists can be referred to by id or by name
+    def getPlaylist(self, args: dict) -> Playlist:
+        nameOrId = getArg(args, 'playlist', str)
+        if nameOrId in self.settings.playlists:
+            return self.settings.playlists[nameOrId]
+        for playlist in self.settings.playlists.values():
+            if playlist.name == nameOrId:
+                return playlist
+
+        raise error(f'Playlist "{nameOrId}" doesn\'t exist!')
+
+    def takeNextSong(self) -> Union[Song, None]:
+        if len(self.upNext) > 0:
+            return self.upNext.pop(0)
+        if self.playQueue:
+            return self.playQueue.next()
+
+        return None
+
+    def peekNextSong(self) -> Union[Song, None]:
+        if len(self.upNext) > 0:
+            return self.upNext[0]
+        if self.playQueue:
+            return self.playQueue.peekNext()
+
+        return None
+
+    async def playSongs(self):
+        song = self.takeNextSong()
+        while song and self.isPlaying:
+            self.player.play(song, self.peekNextSong())
+            controller = PlaybackController(self.player, song, Menu('Playback commands:'), asyncio.Queue())
+            self.controller = controller
+            await controller.run()
+            if self.controller is controller:
+                self.controller = None
+            song = self.takeNextSong()
+
+        self.isPlaying = False
+
+    def startPlayback(self):
+        self.stopPlayback()
+        self.isPlaying = True
+        self.playbackTask = asyncio.get_running_loop().create_task(self.playSongs())
+
+    def stopPlayback(self):
+        self.isPlaying = False
+        if self.playbackTask:
+            self.playbackTask.cancel()
+            self.playbackTask = None
+        self.controller = None
+        self.player.stop()
+
+    # lets the song that is playing notice a command that ended it right away, instead of at its next end check
+    def checkForEnd(self):
+        if self.controller and self.controller.ended:
+            self.controller.checkForEnd()
+
+    def getStatus(self, args: dict) -> dict:
+        song = self.player.currentSong
+        return {
+            'state': self.player.state.value,
+            'song': songToJsonObject(song) if song else None,
+            'positionSeconds': self.player.getPositionSeconds(),
+            'upNext': [songToJsonObject(song) for song in self.upNext]
+        }
+
+    # songs matching the query, every song if there is none
+    def listSongs(self, args: dict) -> dict:
+        songs = self.settings.searchSongs(getArg(args, 'query', str, ''), getArg(args, 'limit', int))
+        return { 'songs': [songToJsonObject(song) for song in songs] }
+
+    def listPlaylists(self, args: dict) -> dict:
+        return { 'playlists': [playlistToJsonObject(playlist) for playlist in self.settings.getPlaylistsList()] }
+
+    # plays a song (songId), a playlist (playlist, optionally with shuffle) or the whole library
+    def play(self, args: dict) -> dict:
+        if 'songId' in args:
+            song = self.getSong(args)
+            self.playQueue = None
+            self.upNext = [song]
+        else:
+            if 'playlist' in args:
+                playlist = self.getPlaylist(args)
+            else:
+                playlist = Playlist(None, 'All Songs', self.settings.getSongs())
+                playlist.cloneResolver = self.settings.resolveClonedSongs
+            self.playQueue = playlist.createPlayQueue(getArg(args, 'shuffle', bool, False))
+            self.upNext = []
+
+        self.startPlayback()
+        return {}
+
+    # plays the song next, after the songs that were queued before it
+    def queue(self, args: dict) -> dict:
+        song = self.getSong(args)
+        self.upNext.append(song)
+        if not self.isPlaying:
+            self.startPlayback()
+        elif len(self.upNext) == 1 and self.player.state in (PlayerState.PLAYING, PlayerState.PAUSED):
+            # the mixer already has the song that would have been next
+            self.player.queue(song)
+
+        return {}
+
+    def skip(self, args: dict) -> dict:
+        self.player.stop()
+        self.checkForEnd()
+        return {}
+
+    def stop(self, args: dict) -> dict:
+        self.stopPlayback()
+        self.upNext = []
+        return {}
+
+    def pause(self, args: dict) -> dict:
+        return { 'changed': self.player.pause() }
+
+    def resume(self, args: dict) -> dict:
+        changed = self.player.resume()
+        self.checkForEnd()
+        return { 'changed': changed }
+
+    # files are read and fingerprinted on other threads, the library is only changed here on the event loop
+    async def addSongs(self, args: dict) -> dict:
+        songPath = getArg(args, 'path', str)
+        if not songPath or not path.exists(songPath):
+            raise error(f'Path "{songPath}" doesn\'t exist!')
+
+        loop = asyncio.get_running_loop()
+        scannedFiles = await loop.run_in_executor(None, self.settings.scanNewFiles, songPath)
+        songs = self.settings.addScannedFiles(songPath, scannedFiles)
+        fingerprints = await loop.run_in_executor(None, self.settings.computeFingerprints, songs)
+        # songs can't be removed through the daemon, but the check costs nothing
+        self.settings.setFingerprints({ id: fingerprint for id, fingerprint in fingerprints.items() if id in self.settings.songsDict })
+
+        return { 'added': [songToJsonObject(song) for song in songs] }
+
+    def createPlaylist(self, args: dict) -> dict:
+        name = getArg(args, 'name', str)
+        if not name:
+            raise error('A playlist needs a name!')
+        songs = self.getSongs(args)
+        if len(songs) == 0:
+            raise error('A playlist needs at least one song!')
+        self.settings.addPlaylist(name, songs)
+
+        return {}
+
+    def addToPlaylist(self, args: dict) -> dict:
+        self.settings.addSongsToPlaylist(self.getPlaylist(args), self.getSongs(args))
+        return {}
+
+    # songs is a selection of song numbers in the playlist, e.g. "1-3,7"
+    def removeFromPlaylist(self, args: dict) -> dict:
+        playlist = self.getPlaylist(args)
+        indices = parseSelection(getArg(args, 'songs', str, ''), playlist.getSongCount())
+        if not indices:
+            raise error(f'Invalid selection, the playlist has {playlist.getSongCount()} songs!')
+        self.settings.removeSongsFromPlaylist(playlist, indices)
+
+        return {}
+
+    def shutdown(self, args: dict) -> dict:
+        self.stopped.set()
+        return {}
+
+    async def runRequest(self, line: bytes) -> dict:
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError()
+        except ValueError:
+            return { 'ok': False, 'error': 'Requests have to be a json object per line!' }
+
+        command = self.commands.get(request.get('command'))
+        if not command:
+            return { 'ok': False, 'error': f'Unknown command "{request.get("command")}"!' }
+
+        try:
+            response = command(request)
+            if inspect.isawaitable(response):
+                response = await response
+            return { 'ok': True, **response }
+        except error as e:
+            return { 'ok': False, 'error': str(e) }
+        except Exception as e:
+            # a bug shouldn't cost the client its answer, or the daemon the connection
+            return { 'ok': False, 'error': f'The command failed: {type(e).__name__}: {e}' }
+
+    async def handleClient(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            line = await reader.readline()
+            while line:
+                writer.write((json.dumps(await self.runRequest(line)) + '\n').encode())
+                await writer.drain()
+                line = await reader.readline()
+        except (ConnectionError, asyncio.CancelledError):
+            # clients that are still connected are cut off when the daemon shuts down
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        if isDaemonRunning(self.socketFullPath):
+            raise error(f'A player is already running on {self.socketFullPath}!')
+        if path.exists(self.socketFullPath):
+            os.remove(self.socketFullPath)
+
+        self.stopped = asyncio.Event()
+        server = await asyncio.start_unix_server(self.handleClient, self.socketFullPath)
+        # only the user running the daemon can control it
+        os.chmod(self.socketFullPath, 0o600)
+        try:
+            await self.stopped.wait()
+        finally:
+            server.close()
+            self.stopPlayback()
+            if path.exists(self.socketFullPath):
+                os.remove(self.socketFullPath)
+
+    # runs until the shutdown command (or ctrl+c)
+    def run(self):
+        if not hasattr(socket, 'AF_UNIX'):
+            raise error('The player daemon needs unix domain sockets, which aren\'t available on this platform!')
+
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,110 @@
+from os import error
+from playable.playlist import Playlist
+from playable.song import Song
+
+# the downstream relations between playlists, playing a playlist also plays every playlist downstream of it
+# edges are kept in the playlists themselves, downstreamPlaylists and upstreamPlaylists hold the direct neighbours
+# only, and the graph never has cycles. The downstream playlists and songs of every playlist are memoized, a change
+# to a playlist only invalidates what was memoized for it and the playlists upstream of it.
+class PlaylistGraph:
+    def __init__(self, playlists: dict[str, Playlist]):
+        self.playlists = playlists
+        # ids of all playlists downstream of a playlist, in topological order
+        self.downstreamIdsCache: dict[str, list[str]] = {}
+        # songs of a playlist followed by the songs of its downstream playlists
+        self.songsCache: dict[str, list[Song]] = {}
+
+    def getDownstreamIds(self, id: str) -> list[str]:
+        if id not in self.downstreamIdsCache:
+            # reversed post-order of a depth first search lists every playlist before the ones downstream of it
+            postOrder: list[str] = []
+            visited: set[str] = { id }
+            stack = [(id, iter(self.playlists[id].downstreamPlaylists))]
+            while len(stack) > 0:
+                currentId, children = stack[-1]
+                childId = next(children, None)
+                if childId is None:
+                    stack.pop()
+                    postOrder.append(currentId)
+                elif childId not in visited:
+                    visited.add(childId)
+                    stack.append((childId, iter(self.playlists[childId].downstreamPlaylists)))
+            postOrder.pop()
+            postOrder.reverse()
+            self.downstreamIdsCache[id] = postOrder
+
+        return self.downstreamIdsCache[id]
+
+    def getDownstreamPlaylists(self, playlist: Playlist) -> list[Playlist]:
+        return [self.playlists[id] for id in self.getDownstreamIds(playlist.id)]
+
+    def getUpstreamIds(self, id: str) -> set[str]:
+        upstreamIds: set[str] = set()
+        toVisit = [id]
+        while len(toVisit) > 0:
+            for parentId in self.playlists[toVisit.pop()].upstreamPlaylists:
+                if parentId not in upstreamIds:
+                    upstreamIds.add(parentId)
+                    toVisit.append(parentId)
+
+        return upstreamIds
+
+    def getFlattenedSongs(self, playlist: Playlist) -> list[Song]:
+        if playlist.id not in self.songsCache:
+            songs = playlist.getFlattenedSongs()
+            for downstream in self.getDownstreamPlaylists(playlist):
+                songs += downstream.getFlattenedSongs()
+            self.songsCache[playlist.id] = songs
+
+        return self.songsCache[playlist.id]
+
+    # every playlist in an order where upstream playlists come before the playlists downstream of them
+    def getTopologicalOrder(self) -> list[Playlist]:
+        upstreamCounts = { id: len(playlist.upstreamPlaylists) for id, playlist in self.playlists.items() }
+        ready = [id for id, count in upstreamCounts.items() if count == 0]
+        order: list[Playlist] = []
+        while len(ready) > 0:
+            playlist = self.playlists[ready.pop()]
+            order.append(playlist)
+            for childId in playlist.downstreamPlaylists:
+                upstreamCounts[childId] -= 1
+                if upstreamCounts[childId] == 0:
+                    ready.append(childId)
+
+        if len(order) != len(self.playlists):
+            raise error('The playlist dependencies contain a cycle!')
+
+        return order
+
+    def canAddDownstream(self, playlist: Playlist, downstream: Playlist) -> bool:
+        # Playlist can't be downstream of itself
+        # Playlist is already in the downstream
+        # Playlist is in the upstream and adding it to the downstream would create a cycle
+        return playlist.id != downstream.id \
+            and downstream.id not in self.getDownstreamIds(playlist.id) \
+            and playlist.id not in self.getDownstreamIds(downstream.id)
+
+    def addDownstream(self, playlist: Playlist, downstream: Playlist) -> bool:
+        if not self.canAddDownstream(playlist, downstream):
+            return False
+
+        playlist.downstreamPlaylists[downstream.id] = downstream
+        downstream.upstreamPlaylists[playlist.id] = playlist
+        self.invalidate(playlist.id)
+
+        return True
+
+    def removePlaylist(self, playlist: Playlist):
+        self.invalidate(playlist.id)
+        for parent in playlist.upstreamPlaylists.values():
+            parent.downstreamPlaylists.pop(playlist.id, None)
+        for child in playlist.downstreamPlaylists.values():
+            child.upstreamPlaylists.pop(playlist.id, None)
+        playlist.upstreamPlaylists = {}
+        playlist.downstreamPlaylists = {}
+
+    # drops what was memoized for the playlist and everything upstream of it, after its songs or dependencies changed
+    def invalidate(self, id: str):
+        for affectedId in [id, *self.getUpstreamIds(id)]:
+            self.downstreamIdsCache.pop(affectedId, None)
+            self.songsCache.pop(affectedId, None)
@@ -0,0 +1,157 @@
+from bisect import bisect_left, insort
+from heapq import nsmallest
+import re
+from typing import Iterable, Union
+from playable.song import Song
+
+tokenPattern = re.compile(r'\w+')
+
+# how much a match in each field counts towards a song's rank
+fieldWeights = { 'title': 3, 'artist': 2, 'album': 1, 'filename': 1 }
+# a query term that is only the start of a word, or only close to a word, counts less than a whole word
+prefixMatchFactor = 0.6
+fuzzyMatchFactor = 0.3
+# share of trigrams a word has to have in common with a query term to count as a fuzzy match
+minFuzzySimilarity = 0.3
+
+def tokenize(text: Union[str, None]) -> list[str]:
+    if not text:
+        return []
+
+    return tokenPattern.findall(text.lower())
+
+def getTrigrams(token: str) -> set[str]:
+    # padded so that short words and the start of words have trigrams as well
+    padded = f'  {token} '
+    return { padded[i:i + 3] for i in range(len(padded) - 2) }
+
+# in-memory search over the title, artist, album and filename of every song
+# every word maps to the songs containing it (inverted index), a sorted list of the words finds all words starting with
+# a query term, and words are indexed by their trigrams so that misspelled terms still find close words.
+# Songs can be added and removed one at a time, so the index is kept up to date instead of being rebuilt.
+class SongSearchIndex:
+    def __init__(self):
+        self.songs: dict[str, Song] = {}
+        # word -> song id -> weight of the most important field the word is in
+        self.postings: dict[str, dict[str, int]] = {}
+        # words of every song, needed to take it out of the index again
+        self.songTokens: dict[str, list[str]] = {}
+        self.sortedTokens: list[str] = []
+        self.trigramTokens: dict[str, set[str]] = {}
+
+    def getFields(self, song: Song) -> dict[str, Union[str, None]]:
+        song.loadTags()
+        return { 'title': song.title, 'artist': song.artist, 'album': song.album, 'filename': song.getFilename() }
+
+    def addSong(self, song: Song):
+        if song.id in self.songs:
+            self.removeSong(song)
+
+        weights: dict[str, int] = {}
+        for field, text in self.getFields(song).items():
+            for token in tokenize(text):
+                weights[token] = max(weights.get(token, 0), fieldWeights[field])
+
+        self.songs[song.id] = song
+        self.songTokens[song.id] = list(weights)
+        for token, weight in weights.items():
+            if token not in self.postings:
+                self.postings[token] = {}
+                insort(self.sortedTokens, token)
+                for trigram in getTrigrams(token):
+                    self.trigramTokens.setdefault(trigram, set()).add(token)
+            self.postings[token][song.id] = weight
+
+    def addSongs(self, songs: Iterable[Song]):
+        for song in songs:
+            self.addSong(song)
+
+    def removeSong(self, song: Song):
+        if song.id not in self.songs:
+            return
+
+        self.songs.pop(song.id)
+        for token in self.songTokens.pop(song.id):
+            songIds = self.postings[token]
+            songIds.pop(song.id, None)
+            if len(songIds) == 0:
+                # words no song uses anymore are dropped so that they don't show up in prefix and fuzzy matches
+                self.postings.pop(token)
+                self.sortedTokens.pop(bisect_left(self.sortedTokens, token))
+                for trigram in getTrigrams(token):
+                    tokens = self.trigramTokens[trigram]
+                    tokens.discard(token)
+                    if len(tokens) == 0:
+                        self.trigramTokens.pop(trigram)
+
+    def getPrefixTokens(self, prefix: str) -> list[str]:
+        start = bisect_left(self.sortedTokens, prefix)
+        end = bisect_left(self.sortedTokens, prefix + '\uffff', start)
+        return self.sortedTokens[start:end]
+
+    def getFuzzyTokens(self, term: str) -> list[tuple[str, float]]:
+        termTrigrams = getTrigrams(term)
+        sharedCounts: dict[str, int] = {}
+        for trigram in termTrigrams:
+            for token in self.trigramTokens.get(trigram, ()):
+                sharedCounts[token] = sharedCounts.get(token, 0) + 1
+
+        tokens: list[tuple[str, float]] = []
+        # the similarity can't be higher than the share of the term's trigrams the word has
+        minShared = minFuzzySimilarity * len(termTrigrams)
+        for token, shared in sharedCounts.items():
+            if shared < minShared:
+                continue
+            similarity = shared / (len(termTrigrams) + len(getTrigrams(token)) - shared)
+            if similarity >= minFuzzySimilarity:
+                tokens.append((token, similarity))
+
+        return tokens
+
+    # scores of the songs matching a single query term
+    def scoreTerm(self, term: str) -> dict[str, float]:
+        scores: dict[str, float] = {}
+
+        def addMatches(token: str, factor: float):
+            for songId, weight in self.postings[token].items():
+                score = weight * factor
+                if score > scores.get(songId, 0):
+                    scores[songId] = score
+
+        if term in self.postings:
+            addMatches(term, 1.0)
+        for token in self.getPrefixTokens(term):
+            if token != term:
+                addMatches(token, prefixMatchFactor)
+        if len(scores) == 0:
+            # only fall back to fuzzy matching when nothing contains the term as typed
+            for token, similarity in self.getFuzzyTokens(term):
+                addMatches(token, fuzzyMatchFactor * similarity)
+
+        return scores
+
+    # songs matching every word of the query, best matches first
+    def search(self, query: str, limit: int = None) -> list[Song]:
+        terms = tokenize(query)
+        if len(terms) == 0:
+            return []
+
+        totals: Union[dict[str, float], None] = None
+        # rarest terms first, so that the candidates shrink as early as possible
+        for termScores in sorted((self.scoreTerm(term) for term in terms), key=len):
+            if totals is None:
+                totals = termScores
+            else:
+                totals = { songId: score + termScores[songId] for songId, score in totals.items() if songId in termScores }
+            if len(totals) == 0:
+                return []
+
+        def getSortKey(songId: str):
+            return (-totals[songId], self.songs[songId].getSongName())
+
+        if limit is not None:
+            songIds = nsmallest(limit, totals, key=getSortKey)
+        else:
+            songIds = sorted(totals, key=getSortKey)
+
+        return [self.songs[songId] for songId in songIds]
@@ -0,0 +1,117 @@
+from bisect import bisect_left
+import json
+import os
+import time
+from typing import Union
+
+# upper bounds of the histogram buckets in seconds, doubling from 0.1ms to about 14 minutes
+bucketBounds = [0.0001 * 2 ** i for i in range(24)]
+
+# distribution of a duration, e.g. how long tags take to load
+# only the counts per bucket are kept, so recording costs the same however many times something was measured
+class Histogram:
+    def __init__(self):
+        self.count = 0
+        self.totalSeconds = 0.0
+        self.minSeconds: Union[float, None] = None
+        self.maxSeconds: Union[float, None] = None
+        # the last bucket holds everything longer than the last bound
+        self.bucketCounts = [0] * (len(bucketBounds) + 1)
+
+    def record(self, seconds: float):
+        self.count += 1
+        self.totalSeconds += seconds
+        if self.minSeconds is None or seconds < self.minSeconds:
+            self.minSeconds = seconds
+        if self.maxSeconds is None or seconds > self.maxSeconds:
+            self.maxSeconds = seconds
+        self.bucketCounts[bisect_left(bucketBounds, seconds)] += 1
+
+    def getMeanSeconds(self) -> float:
+        return self.totalSeconds / self.count if self.count > 0 else 0.0
+
+    # upper bound of the bucket the percentile falls in, so at most twice the actual value
+    def getPercentileSeconds(self, percentile: float) -> float:
+        target = self.count * percentile / 100
+        seen = 0
+        for i, count in enumerate(self.bucketCounts):
+            seen += count
+            if count > 0 and seen >= target:
+                return min(bucketBounds[i], self.maxSeconds) if i < len(bucketBounds) else self.maxSeconds
+
+        return 0.0
+
+    def toJsonObject(self):
+        return {
+            'count': self.count,
+            'totalSeconds': self.totalSeconds,
+            'minSeconds': self.minSeconds,
+            'maxSeconds': self.maxSeconds,
+            'p50Seconds': self.getPercentileSeconds(50),
+            'p95Seconds': self.getPercentileSeconds(95),
+            'buckets': { f'{bound:g}': count for bound, count in zip(bucketBounds + [float('inf')], self.bucketCounts) if count > 0 }
+        }
+
+# counters and timing histograms of the hot paths, e.g. 'playback.startLatency' or 'tags.load'
+class Stats:
+    def __init__(self):
+        self.startTime = time.time()
+        self.counters: dict[str, int] = {}
+        self.histograms: dict[str, Histogram] = {}
+
+    def increment(self, name: str, amount: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def recordTime(self, name: str, seconds: float):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = Histogram()
+            self.histograms[name] = histogram
+        histogram.record(seconds)
+
+    def toJsonObject(self):
+        return {
+            'startTime': self.startTime,
+            'endTime': time.time(),
+            'counters': dict(sorted(self.counters.items())),
+            'histograms': { name: self.histograms[name].toJsonObject() for name in sorted(self.histograms) }
+        }
+
+    def print(self):
+        if len(self.counters) == 0 and len(self.histograms) == 0:
+            print('Nothing has been measured yet.')
+            return
+
+        for name in sorted(self.counters):
+            print(f'{name}: {self.counters[name]}')
+        for name in sorted(self.histograms):
+            histogram = self.histograms[name]
+            print(f'{name}: {histogram.count}x, mean {histogram.getMeanSeconds() * 1000:.1f}ms, ' \
+                f'p50 {histogram.getPercentileSeconds(50) * 1000:.1f}ms, p95 {histogram.getPercentileSeconds(95) * 1000:.1f}ms, ' \
+                f'max {histogram.maxSeconds * 1000:.1f}ms')
+
+        scans = self.histograms.get('scan.duration')
+        if scans and scans.totalSeconds > 0:
+            print(f'scan throughput: {self.counters.get("scan.filesScanned", 0) / scans.totalSeconds:.0f} files/sec')
+
+    def save(self, statsFullPath: str):
+        tempPath = f'{statsFullPath}.tmp'
+        with open(tempPath, 'w') as statsFile:
+            json.dump(self.toJsonObject(), statsFile, indent=4)
+        os.replace(tempPath, statsFullPath)
+
+# stats are collected from the start when this environment variable is set
+statsEnvironmentVariable = 'THE_GOOD_PART_STATS'
+
+# stats of the process, None until they are turned on, so instrumented code only pays for a None check otherwise
+currentStats: Union[Stats, None] = None
+
+def enableStats() -> Stats:
+    global currentStats
+    if currentStats is None:
+        currentStats = Stats()
+
+    return currentStats
+
+def getStats() -> Union[Stats, None]:
+    return currentStats
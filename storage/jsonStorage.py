@@ -0,0 +1,99 @@
+import json
+import os
+from os import path
+from typing import Iterator, Union
+from storage.jsonStream import JsonSectionReader
+from storage.settingsStorage import SettingsChanges, SettingsStorage
+
+# the big arrays of the settings file, which are streamed instead of loaded at once
+sectionKeys = { 'songs', 'playlists', 'playlistDependencies', 'clonedSongs' }
+
+# keeps the whole library in a single json file that is rewritten on every save
+# the file is read through a memory map one record at a time, so loading never holds the whole json tree in memory
+class JsonStorage(SettingsStorage):
+    def __init__(self, settingsFullPath: str):
+        self.settingsFullPath = settingsFullPath
+        self.reader: Union[JsonSectionReader, None] = None
+
+    def open(self):
+        if not path.exists(self.settingsFullPath):
+            # the file is created empty and only filled on the first save
+            with open(self.settingsFullPath, 'w'):
+                pass
+
+    def getReader(self) -> JsonSectionReader:
+        if not self.reader:
+            self.reader = JsonSectionReader(self.settingsFullPath, sectionKeys)
+
+        return self.reader
+
+    def getSongs(self) -> Iterator[dict]:
+        return self.getReader().iterateSection('songs')
+
+    def getPlaylists(self) -> Iterator[dict]:
+        return self.getReader().iterateSection('playlists')
+
+    def getPlaylistDependencies(self) -> Iterator[dict]:
+        return self.getReader().iterateSection('playlistDependencies')
+
+    def getClonedSongGroups(self) -> Iterator[dict]:
+        return self.getReader().iterateSection('clonedSongs')
+
+    def getLibraryRoots(self) -> list[str]:
+        return self.getReader().getValue('libraryRoots') or []
+
+    def getJournalSequence(self) -> int:
+        return self.getReader().getValue('journalSequence', 0)
+
+    def getSongById(self, id: str) -> Union[dict, None]:
+        for song in self.getSongs():
+            if song['id'] == id:
+                return song
+
+        return None
+
+    def getSongByPath(self, songPath: str) -> Union[dict, None]:
+        for song in self.getSongs():
+            if song['path'] == songPath:
+                return song
+
+        return None
+
+    def save(self, settings, changes: SettingsChanges):
+        # keys this version doesn't know about are kept as they are
+        values = dict(self.getReader().getAllValues())
+        self.close()
+        values['libraryRoots'] = settings.libraryRoots
+        values['journalSequence'] = settings.journalSequence
+
+        playlists = settings.getPlaylistsList()
+        sections = [
+            ('songs', (song.toJsonObject() for song in settings.songs)),
+            ('playlists', (playlist.toPlaylistJsonObject() for playlist in playlists)),
+            ('playlistDependencies', (playlist.toDependenciesJsonObject() for playlist in playlists)),
+            ('clonedSongs', (group.toJsonObject() for group in settings.clonedSongGroups.values()))
+        ]
+
+        # write a new file and swap it in, so a crash while saving never leaves a half written settings file
+        tempPath = f'{self.settingsFullPath}.tmp'
+        with open(tempPath, 'w') as settingsFile:
+            # the small values go first so that loading finds them without having to skip over the big sections,
+            # which are written one record per line instead of being built up as one big string
+            entries = [f'    {json.dumps(key)}: {json.dumps(value)}' for key, value in values.items() if key not in sectionKeys]
+            settingsFile.write('{\n' + ',\n'.join(entries))
+            for key, records in sections:
+                settingsFile.write(f',\n    {json.dumps(key)}: [')
+                separator = '\n'
+                for record in records:
+                    settingsFile.write(separator + '        ' + json.dumps(record))
+                    separator = ',\n'
+                settingsFile.write('\n    ]')
+            settingsFile.write('\n}\n')
+            settingsFile.flush()
+            os.fsync(settingsFile.fileno())
+        os.replace(tempPath, self.settingsFullPath)
+
+    def close(self):
+        if self.reader:
+            self.reader.close()
+            self.reader = None
@@ -0,0 +1,195 @@
+import json
+import mmap
+import os
+import re
+from typing import Any, Iterator, Union
+
+# how much of the file is decoded at a time
+windowSize = 1 << 20
+whitespacePattern = re.compile(r'[ \t\n\r]*')
+# the separator after an array element, with the whitespace around it
+separatorPattern = re.compile(r'[ \t\n\r]*([,\]])[ \t\n\r]*')
+# characters of a number that can be left over after the digits the decoder accepted, e.g. the "e-" of "1e-"
+maxNumberCutOff = 2
+
+def isNumber(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+# reads json values one at a time from a memory mapped file
+# the window is decoded as latin-1 so that character positions are byte positions; values containing non-ascii
+# characters are decoded again from their bytes as utf-8
+class JsonCursor:
+    def __init__(self, data: Union[mmap.mmap, bytes]):
+        self.data = data
+        self.decoder = json.JSONDecoder()
+        # byte offset of the next character to read
+        self.pos = 0
+        # byte offset and text of the decoded window
+        self.base = 0
+        self.text = ''
+
+    def getWindowEnd(self) -> int:
+        return self.base + len(self.text)
+
+    def loadWindow(self, size: int):
+        self.base = self.pos
+        self.text = self.data[self.pos:self.pos + max(windowSize, size)].decode('latin-1')
+
+    def ensureWindow(self, minSize: int):
+        if self.pos < self.base or (self.pos + minSize > self.getWindowEnd() and self.getWindowEnd() < len(self.data)):
+            self.loadWindow(minSize)
+
+    def skipWhitespace(self):
+        while True:
+            self.ensureWindow(1)
+            idx = self.pos - self.base
+            end = whitespacePattern.match(self.text, idx).end()
+            self.pos = self.base + end
+            if end < len(self.text) or self.getWindowEnd() >= len(self.data):
+                return
+
+    def peek(self) -> str:
+        self.skipWhitespace()
+        idx = self.pos - self.base
+        if idx >= len(self.text):
+            return ''
+
+        return self.text[idx]
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f'Expected "{char}" at byte {self.pos} of the settings file!')
+        self.pos += 1
+
+    def readValue(self) -> Any:
+        idx = self.pos - self.base
+        if idx < 0 or idx >= len(self.text) or self.text[idx] in ' \t\n\r':
+            self.skipWhitespace()
+            self.ensureWindow(1)
+        while True:
+            idx = self.pos - self.base
+            isAtEndOfData = self.getWindowEnd() >= len(self.data)
+            try:
+                value, end = self.decoder.raw_decode(self.text, idx)
+                # a value ending right at the edge of the window might continue past it, and a number also if it ends
+                # just before it, e.g. 12.5 cut off as "12." or 1e-07 as "1e-" decodes as its first digits
+                if isAtEndOfData or end < len(self.text) - (maxNumberCutOff if isNumber(value) else 0):
+                    break
+            except ValueError:
+                if isAtEndOfData:
+                    raise
+            # the value doesn't fit in the window, read a bigger one starting at the value
+            self.loadWindow((self.getWindowEnd() - self.pos) * 2)
+
+        if not self.text[idx:end].isascii():
+            value = json.loads(self.data[self.pos:self.base + end])
+        self.pos = self.base + end
+
+        return value
+
+    def iterateArray(self) -> Iterator[Any]:
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+
+        while True:
+            yield self.readValue()
+            # the common case of the separator being inside the window is matched in one go
+            match = separatorPattern.match(self.text, self.pos - self.base)
+            if match and match.end() < len(self.text):
+                char = match.group(1)
+                self.pos = self.base + match.end()
+            else:
+                char = self.peek()
+                self.pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError(f'Expected "," or "]" at byte {self.pos - 1} of the settings file!')
+
+    def skipValue(self):
+        # arrays are skipped element by element so they are never held in memory as a whole
+        if self.peek() == '[':
+            for _ in self.iterateArray():
+                pass
+        else:
+            self.readValue()
+
+# reads the top level object of a json settings file section by section
+# the big sections (arrays of songs, playlists, ...) are streamed one element at a time, everything else is parsed
+# as it is passed. Sections are cheapest to read in the order they appear in the file.
+class JsonSectionReader:
+    def __init__(self, fullpath: str, sectionKeys: set[str]):
+        self.sectionKeys = sectionKeys
+        self.file = open(fullpath, 'rb')
+        self.map: Union[mmap.mmap, None] = None
+        # byte offset of the value of every top level key that has been seen
+        self.offsets: dict[str, int] = {}
+        # values of the small top level keys that have been seen
+        self.values: dict[str, Any] = {}
+        self.isComplete = True
+        if os.fstat(self.file.fileno()).st_size > 0:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.cursor = JsonCursor(self.map)
+            if self.cursor.peek():
+                self.cursor.expect('{')
+                self.isComplete = False
+        # where reading the next top level key resumes, and the section whose value starts there if it wasn't read yet
+        self.frontier = self.cursor.pos if self.map else 0
+        self.pendingKey: Union[str, None] = None
+
+    def scanTo(self, key: Union[str, None]):
+        # scans until the key has been found, or to the end of the object for None
+        while (key is None or key not in self.offsets) and not self.isComplete:
+            self.cursor.pos = self.frontier
+            if self.pendingKey is not None:
+                self.cursor.skipValue()
+                self.pendingKey = None
+                self.frontier = self.cursor.pos
+
+            char = self.cursor.peek()
+            if char == '}' or char == '':
+                self.isComplete = True
+                break
+            if char == ',':
+                self.cursor.pos += 1
+
+            currentKey = self.cursor.readValue()
+            self.cursor.expect(':')
+            self.cursor.skipWhitespace()
+            self.offsets[currentKey] = self.cursor.pos
+            if currentKey in self.sectionKeys:
+                self.pendingKey = currentKey
+            else:
+                self.values[currentKey] = self.cursor.readValue()
+            self.frontier = self.cursor.pos
+
+    def getValue(self, key: str, default: Any = None) -> Any:
+        self.scanTo(key)
+        return self.values.get(key, default)
+
+    def getAllValues(self) -> dict[str, Any]:
+        self.scanTo(None)
+        return self.values
+
+    def iterateSection(self, key: str) -> Iterator[Any]:
+        self.scanTo(key)
+        if key not in self.offsets:
+            return
+
+        self.cursor.pos = self.offsets[key]
+        if self.cursor.peek() != '[':
+            return
+
+        isAtFrontier = self.pendingKey == key
+        yield from self.cursor.iterateArray()
+        if isAtFrontier:
+            self.pendingKey = None
+            self.frontier = self.cursor.pos
+
+    def close(self):
+        if self.map:
+            self.map.close()
+            self.map = None
+        self.file.close()
@@ -0,0 +1,47 @@
+import json
+import os
+from os import path
+from typing import Iterator, TextIO, Union
+
+# append-only log of the edits made since the last snapshot of the settings was saved
+# every line is one json entry, { 'seq': ..., 'op': ..., 'args': ... }, so appending an edit is a single small write
+class SettingsJournal:
+    def __init__(self, journalFullPath: str):
+        self.journalFullPath = journalFullPath
+        self.file: Union[TextIO, None] = None
+        self.entryCount = 0
+
+    def readEntries(self) -> Iterator[dict]:
+        if not path.exists(self.journalFullPath):
+            return
+
+        with open(self.journalFullPath, 'r') as journalFile:
+            for line in journalFile:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # a crash in the middle of an append leaves a partial last line, which is dropped
+                    break
+                self.entryCount += 1
+                yield entry
+
+    def append(self, seq: int, op: str, args: dict):
+        if not self.file:
+            self.file = open(self.journalFullPath, 'a')
+
+        self.file.write(json.dumps({ 'seq': seq, 'op': op, 'args': args }, separators=(',', ':')) + '\n')
+        # flushing hands the entry to the OS, so it survives the process being killed
+        self.file.flush()
+        self.entryCount += 1
+
+    def clear(self):
+        # only called once the entries are part of a saved snapshot
+        self.close()
+        if path.exists(self.journalFullPath):
+            os.remove(self.journalFullPath)
+        self.entryCount = 0
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
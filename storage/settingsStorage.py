@@ -0,0 +1,93 @@
+from abc import abstractmethod
+from typing import Iterable, Union
+
+# ids of everything that was added, edited or removed since the last save, so backends can write only those
+class SettingsChanges:
+    def __init__(self):
+        self.songIds: set[str] = set()
+        self.removedSongIds: set[str] = set()
+        self.playlistIds: set[str] = set()
+        self.removedPlaylistIds: set[str] = set()
+        self.clonedSongGroupIds: set[str] = set()
+        self.removedClonedSongGroupIds: set[str] = set()
+        self.libraryRootsChanged = False
+
+    def markSong(self, id: str):
+        self.songIds.add(id)
+        self.removedSongIds.discard(id)
+
+    def markSongRemoved(self, id: str):
+        self.songIds.discard(id)
+        self.removedSongIds.add(id)
+
+    def markPlaylist(self, id: str):
+        self.playlistIds.add(id)
+        self.removedPlaylistIds.discard(id)
+
+    def markPlaylistRemoved(self, id: str):
+        self.playlistIds.discard(id)
+        self.removedPlaylistIds.add(id)
+
+    def markClonedSongGroup(self, id: str):
+        self.clonedSongGroupIds.add(id)
+        self.removedClonedSongGroupIds.discard(id)
+
+    def markClonedSongGroupRemoved(self, id: str):
+        self.clonedSongGroupIds.discard(id)
+        self.removedClonedSongGroupIds.add(id)
+
+    def hasChanges(self) -> bool:
+        return len(self.songIds) > 0 or len(self.removedSongIds) > 0 \
+            or len(self.playlistIds) > 0 or len(self.removedPlaylistIds) > 0 \
+            or len(self.clonedSongGroupIds) > 0 or len(self.removedClonedSongGroupIds) > 0 \
+            or self.libraryRootsChanged
+
+# where UserSettings reads its library from and writes it back to
+# records use the same layout as the json settings file, e.g. { 'id': ..., 'path': ..., 'cloneId': ... } for songs
+# the record getters may stream their results, so each of them should only be iterated once
+class SettingsStorage:
+    @abstractmethod
+    def open(self):
+        pass
+
+    @abstractmethod
+    def getSongs(self) -> Iterable[dict]:
+        pass
+
+    @abstractmethod
+    def getPlaylists(self) -> Iterable[dict]:
+        pass
+
+    @abstractmethod
+    def getPlaylistDependencies(self) -> Iterable[dict]:
+        pass
+
+    @abstractmethod
+    def getClonedSongGroups(self) -> Iterable[dict]:
+        pass
+
+    @abstractmethod
+    def getLibraryRoots(self) -> list[str]:
+        pass
+
+    # sequence number of the last journal entry included in the stored settings
+    @abstractmethod
+    def getJournalSequence(self) -> int:
+        pass
+
+    @abstractmethod
+    def getSongById(self, id: str) -> Union[dict, None]:
+        pass
+
+    @abstractmethod
+    def getSongByPath(self, path: str) -> Union[dict, None]:
+        pass
+
+    # settings is the UserSettings being saved, changes says what was modified since the last save
+    # saving must be atomic, either everything is written or the previous state is kept
+    @abstractmethod
+    def save(self, settings, changes: SettingsChanges):
+        pass
+
+    def close(self):
+        pass
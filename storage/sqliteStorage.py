@@ -0,0 +1,181 @@
+import json
+import sqlite3
+from os import path
+from typing import Union
+from storage.jsonStorage import JsonStorage
+from storage.settingsStorage import SettingsChanges, SettingsStorage
+
+schemaVersion = 4
+
+schema = '''
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS songs (
+    id TEXT PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    cloneId TEXT,
+    mtime INTEGER,
+    size INTEGER,
+    inode INTEGER,
+    hash TEXT,
+    fingerprint TEXT,
+    loudness REAL,
+    duplicatesReviewed INTEGER
+);
+CREATE TABLE IF NOT EXISTS playlists (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    songs TEXT NOT NULL,
+    upstream TEXT NOT NULL,
+    downstream TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS clonedSongGroups (id TEXT PRIMARY KEY, songDistributions TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS libraryRoots (path TEXT PRIMARY KEY);
+'''
+
+songColumns = ['id', 'path', 'cloneId', 'mtime', 'size', 'inode', 'hash', 'fingerprint', 'loudness', 'duplicatesReviewed']
+
+def songRowToJsonObject(row: sqlite3.Row) -> dict:
+    # leave out empty columns, the same way the json layout does
+    return { column: row[column] for column in songColumns if row[column] is not None }
+
+def songToRow(song) -> tuple:
+    obj = song.toJsonObject()
+    return tuple([obj.get(column) for column in songColumns])
+
+def playlistToRow(playlist) -> tuple:
+    playlistObj = playlist.toPlaylistJsonObject()
+    dependenciesObj = playlist.toDependenciesJsonObject()
+    return (
+        playlist.id,
+        playlist.name,
+        json.dumps(playlistObj['songs']),
+        json.dumps(dependenciesObj['upstream']),
+        json.dumps(dependenciesObj['downstream'])
+    )
+
+# keeps the library in an sqlite database
+# songs are indexed by id and path, and saving only writes the records that changed inside a single transaction,
+# so a crash while saving leaves the previous state intact
+class SqliteStorage(SettingsStorage):
+    # legacyJsonFullPath is an old json settings file that is imported the first time the database is created
+    def __init__(self, databaseFullPath: str, legacyJsonFullPath: str = None):
+        self.databaseFullPath = databaseFullPath
+        self.legacyJsonFullPath = legacyJsonFullPath
+        self.connection: Union[sqlite3.Connection, None] = None
+
+    def open(self):
+        isNewDatabase = not path.exists(self.databaseFullPath)
+        self.connection = sqlite3.connect(self.databaseFullPath)
+        self.connection.row_factory = sqlite3.Row
+        with self.connection:
+            self.connection.executescript(schema)
+            self.upgradeSchema()
+            self.connection.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', ('schemaVersion', str(schemaVersion)))
+
+        if isNewDatabase and self.legacyJsonFullPath and path.exists(self.legacyJsonFullPath):
+            self.migrateFromJson(self.legacyJsonFullPath)
+
+    # adds the columns of newer schema versions to databases created by older ones
+    def upgradeSchema(self):
+        existingColumns = set([row['name'] for row in self.connection.execute('PRAGMA table_info(songs)')])
+        if 'fingerprint' not in existingColumns:
+            self.connection.execute('ALTER TABLE songs ADD COLUMN fingerprint TEXT')
+        if 'loudness' not in existingColumns:
+            self.connection.execute('ALTER TABLE songs ADD COLUMN loudness REAL')
+        if 'duplicatesReviewed' not in existingColumns:
+            self.connection.execute('ALTER TABLE songs ADD COLUMN duplicatesReviewed INTEGER')
+
+    def migrateFromJson(self, jsonFullPath: str):
+        legacy = JsonStorage(jsonFullPath)
+        legacy.open()
+
+        # the sections are streamed in the order they are stored in, so the json file is never loaded as a whole
+        with self.connection:
+            self.connection.executemany('INSERT OR IGNORE INTO libraryRoots (path) VALUES (?)', [(root,) for root in legacy.getLibraryRoots()])
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO songs (id, path, cloneId, mtime, size, inode, hash, fingerprint, loudness, duplicatesReviewed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (tuple([song.get(column) for column in songColumns]) for song in legacy.getSongs())
+            )
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO playlists (id, name, songs, upstream, downstream) VALUES (?, ?, ?, ?, ?)',
+                ((playlist['id'], playlist['name'], json.dumps(playlist['songs']), '[]', '[]') for playlist in legacy.getPlaylists())
+            )
+            self.connection.executemany(
+                'UPDATE playlists SET upstream = ?, downstream = ? WHERE id = ?',
+                ((json.dumps(dep.get('upstream', [])), json.dumps(dep.get('downstream', [])), dep['id']) for dep in legacy.getPlaylistDependencies())
+            )
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO clonedSongGroups (id, songDistributions) VALUES (?, ?)',
+                ((group['id'], json.dumps(group['songDistributions'])) for group in legacy.getClonedSongGroups())
+            )
+
+        legacy.close()
+
+    def getSongs(self) -> list[dict]:
+        # rowid keeps the order songs were added in
+        rows = self.connection.execute('SELECT * FROM songs ORDER BY rowid')
+        return [songRowToJsonObject(row) for row in rows]
+
+    def getPlaylists(self) -> list[dict]:
+        rows = self.connection.execute('SELECT id, name, songs FROM playlists ORDER BY rowid')
+        return [{ 'id': row['id'], 'name': row['name'], 'songs': json.loads(row['songs']) } for row in rows]
+
+    def getPlaylistDependencies(self) -> list[dict]:
+        rows = self.connection.execute('SELECT id, upstream, downstream FROM playlists ORDER BY rowid')
+        return [{ 'id': row['id'], 'upstream': json.loads(row['upstream']), 'downstream': json.loads(row['downstream']) } for row in rows]
+
+    def getClonedSongGroups(self) -> list[dict]:
+        rows = self.connection.execute('SELECT id, songDistributions FROM clonedSongGroups ORDER BY rowid')
+        return [{ 'id': row['id'], 'songDistributions': json.loads(row['songDistributions']) } for row in rows]
+
+    def getLibraryRoots(self) -> list[str]:
+        return [row['path'] for row in self.connection.execute('SELECT path FROM libraryRoots ORDER BY rowid')]
+
+    def getJournalSequence(self) -> int:
+        row = self.connection.execute('SELECT value FROM meta WHERE key = ?', ('journalSequence',)).fetchone()
+        return int(row['value']) if row else 0
+
+    def getSongById(self, id: str) -> Union[dict, None]:
+        row = self.connection.execute('SELECT * FROM songs WHERE id = ?', (id,)).fetchone()
+        return songRowToJsonObject(row) if row else None
+
+    def getSongByPath(self, songPath: str) -> Union[dict, None]:
+        row = self.connection.execute('SELECT * FROM songs WHERE path = ?', (songPath,)).fetchone()
+        return songRowToJsonObject(row) if row else None
+
+    def save(self, settings, changes: SettingsChanges):
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', ('journalSequence', str(settings.journalSequence)))
+            self.connection.executemany('DELETE FROM songs WHERE id = ?', [(id,) for id in changes.removedSongIds])
+            # upsert rather than replace so that existing songs keep their rowid, and with it their order
+            self.connection.executemany(
+                '''INSERT INTO songs (id, path, cloneId, mtime, size, inode, hash, fingerprint, loudness, duplicatesReviewed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET path = excluded.path, cloneId = excluded.cloneId, mtime = excluded.mtime,
+                    size = excluded.size, inode = excluded.inode, hash = excluded.hash, fingerprint = excluded.fingerprint,
+                    loudness = excluded.loudness, duplicatesReviewed = excluded.duplicatesReviewed''',
+                [songToRow(settings.songsDict[id]) for id in changes.songIds if id in settings.songsDict]
+            )
+
+            self.connection.executemany('DELETE FROM playlists WHERE id = ?', [(id,) for id in changes.removedPlaylistIds])
+            self.connection.executemany(
+                '''INSERT INTO playlists (id, name, songs, upstream, downstream) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET name = excluded.name, songs = excluded.songs,
+                    upstream = excluded.upstream, downstream = excluded.downstream''',
+                [playlistToRow(settings.playlists[id]) for id in changes.playlistIds if id in settings.playlists]
+            )
+
+            self.connection.executemany('DELETE FROM clonedSongGroups WHERE id = ?', [(id,) for id in changes.removedClonedSongGroupIds])
+            self.connection.executemany(
+                '''INSERT INTO clonedSongGroups (id, songDistributions) VALUES (?, ?)
+                ON CONFLICT(id) DO UPDATE SET songDistributions = excluded.songDistributions''',
+                [(id, json.dumps(settings.clonedSongGroups[id].toJsonObject()['songDistributions'])) for id in changes.clonedSongGroupIds if id in settings.clonedSongGroups]
+            )
+
+            if changes.libraryRootsChanged:
+                self.connection.execute('DELETE FROM libraryRoots')
+                self.connection.executemany('INSERT INTO libraryRoots (path) VALUES (?)', [(root,) for root in settings.libraryRoots])
+
+    def close(self):
+        if self.connection:
+            self.connection.close()
+            self.connection = None
@@ -0,0 +1,105 @@
+import json
+import os
+from os import path
+import threading
+from typing import Union
+from stats import getStats
+
+tagNames = ['artist', 'title', 'album']
+
+# mutagen is only imported once a file actually has to be read, commands that only use cached tags never load it
+def readTags(fullpath: str) -> dict[str, str]:
+    from mutagen import MutagenError
+    from mutagen.easyid3 import EasyID3
+
+    tags: dict[str, str] = {}
+    try:
+        id3 = EasyID3(fullpath)
+    except (MutagenError, OSError):
+        # files without an ID3 header fall back to 'Unknown'/the filename
+        return tags
+
+    for name in tagNames:
+        values = id3.get(name)
+        # may need to adjust length logic for when songs are linked
+        if values and len(values) == 1:
+            tags[name] = values[0]
+
+    return tags
+
+# length of the audio in seconds, or None if the file can't be read
+def readTrackLengthSeconds(fullpath: str) -> Union[float, None]:
+    from mutagen import MutagenError
+    from mutagen.mp3 import MP3
+
+    try:
+        return MP3(fullpath).info.length
+    except (MutagenError, OSError):
+        return None
+
+# persistent cache of ID3 tags keyed on path, so that unchanged files never need to be parsed again
+# an entry is only valid while the file's mtime and size match the ones it was read with
+class TagCache:
+    def __init__(self, cacheFullPath: Union[str, None]):
+        self.cacheFullPath = cacheFullPath
+        # path -> [mtime in ns, size in bytes, tags]
+        self.entries: Union[dict[str, list], None] = None
+        self.isDirty = False
+        # scanner threads (and the daemon scanning on an executor) use the entries while songs load their tags
+        self.lock = threading.Lock()
+
+    # callers hold the lock
+    def loadEntries(self) -> dict[str, list]:
+        # the cache file is only read the first time tags are actually needed
+        if self.entries is None:
+            self.entries = {}
+            if self.cacheFullPath and path.exists(self.cacheFullPath):
+                try:
+                    with open(self.cacheFullPath, 'r') as cacheFile:
+                        self.entries = json.load(cacheFile).get('entries', {})
+                except (OSError, ValueError):
+                    # a corrupt cache is simply rebuilt
+                    self.entries = {}
+
+        return self.entries
+
+    def getCachedTags(self, fullpath: str, mtime: int, size: int) -> Union[dict[str, str], None]:
+        with self.lock:
+            entry = self.loadEntries().get(fullpath)
+        if entry and entry[0] == mtime and entry[1] == size:
+            return entry[2]
+
+        return None
+
+    def putTags(self, fullpath: str, mtime: int, size: int, tags: dict[str, str]):
+        with self.lock:
+            self.loadEntries()[fullpath] = [mtime, size, tags]
+            self.isDirty = True
+
+    def getTags(self, fullpath: str) -> dict[str, str]:
+        try:
+            stat = os.stat(fullpath)
+        except OSError:
+            return {}
+
+        tags = self.getCachedTags(fullpath, stat.st_mtime_ns, stat.st_size)
+        stats = getStats()
+        if stats:
+            stats.increment('tags.cacheMisses' if tags is None else 'tags.cacheHits')
+        if tags is None:
+            tags = readTags(fullpath)
+            self.putTags(fullpath, stat.st_mtime_ns, stat.st_size, tags)
+
+        return tags
+
+    def save(self):
+        with self.lock:
+            if not self.isDirty or not self.cacheFullPath:
+                return
+
+            # write to a temporary file first so that a crash never leaves a half written cache behind
+            tempPath = f'{self.cacheFullPath}.tmp'
+            with open(tempPath, 'w') as cacheFile:
+                json.dump({ 'version': 1, 'entries': self.entries }, cacheFile)
+            os.replace(tempPath, self.cacheFullPath)
+            self.isDirty = False
@@ -0,0 +1,94 @@
+import json
+import os
+import random
+import tempfile
+import unittest
+from storage import jsonStream
+from storage.jsonStream import JsonCursor, JsonSectionReader
+
+def randomNumber(rng: random.Random) -> str:
+    kind = rng.randrange(4)
+    if kind == 0:
+        return str(rng.randrange(-10 ** 6, 10 ** 6))
+    if kind == 1:
+        return repr(rng.uniform(-1000, 1000))
+    if kind == 2:
+        return f'{rng.uniform(-10, 10):.3e}'
+    return f'{rng.randrange(1, 100)}E{rng.choice(["", "+", "-"])}{rng.randrange(0, 20)}'
+
+def randomString(rng: random.Random) -> str:
+    return json.dumps(''.join(rng.choice('ab "\\é\n1e-.') for _ in range(rng.randrange(6))), ensure_ascii=rng.random() < 0.5)
+
+# json text of a random value, numbers are written in every form json allows
+def randomJson(rng: random.Random, depth: int = 0) -> str:
+    # containers only up to a few levels deep
+    kind = rng.randrange(6 if depth < 3 else 4)
+    space = rng.choice(['', ' ', '\n  '])
+    if kind <= 1:
+        return randomNumber(rng)
+    if kind == 2:
+        return randomString(rng)
+    if kind == 3:
+        return rng.choice(['true', 'false', 'null', randomNumber(rng)])
+    if kind == 4:
+        items = [randomJson(rng, depth + 1) for _ in range(rng.randrange(5))]
+        return '[' + space + f'{space},{space}'.join(items) + space + ']'
+    members = [f'{randomString(rng)}{space}:{space}{randomJson(rng, depth + 1)}' for _ in range(rng.randrange(5))]
+    return '{' + space + f',{space}'.join(members) + space + '}'
+
+class JsonStreamTest(unittest.TestCase):
+    def setUp(self):
+        self.originalWindowSize = jsonStream.windowSize
+
+    def tearDown(self):
+        jsonStream.windowSize = self.originalWindowSize
+
+    def readArray(self, text: str) -> list:
+        return list(JsonCursor(text.encode()).iterateArray())
+
+    def testNumbersCutOffByTheWindow(self):
+        for text in ['{"x": 1e-07}', '[12.5, 1E+3, -0.25e-2, 100]', '[1, 22, 333, 4444.5]']:
+            for size in range(1, len(text) + 1):
+                jsonStream.windowSize = size
+                if text.startswith('['):
+                    self.assertEqual(self.readArray(text), json.loads(text), f'window of {size}')
+                else:
+                    self.assertEqual(JsonCursor(text.encode()).readValue(), json.loads(text), f'window of {size}')
+
+    # every window size from a single byte up must read the same values as json.loads
+    def testRandomDocumentsAtSmallWindows(self):
+        rng = random.Random(9)
+        for _ in range(300):
+            text = '[' + ', '.join(randomJson(rng) for _ in range(rng.randrange(1, 6))) + ']'
+            expected = json.loads(text)
+            for size in range(1, 17):
+                jsonStream.windowSize = size
+                self.assertEqual(self.readArray(text), expected, f'{text} with a window of {size}')
+
+    def testSectionsAtSmallWindows(self):
+        rng = random.Random(4)
+        for _ in range(50):
+            document = {
+                'version': randomNumber(rng),
+                'songs': [randomJson(rng) for _ in range(rng.randrange(4))],
+                'volume': randomNumber(rng),
+                'playlists': [randomJson(rng) for _ in range(rng.randrange(4))],
+            }
+            text = '{' + ', '.join(f'"{key}": ' + (value if isinstance(value, str) else '[' + ','.join(value) + ']') for key, value in document.items()) + '}'
+            expected = json.loads(text)
+            with tempfile.TemporaryDirectory() as tempDir:
+                fullpath = os.path.join(tempDir, 'settings.json')
+                with open(fullpath, 'w', encoding='utf-8') as file:
+                    file.write(text)
+                for size in range(1, 17):
+                    jsonStream.windowSize = size
+                    reader = JsonSectionReader(fullpath, { 'songs', 'playlists' })
+                    try:
+                        self.assertEqual(list(reader.iterateSection('songs')), expected['songs'])
+                        self.assertEqual(reader.getAllValues(), { 'version': expected['version'], 'volume': expected['volume'] })
+                        self.assertEqual(list(reader.iterateSection('playlists')), expected['playlists'])
+                    finally:
+                        reader.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,131 +1,669 @@
-from os import error, listdir, path
-from os.path import isfile, join
-import json
-from typing import Union
+import os
+import random
+from os import error, path
+import time
+import uuid
+from typing import TYPE_CHECKING, Callable, Iterator, Union
+from audioFingerprint import fingerprintFiles
 from clonedSong import ClonedSong
-from playable.clonedSongGroup import ClonedSongGroup
+from libraryScanner import LibraryScanner, ScannedFile, ScanProgress, walkMp3Files
+from audioCache import defaultMaxCacheBytes
+from playable.clonedSongGroup import ClonedSongGroup, resolveClonedSongs
 from playable.playlist import Playlist
-from playable.song import Song
-
-# disposable class that will automatically read from the provided json settings file and write to it on close
+from playable.song import Song, internTag
+from playlistGraph import PlaylistGraph
+from songSearchIndex import SongSearchIndex, tokenize
+from storage.jsonStorage import JsonStorage
+from storage.settingsJournal import SettingsJournal
+from storage.settingsStorage import SettingsChanges, SettingsStorage
+from storage.sqliteStorage import SqliteStorage
+from stats import getStats
+from tagCache import TagCache
+
+# the player and the loudness analysis load pygame and numpy, so they are only imported once something is played
+if TYPE_CHECKING:
+    from loudnessAnalysis import LoudnessAnalyzer
+    from musicPlayer import MusicPlayer
+
+class RescanResult:
+    def __init__(self):
+        self.unchanged = 0
+        self.updated: list[Song] = []
+        self.moved: list[Song] = []
+        self.added: list[Song] = []
+        self.removed: list[Song] = []
+
+def isUnderRoot(filepath: str, root: str) -> bool:
+    root = path.abspath(root)
+    return path.abspath(filepath).startswith(root.rstrip(os.sep) + os.sep)
+
+def createSettingsStorage(settingsFullPath: str) -> SettingsStorage:
+    root, extension = path.splitext(settingsFullPath)
+    if extension == '.db':
+        # a json settings file with the same name is migrated into a new database
+        return SqliteStorage(settingsFullPath, f'{root}.json')
+
+    return JsonStorage(settingsFullPath)
+
+# the journal is compacted into a new snapshot once it has this many entries or its oldest entry is this old
+compactAfterEntries = 5000
+compactAfterSeconds = 5 * 60
+
+# disposable class that will automatically read from the provided settings file and write to it on close
+# the storage backend is picked by the file extension, '.db' for sqlite and json otherwise
+# edits are appended to a journal next to the settings file as they happen, so a crash only loses unfinished edits
 class UserSettings:
-    def __init__(self, settingsFullPath):
+    def __init__(self, settingsFullPath, tagCacheFullPath=None, audioCacheDir=None, audioCacheMaxBytes=defaultMaxCacheBytes):
         self.settingsFullPath = settingsFullPath
+        # decoded audio of frequently played songs is only cached when a directory for it is given
+        self.audioCacheDir = audioCacheDir
+        self.audioCacheMaxBytes = audioCacheMaxBytes
+        self.storage = createSettingsStorage(settingsFullPath)
+        self.changes = SettingsChanges()
+        self.journal = SettingsJournal(f'{settingsFullPath}.journal')
+        self.journalSequence = 0
+        self.isReplayingJournal = False
+        # when the first entry of the current journal was written, None while the journal is empty
+        self.oldestEntryTime: Union[float, None] = None
+        # songs only read their ID3 tags on first use, and the cache avoids re-reading unchanged files across sessions
+        self.tagCache = TagCache(tagCacheFullPath)
         self.songs: list[Song] = []
         self.songsDict: dict[str, Song] = {}
         # Set of paths to prevent adding duplicate paths
         self.pathsSet: set[str] = set()
         self.playlists: dict[str, Playlist] = {}
+        self.playlistGraph = PlaylistGraph(self.playlists)
         self.playlistNames: set[str] = set()
         self.clonedSongGroups: dict[str, ClonedSongGroup] = {}
+        # directories (or files) songs were added from, walked again when rescanning the library
+        self.libraryRoots: list[str] = []
+        # created on first use so that the audio device is only set up when something is played
+        self.player: Union['MusicPlayer', None] = None
+        # songs are measured in the background once something is played, see analyzeLoudness()
+        self.loudnessAnalyzer: Union['LoudnessAnalyzer', None] = None
+        # ids of the songs handed to the analyzer whose results haven't been collected yet
+        self.analyzingSongIds: set[str] = set()
+        # built on the first search, since indexing reads the tags of every song, and kept up to date after that
+        self.searchIndex: Union[SongSearchIndex, None] = None
 
     def __enter__(self):
-        if not path.exists(self.settingsFullPath):
-            with open(self.settingsFullPath, 'w'):
-                self.settings = {}
-        else:
-            with open(self.settingsFullPath, 'r') as settingsFile:
-                self.settings = json.load(settingsFile)
-                songs: list = self.settings.get('songs')
-                if songs:
-                    for song in songs:
-                        cloneId = None
-                        if 'cloneId' in song:
-                            cloneId = song['cloneId']
-                        self.addSongSimple(song['id'], song['path'], cloneId)
-                        self.pathsSet.add(song['path'])
-
-                playlists: list = self.settings.get('playlists')
-                if playlists:
-                    for playlist in playlists:
-                        songs: list[Union[Song, list[Song]]] = []
-                        for songId in playlist['songs']:
-                            if isinstance(songId, list):
-                                subSongs: list[Song] = []
-                                for s in songId:
-                                    subSongs.append(self.songsDict[s])
-                                songs.append(subSongs)
-                            else:
-                                songs.append(self.songsDict[songId])
-                        self.addPlaylistSimple(playlist['id'], playlist['name'], songs)
-
-                playlistDependencies: list = self.settings.get('playlistDependencies')
-                if playlistDependencies:
-                    for dep in playlistDependencies:
-                        id = dep['id']
-                        playlist = self.playlists[id]
-                        for ds in dep['downstream']:
-                            playlist.downstreamPlaylists[ds] = self.playlists[ds]
-                        for us in dep['upstream']:
-                            playlist.upstreamPlaylists[us] = self.playlists[us]
-
-                clonedSongGroups: list = self.settings.get('clonedSongs')
-                if clonedSongGroups:
-                    for group in clonedSongGroups:
-                        clonedSongs: list[ClonedSong] = []
-                        for clonedSong in group['songDistributions']:
-                            song = self.songsDict[clonedSong['songId']]
-                            probability = clonedSong['probability']
-                            clonedSongs.append(ClonedSong(song, probability))
-                        id: str = group['id']
-                        self.clonedSongGroups[id] = ClonedSongGroup(id, clonedSongs)
+        startTime = time.perf_counter()
+        self.storage.open()
+        for song in self.storage.getSongs():
+            self.addSongFromJsonObject(song)
+
+        for playlist in self.storage.getPlaylists():
+            self.addPlaylistSimple(playlist['id'], playlist['name'], self.getSongsFromIds(playlist['songs']))
+
+        # upstream lists are the reverse of the downstream ones, so only the downstream lists are read
+        # older files list every playlist downstream of a playlist, the redundant ones are left out of the graph
+        for dep in self.storage.getPlaylistDependencies():
+            playlist = self.playlists.get(dep['id'])
+            for ds in dep['downstream']:
+                if playlist and ds in self.playlists:
+                    self.playlistGraph.addDownstream(playlist, self.playlists[ds])
+
+        for group in self.storage.getClonedSongGroups():
+            clonedSongs: list[ClonedSong] = []
+            for clonedSong in group['songDistributions']:
+                song = self.songsDict[clonedSong['songId']]
+                probability = clonedSong['probability']
+                clonedSongs.append(ClonedSong(song, probability))
+            id: str = group['id']
+            self.clonedSongGroups[id] = ClonedSongGroup(id, clonedSongs)
+
+        # read after the big sections, older settings files keep these at the end
+        self.libraryRoots = self.storage.getLibraryRoots()
+
+        # everything that was just loaded is already stored
+        self.changes = SettingsChanges()
+        self.journalSequence = self.storage.getJournalSequence()
+        self.replayJournal()
+
+        stats = getStats()
+        if stats:
+            stats.recordTime('settings.load', time.perf_counter() - startTime)
 
         return self
 
     def __exit__(self, type, value, traceback):
-        with open(self.settingsFullPath, 'w') as settingsFile:
-            self.settings['songs'] = [song.toJsonObject() for song in self.songs]
-            playlists = self.getPlaylistsList()
-            self.settings['playlists'] = [playlist.toPlaylistJsonObject() for playlist in playlists]
-            self.settings['playlistDependencies'] = [playlist.toDependenciesJsonObject() for playlist in playlists]
-            self.settings['clonedSongs'] = [group.toJsonObject() for group in self.clonedSongGroups.values()]
-            # update the settings file and close it
-            json.dump(self.settings, settingsFile, indent=4)
+        if self.loudnessAnalyzer:
+            # whatever was measured is kept, the remaining songs are measured next time
+            self.applyLoudnessResults()
+            self.loudnessAnalyzer.close()
+        self.compact()
+        self.journal.close()
+        self.storage.close()
+
+        self.tagCache.save()
+        if self.player:
+            self.player.shutdown()
+
+    def save(self):
+        startTime = time.perf_counter()
+        self.storage.save(self, self.changes)
+        self.changes = SettingsChanges()
+
+        stats = getStats()
+        if stats:
+            stats.recordTime('settings.save', time.perf_counter() - startTime)
+
+    # writes a snapshot with all journaled edits and starts a new, empty journal
+    def compact(self):
+        self.save()
+        self.journal.clear()
+        self.oldestEntryTime = None
+
+    # journals an edit right after it has been applied in memory
+    def record(self, op: str, args: dict):
+        if self.isReplayingJournal:
+            return
+
+        self.journalSequence += 1
+        self.journal.append(self.journalSequence, op, args)
+        now = time.monotonic()
+        if self.oldestEntryTime is None:
+            self.oldestEntryTime = now
+        if self.journal.entryCount >= compactAfterEntries or now - self.oldestEntryTime >= compactAfterSeconds:
+            self.compact()
+
+    def replayJournal(self):
+        self.isReplayingJournal = True
+        replayedEntries = 0
+        try:
+            for entry in self.journal.readEntries():
+                # entries up to the stored sequence were already saved before the journal could be cleared
+                if entry['seq'] <= self.journalSequence:
+                    continue
+                self.applyJournalEntry(entry['op'], entry['args'])
+                self.journalSequence = entry['seq']
+                replayedEntries += 1
+        finally:
+            self.isReplayingJournal = False
+
+        if replayedEntries > 0:
+            self.compact()
+
+    def applyJournalEntry(self, op: str, args: dict):
+        if op == 'addSong':
+            self.addSongFromJsonObject(args)
+            self.changes.markSong(args['id'])
+        elif op == 'updateSong':
+            self.updateSongFromJsonObject(args)
+        elif op == 'removeSongs':
+            self.removeSongs([self.songsDict[id] for id in args['ids'] if id in self.songsDict])
+        elif op == 'setLoudness':
+            self.setLoudness({ id: loudness for id, loudness in args['loudness'].items() if id in self.songsDict })
+        elif op == 'setFingerprints':
+            self.setFingerprints({ id: fingerprint for id, fingerprint in args['fingerprints'].items() if id in self.songsDict })
+        elif op == 'mergeDuplicateSongs':
+            self.mergeDuplicateSongs([self.songsDict[id] for id in args['songIds'] if id in self.songsDict], args['id'])
+        elif op == 'dismissDuplicateSongs':
+            self.dismissDuplicateSongs([self.songsDict[id] for id in args['songIds'] if id in self.songsDict])
+        elif op == 'addLibraryRoot':
+            self.addLibraryRoot(args['path'])
+        elif op == 'addPlaylist':
+            self.addPlaylistSimple(args['id'], args['name'], self.getSongsFromIds(args['songs']))
+        elif op == 'renamePlaylist':
+            self.renamePlaylist(self.playlists[args['id']], args['name'])
+        elif op == 'deletePlaylist':
+            # removing the last song of a playlist already deleted it during replay
+            if args['id'] in self.playlists:
+                self.deletePlaylist(args['id'])
+        elif op == 'removeSongFromPlaylist':
+            self.removeSongFromPlaylist(self.playlists[args['id']], args['index'])
+        elif op == 'removeSongsFromPlaylist':
+            self.removeSongsFromPlaylist(self.playlists[args['id']], args['indices'])
+        elif op == 'addSongsToPlaylist':
+            self.addSongsToPlaylist(self.playlists[args['id']], [self.songsDict[id] for id in args['songIds']])
+        elif op == 'linkSongs':
+            self.linkSongs(self.playlists[args['id']], args['indices'])
+        elif op == 'addDownstreamToPlaylist':
+            self.addDownstreamToPlaylist(self.playlists[args['id']], self.playlists[args['downstreamId']])
+        elif op == 'addUpstreamToPlaylist':
+            self.addUpstreamToPlaylist(self.playlists[args['id']], self.playlists[args['upstreamId']])
+        else:
+            raise error(f'Unknown journal entry "{op}"!')
+
+    def addSongFromJsonObject(self, song: dict):
+        cloneId = None
+        if 'cloneId' in song:
+            cloneId = song['cloneId']
+        self.addSongSimple(song['id'], song['path'], cloneId)
+        self.pathsSet.add(song['path'])
+        if 'mtime' in song:
+            self.songsDict[song['id']].setFileStats(song['mtime'], song['size'], song['inode'], song['hash'])
+        if 'fingerprint' in song:
+            self.songsDict[song['id']].fingerprint = song['fingerprint']
+        if 'duplicatesReviewed' in song:
+            self.songsDict[song['id']].duplicatesReviewed = bool(song['duplicatesReviewed'])
+        if 'loudness' in song:
+            self.songsDict[song['id']].loudness = song['loudness']
+
+    def updateSongFromJsonObject(self, obj: dict):
+        song = self.songsDict[obj['id']]
+        self.pathsSet.discard(song.path)
+        song.setPath(obj['path'])
+        if 'mtime' in obj:
+            song.setFileStats(obj['mtime'], obj['size'], obj['inode'], obj['hash'])
+        if 'fingerprint' in obj:
+            song.fingerprint = obj['fingerprint']
+        if 'duplicatesReviewed' in obj:
+            song.duplicatesReviewed = bool(obj['duplicatesReviewed'])
+        if 'loudness' in obj:
+            song.loudness = obj['loudness']
+        self.pathsSet.add(song.path)
+        self.updateSearchIndex(song)
+        self.changes.markSong(song.id)
+
+    def getSongsFromIds(self, songIds: list[Union[str, list[str]]]) -> list[Union[Song, list[Song]]]:
+        songs: list[Union[Song, list[Song]]] = []
+        for songId in songIds:
+            if isinstance(songId, list):
+                subSongs: list[Song] = []
+                for s in songId:
+                    subSongs.append(self.songsDict[s])
+                songs.append(subSongs)
+            else:
+                songs.append(self.songsDict[songId])
+
+        return songs
+
+    def getPlayer(self) -> 'MusicPlayer':
+        if not self.player:
+            from audioCache import AudioCache
+            from musicPlayer import MusicPlayer
+
+            def prepareSong(song: Song):
+                self.applyLoudnessResults()
+                # measured before the rest of the library, so it plays at the right volume the next time
+                self.analyzeLoudness([song], True)
+
+            audioCache = AudioCache(self.audioCacheDir, self.audioCacheMaxBytes) if self.audioCacheDir else None
+            self.player = MusicPlayer(audioCache, prepareSong)
+            # the library is measured while it is being listened to
+            self.analyzeLoudness(self.songs)
+
+        return self.player
+
+    def getSearchIndex(self) -> SongSearchIndex:
+        if not self.searchIndex:
+            self.searchIndex = SongSearchIndex()
+            self.searchIndex.addSongs(self.songs)
+
+        return self.searchIndex
+
+    # all songs for an empty query, otherwise the songs matching the query with the best matches first
+    def searchSongs(self, query: str, limit: int = None) -> list[Song]:
+        if len(tokenize(query)) == 0:
+            return self.songs if limit is None else self.songs[:limit]
+
+        return self.getSearchIndex().search(query, limit)
+
+    def updateSearchIndex(self, song: Song):
+        if self.searchIndex:
+            self.searchIndex.addSong(song)
 
     def addSongSimple(self, id: str, filepath: str, clonedGroupId: str):
-        song = Song(id, filepath, clonedGroupId)
+        song = Song(id, filepath, clonedGroupId, self.tagCache)
         self.songs.append(song)
         self.songsDict[id] = song
+        self.updateSearchIndex(song)
 
     def addPlaylistSimple(self, id: str, name: str, songs: list[Union[Song, list[Song]]]):
         pl = Playlist(id, name, songs)
-        self.playlists[id] = pl
+        pl.onChange = self.markPlaylistChanged
+        pl.cloneResolver = self.resolveClonedSongs
+        pl.graph = self.playlistGraph
+        self.playlists[pl.id] = pl
         self.playlistNames.add(name)
+        self.changes.markPlaylist(pl.id)
 
-    def addSongsFromPath(self, dirPath: str) -> list[Song]:
-        songs: list[Song] = []
+        return pl
+
+    def markPlaylistChanged(self, playlist: Playlist):
+        self.changes.markPlaylist(playlist.id)
+        self.playlistGraph.invalidate(playlist.id)
+
+    def resolveClonedSongs(self, songs: list[Song], rng: random.Random = None) -> list[Song]:
+        return resolveClonedSongs(songs, self.clonedSongGroups, rng)
+
+    def addScannedSong(self, scanned: ScannedFile) -> Song:
+        song = Song(None, scanned.path, None, self.tagCache)
+        song.setTags(scanned.tags)
+        song.setFileStats(scanned.mtime, scanned.size, scanned.inode, scanned.contentHash)
+        self.songs.append(song)
+        self.songsDict[song.id] = song
+        self.updateSearchIndex(song)
+        self.pathsSet.add(scanned.path)
+        self.changes.markSong(song.id)
+        self.record('addSong', song.toJsonObject())
+
+        return song
+
+    def addLibraryRoot(self, dirPath: str):
+        for root in self.libraryRoots:
+            if root == dirPath or isUnderRoot(dirPath, root):
+                return
 
-        def addSong(filepath: str):
-            song = Song(None, filepath)
-            songs.append(song)
-            self.pathsSet.add(filepath)
+        self.libraryRoots.append(dirPath)
+        self.changes.libraryRootsChanged = True
+        self.record('addLibraryRoot', { 'path': dirPath })
 
+    def isInOfflineRoot(self, filepath: str) -> bool:
+        # songs on a root that can't be reached (e.g. an unmounted drive) are not treated as deleted
+        for root in self.libraryRoots:
+            if isUnderRoot(filepath, root) and not path.exists(root):
+                return True
+
+        return False
+
+    def scanSongsFromPath(self, dirPath: str, onProgress: Callable[[ScanProgress], None] = None) -> Iterator[Song]:
         # only add the paths if they haven't already been added
+        def isAlreadyAdded(filepath: str) -> bool:
+            return filepath in self.pathsSet
+
         if path.exists(dirPath):
-            if isfile(dirPath):
-                if dirPath.endswith('.mp3') and dirPath not in self.pathsSet:
-                    addSong(dirPath)
-            else:
-                for file in listdir(dirPath):
-                    fullPath = join(dirPath, file)
-                    if isfile(fullPath) and file.endswith('.mp3') and fullPath not in self.pathsSet:
-                        addSong(fullPath)
+            self.addLibraryRoot(dirPath)
+            scanner = LibraryScanner(self.tagCache)
+            addedSongs: list[Song] = []
+            for scanned in scanner.scan(dirPath, isAlreadyAdded, onProgress):
+                song = self.addScannedSong(scanned)
+                if self.loudnessAnalyzer:
+                    self.analyzeLoudness([song])
+                addedSongs.append(song)
+                yield song
+
+            # only the new songs are fingerprinted, see findDuplicateSongs() for finding their copies
+            self.fingerprintSongs(addedSongs)
+
+    def addSongsFromPath(self, dirPath: str) -> list[Song]:
+        return list(self.scanSongsFromPath(dirPath))
 
-        self.songs += songs
+    # the part of adding songs that only reads files and doesn't change the library, so that it can run on another
+    # thread while the library is in use, addScannedFiles() adds the files afterwards
+    def scanNewFiles(self, dirPath: str) -> list[ScannedFile]:
+        def isAlreadyAdded(filepath: str) -> bool:
+            return filepath in self.pathsSet
+
+        return list(LibraryScanner(self.tagCache).scan(dirPath, isAlreadyAdded))
+
+    # files added in the meantime are skipped, the new songs still need to be fingerprinted, see computeFingerprints()
+    def addScannedFiles(self, dirPath: str, scannedFiles: list[ScannedFile]) -> list[Song]:
+        self.addLibraryRoot(dirPath)
+        songs = [self.addScannedSong(scanned) for scanned in scannedFiles if scanned.path not in self.pathsSet]
+        if self.loudnessAnalyzer:
+            self.analyzeLoudness(songs)
 
         return songs
 
+    def rescanLibrary(self, onProgress: Callable[[ScanProgress], None] = None) -> RescanResult:
+        result = RescanResult()
+
+        pathsOnDisk: set[str] = set()
+        for root in self.libraryRoots:
+            pathsOnDisk.update(walkMp3Files(root))
+
+        # only files whose stats differ from the last scan are read again
+        songsByPath: dict[str, Song] = {}
+        missingSongs: dict[str, Song] = {}
+        pathsToScan: list[str] = []
+        for song in self.songs:
+            songsByPath[song.path] = song
+            try:
+                stat = os.stat(song.path)
+            except OSError:
+                if not self.isInOfflineRoot(song.path):
+                    missingSongs[song.id] = song
+                continue
+
+            if song.hasFileStats(stat.st_mtime_ns, stat.st_size, stat.st_ino):
+                result.unchanged += 1
+            else:
+                pathsToScan.append(song.path)
+
+        pathsToScan += [p for p in pathsOnDisk if p not in self.pathsSet]
+
+        newFiles: list[ScannedFile] = []
+        scanner = LibraryScanner(self.tagCache)
+        for scanned in scanner.scanPaths(pathsToScan, onProgress):
+            song = songsByPath.get(scanned.path)
+            if not song:
+                newFiles.append(scanned)
+                continue
+
+            # songs from before file stats were tracked only need their stats recorded
+            if song.mtime is not None:
+                result.updated.append(song)
+            song.setTags(scanned.tags)
+            song.setFileStats(scanned.mtime, scanned.size, scanned.inode, scanned.contentHash)
+            self.updateSearchIndex(song)
+            self.changes.markSong(song.id)
+            self.record('updateSong', song.toJsonObject())
+
+        # a new file with the inode or content of a missing song is that song after a move, so it keeps its id
+        # renames keep the mtime as well, which guards against inodes being reused by unrelated new files
+        missingByInode: dict[tuple[int, int, int], Song] = {}
+        missingByHash: dict[str, Song] = {}
+        for song in missingSongs.values():
+            if song.inode is not None:
+                missingByInode[(song.inode, song.size, song.mtime)] = song
+            if song.contentHash:
+                missingByHash[song.contentHash] = song
+
+        for scanned in newFiles:
+            song = missingByInode.get((scanned.inode, scanned.size, scanned.mtime))
+            if not song or song.id not in missingSongs:
+                song = missingByHash.get(scanned.contentHash)
+
+            if song and song.id in missingSongs:
+                missingSongs.pop(song.id)
+                self.pathsSet.discard(song.path)
+                song.setPath(scanned.path)
+                song.setTags(scanned.tags)
+                song.setFileStats(scanned.mtime, scanned.size, scanned.inode, scanned.contentHash)
+                self.pathsSet.add(scanned.path)
+                self.updateSearchIndex(song)
+                self.changes.markSong(song.id)
+                self.record('updateSong', song.toJsonObject())
+                result.moved.append(song)
+            else:
+                result.added.append(self.addScannedSong(scanned))
+
+        result.removed = list(missingSongs.values())
+        self.removeSongs(result.removed)
+        # new and changed files, as well as songs of libraries from before fingerprinting (only on their first rescan)
+        self.fingerprintSongs(self.songs)
+        if self.loudnessAnalyzer:
+            # changed files lost their loudness
+            self.analyzeLoudness(self.songs)
+
+        return result
+
+    def removeSongs(self, songsToRemove: list[Song]):
+        if len(songsToRemove) == 0:
+            return
+
+        ids = set([song.id for song in songsToRemove])
+        self.songs = [song for song in self.songs if song.id not in ids]
+        for id in ids:
+            song = self.songsDict.pop(id)
+            self.pathsSet.discard(song.path)
+            if self.searchIndex:
+                self.searchIndex.removeSong(song)
+            self.changes.markSongRemoved(id)
+
+        for playlist in self.playlists.values():
+            playlist.removeSongIds(ids)
+
+        for group in list(self.clonedSongGroups.values()):
+            remaining = [x for x in group.songs if x.song.id not in ids]
+            if len(remaining) == len(group.songs):
+                continue
+
+            group.songs = remaining
+            if len(group.songs) == 0:
+                self.clonedSongGroups.pop(group.id)
+                self.changes.markClonedSongGroupRemoved(group.id)
+            else:
+                self.changes.markClonedSongGroup(group.id)
+
+        self.record('removeSongs', { 'ids': list(ids) })
+
+    # computes the audio fingerprints the songs don't have yet, fingerprints are kept until a song's file changes
+    def fingerprintSongs(self, songs: list[Song]):
+        self.setFingerprints(self.computeFingerprints(songs))
+
+    # song id -> fingerprint of the songs that don't have one yet, only reads the files so it can run on another thread
+    def computeFingerprints(self, songs: list[Song]) -> dict[str, str]:
+        songsByPath = { song.path: song for song in songs if song.fingerprint is None }
+        fingerprints: dict[str, str] = {}
+        for songPath, fingerprint in fingerprintFiles(list(songsByPath)):
+            if fingerprint is not None:
+                fingerprints[songsByPath[songPath].id] = fingerprint
+
+        return fingerprints
+
+    # song id -> fingerprint, journaled as a single entry however many songs were fingerprinted
+    def setFingerprints(self, fingerprints: dict[str, str]):
+        if len(fingerprints) == 0:
+            return
+
+        for id, fingerprint in fingerprints.items():
+            self.songsDict[id].fingerprint = fingerprint
+            self.changes.markSong(id)
+        self.record('setFingerprints', { 'fingerprints': fingerprints })
+
+    def getLoudnessAnalyzer(self) -> 'LoudnessAnalyzer':
+        if not self.loudnessAnalyzer:
+            from loudnessAnalysis import LoudnessAnalyzer
+
+            self.loudnessAnalyzer = LoudnessAnalyzer()
+
+        return self.loudnessAnalyzer
+
+    # hands the songs that haven't been measured yet to the analyzer, songs are measured again once their file changes
+    # urgent songs are measured before the others, even if they were handed over before
+    def analyzeLoudness(self, songs: list[Song], isUrgent: bool = False):
+        for song in songs:
+            if song.loudness is None and (isUrgent or song.id not in self.analyzingSongIds):
+                self.analyzingSongIds.add(song.id)
+                self.getLoudnessAnalyzer().analyze(song.id, song.path, isUrgent)
+
+    # stores the loudness of the songs the analyzer finished since the last call
+    def applyLoudnessResults(self):
+        if not self.loudnessAnalyzer:
+            return
+
+        loudnessById: dict[str, float] = {}
+        for id, loudness in self.loudnessAnalyzer.takeResults():
+            self.analyzingSongIds.discard(id)
+            # songs that can't be decoded are tried again in the next session
+            if loudness is not None and id in self.songsDict:
+                loudnessById[id] = loudness
+
+        self.setLoudness(loudnessById)
+
+    # song id -> loudness, journaled as a single entry however many songs were measured
+    def setLoudness(self, loudnessById: dict[str, float]):
+        if len(loudnessById) == 0:
+            return
+
+        for id, loudness in loudnessById.items():
+            self.songsDict[id].loudness = loudness
+            self.changes.markSong(id)
+        self.record('setLoudness', { 'loudness': loudnessById })
+
+    # groups of songs with the same audio, e.g. copies of a track in two folders, from the fingerprints taken when
+    # scanning. Only groups with at least one of songs are returned (all groups if songs is None). Songs that are
+    # already cloned songs of the same group don't count as duplicates anymore, and neither do groups that were merged
+    # or dismissed before, unless a new copy was added since.
+    def findDuplicateSongs(self, songs: list[Song] = None) -> list[list[Song]]:
+        songsByFingerprint: dict[str, list[Song]] = {}
+        for song in self.songs:
+            if song.fingerprint:
+                songsByFingerprint.setdefault(song.fingerprint, []).append(song)
+
+        fingerprints = songsByFingerprint.keys()
+        if songs is not None:
+            fingerprints = set([song.fingerprint for song in songs if song.fingerprint])
+
+        duplicates: list[list[Song]] = []
+        for fingerprint in fingerprints:
+            group = songsByFingerprint.get(fingerprint, [])
+            groupIds = set([song.clonedSongGroupId for song in group])
+            isReviewed = all([song.duplicatesReviewed for song in group])
+            if len(group) > 1 and (len(groupIds) > 1 or None in groupIds) and not isReviewed:
+                duplicates.append(group)
+
+        return duplicates
+
+    # makes the songs cloned songs of one group, so that only one of them plays whenever any of them would
+    # the group of the first song that already has one is reused, songs belonging to yet another group are left out
+    def mergeDuplicateSongs(self, songs: list[Song], groupId: str = None) -> Union[ClonedSongGroup, None]:
+        for song in songs:
+            if not groupId and song.clonedSongGroupId in self.clonedSongGroups:
+                groupId = song.clonedSongGroupId
+        if not groupId:
+            groupId = str(uuid.uuid4())
+
+        group = self.clonedSongGroups.get(groupId)
+        if not group:
+            group = ClonedSongGroup(groupId, [])
+            self.clonedSongGroups[groupId] = group
+
+        songsToAdd = [song for song in songs if song.clonedSongGroupId not in self.clonedSongGroups]
+        for song in songsToAdd:
+            song.clonedSongGroupId = internTag(groupId)
+            self.changes.markSong(song.id)
+        # each copy is equally likely to be played
+        group.songs = group.songs + [ClonedSong(song, 1) for song in songsToAdd]
+        self.changes.markClonedSongGroup(groupId)
+        # songs of yet another group stay apart, which isn't asked about again either
+        self.markDuplicatesReviewed(songs)
+        self.record('mergeDuplicateSongs', { 'id': groupId, 'songIds': [song.id for song in songs] })
+
+        return group
+
+    def markDuplicatesReviewed(self, songs: list[Song]):
+        for song in songs:
+            song.duplicatesReviewed = True
+            self.changes.markSong(song.id)
+
+    # keeps the copies as separate songs, they are only reported again once another copy is added
+    def dismissDuplicateSongs(self, songs: list[Song]):
+        self.markDuplicatesReviewed(songs)
+        self.record('dismissDuplicateSongs', { 'songIds': [song.id for song in songs] })
+
     def renamePlaylist(self, playlist: Playlist, newName: str):
         self.playlistNames.remove(playlist.name)
         self.playlistNames.add(newName)
         self.playlists[playlist.id].name = newName
+        self.changes.markPlaylist(playlist.id)
+        self.record('renamePlaylist', { 'id': playlist.id, 'name': newName })
 
     def removeSongFromPlaylist(self, playlist: Playlist, songToRemoveIdxInPlaylist: int):
         # handle linked songs
         # remove an empty playlist
         playlist.removeSong(songToRemoveIdxInPlaylist)
-        if len(self.playlists[playlist.id].songs) == 0:
-            self.playlists.pop(playlist.id)
+        self.record('removeSongFromPlaylist', { 'id': playlist.id, 'index': songToRemoveIdxInPlaylist })
+        if playlist.isEmpty():
+            self.deletePlaylist(playlist.id)
+
+    # removes several songs of the flattened playlist at once, the indices are those before any of them is removed
+    def removeSongsFromPlaylist(self, playlist: Playlist, songIndices: list[int]):
+        playlist.removeSongs(songIndices)
+        self.record('removeSongsFromPlaylist', { 'id': playlist.id, 'indices': sorted(songIndices) })
+        if playlist.isEmpty():
+            self.deletePlaylist(playlist.id)
+
+    def addSongsToPlaylist(self, playlist: Playlist, songs: list[Song]):
+        playlist.addSongs(songs)
+        self.record('addSongsToPlaylist', { 'id': playlist.id, 'songIds': [song.id for song in songs] })
+
+    def linkSongs(self, playlist: Playlist, indicesToLink: list[int]):
+        playlist.linkSongs(indicesToLink)
+        self.record('linkSongs', { 'id': playlist.id, 'indices': indicesToLink })
 
     def getPlaylistsList(self) -> list[Playlist]:
         playlists = list(self.playlists.values())
@@ -139,59 +677,42 @@ class UserSettings:
     def addPlaylist(self, name: str, songs: list[Song]):
         if self.hasPlaylist(name):
             raise error(f'Playlist with the name {name} already exists!')
-        self.addPlaylistSimple(None, name, songs)
+        playlist = self.addPlaylistSimple(None, name, songs)
+        self.record('addPlaylist', playlist.toPlaylistJsonObject())
 
     def deletePlaylist(self, id: str):
         if not id in self.playlists:
             raise error(f'Playlist being deleted doesn\'t exist!')
 
+        playlist = self.playlists[id]
+        # the playlists it was connected to store their dependencies as well
+        for neighbourId in [*playlist.upstreamPlaylists, *playlist.downstreamPlaylists]:
+            self.changes.markPlaylist(neighbourId)
+        self.playlistGraph.removePlaylist(playlist)
         self.playlists.pop(id)
-
-    def validatePlaylistForDownstreamOrUpstream(self, playlist: Playlist, toAddToStream: Playlist) -> bool:
-        if toAddToStream.id in playlist.downstreamPlaylists:
-             return False   
-            
-        if toAddToStream.id in playlist.upstreamPlaylists:
-            return False
-
-        return True
+        self.playlistNames.discard(playlist.name)
+        self.changes.markPlaylistRemoved(id)
+        self.record('deletePlaylist', { 'id': id })
 
     # these functions are handled by settings, since settings has access to all playlists by id
+    # a playlist can't be added if it is already downstream, or if it is upstream since that would create a cycle
     def addDownstreamToPlaylist(self, playlist: Playlist, downstream: Playlist) -> bool:
-        idsToAdd: set[str] = set()
-
-        # Playlist is already in the downstream
-        # Playlist is in the upstream and therefore cannot be added to its downstream
-        if not self.validatePlaylistForDownstreamOrUpstream(playlist, downstream):
+        if not self.playlistGraph.addDownstream(playlist, downstream):
             return False
 
-        idsToAdd.add(downstream.id)
-        for d in downstream.downstreamPlaylists:
-            if not self.validatePlaylistForDownstreamOrUpstream(playlist, d):
-                return False
-            idsToAdd.add(d)
-
-        for id in idsToAdd:
-            playlist.downstreamPlaylists[id] = self.playlists[id]
+        self.changes.markPlaylist(playlist.id)
+        self.changes.markPlaylist(downstream.id)
+        self.record('addDownstreamToPlaylist', { 'id': playlist.id, 'downstreamId': downstream.id })
 
         return True
 
     def addUpstreamToPlaylist(self, playlist: Playlist, upstream: Playlist) -> bool:
-        idsToAdd: set[str] = set()
-        
-        # Playlist is in the downstream and therefore cannot be added to its upstream
-        # Playlist is already in the upstream
-        if not self.validatePlaylistForDownstreamOrUpstream(playlist, upstream):
+        if not self.playlistGraph.addDownstream(upstream, playlist):
             return False
 
-        idsToAdd.add(upstream.id)
-        for d in upstream.upstreamPlaylists:
-            if not self.validatePlaylistForDownstreamOrUpstream(playlist, d):
-                return False
-            idsToAdd.add(d)
-
-        for id in idsToAdd:
-            playlist.upstreamPlaylists[id]
+        self.changes.markPlaylist(playlist.id)
+        self.changes.markPlaylist(upstream.id)
+        self.record('addUpstreamToPlaylist', { 'id': playlist.id, 'upstreamId': upstream.id })
 
         return True
 